@@ -0,0 +1,87 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Benchmark library analytics with Python loops and with a MetadataFrame.
+
+Builds the synthetic tree of bench_snapshot.py with sheets' modification
+dates spread over a year, then times two reports:
+
+- per group -- number of sheets below each group modified in the last
+               30 days
+- histogram -- sheets modified per week
+
+each as a loop over the Group tree and with a MetadataFrame, and the time
+to build the frame. Requires NumPy.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_frame.py [n_sheets]
+"""
+
+import collections
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_snapshot import make_tree  # noqa: E402
+from ulysses.frame import MetadataFrame  # noqa: E402
+
+WEEK = 7 * 86400
+
+
+def loop_reports(tree, since):
+    per_group = {}
+
+    def count(group):
+        n = sum(1 for sheet in group.sheets if sheet.modificationDate >= since)
+        n += sum(count(sub_group) for sub_group in group.containers or [])
+        per_group[group.identifier] = n
+        return n
+    count(tree)
+    histogram = collections.Counter(
+        int(sheet.modificationDate // WEEK) for sheet in tree.iter_sheets())
+    return per_group, histogram
+
+
+def frame_reports(frame, since):
+    per_group = frame.rollup(frame.between('modified', after=since))
+    histogram = frame.histogram('modified', bin_seconds=WEEK)
+    return per_group, histogram
+
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return result, (time.time() - start) * 1000
+
+
+def main(n_sheets):
+    tree = make_tree(n_sheets)
+    rng = random.Random(0)
+    now = 513446268.9
+    for sheet in tree.iter_sheets():
+        sheet.modificationDate = now - rng.uniform(0, 365 * 86400)
+    since = now - 30 * 86400
+
+    frame, build_ms = timed(MetadataFrame.from_tree, tree)
+    (loop_groups, _), loop_ms = timed(loop_reports, tree, since)
+    (frame_groups, _), frame_ms = timed(frame_reports, frame, since)
+    assert frame_groups[0] == loop_groups[tree.identifier]
+    print('%d sheets' % n_sheets)
+    print('%-14s %8.1f ms' % ('loops', loop_ms))
+    print('%-14s %8.1f ms' % ('frame', frame_ms))
+    print('%-14s %8.1f ms' % ('frame build', build_ms))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
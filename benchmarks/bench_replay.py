@@ -0,0 +1,93 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Benchmark a whole client workflow against a recorded Ulysses session.
+
+The workflow fetches the library tree, reads sheets, makes bulk edits that
+leave sheets as they were (attaching and then removing a keyword) and
+exports the tree as JSON, timing each phase.
+
+Record a cassette once on a Mac running Ulysses (the access-token is not
+stored in it):
+
+    python benchmarks/bench_replay.py record session.cassette TOKEN [n]
+
+then replay it on any machine, e.g. a Linux CI box, to compare client
+versions. scale multiplies the recorded time of each call (0 to
+measure the client alone, 1 to reproduce the session's timing):
+
+    python benchmarks/bench_replay.py replay session.cassette [scale [n]]
+
+n is the number of sheets read and edited (default 100); replay with the n
+recorded.
+"""
+
+import os
+import StringIO
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ulysses  # noqa: E402
+import xcall  # noqa: E402
+from ulysses import xcallback  # noqa: E402
+
+
+def workflow(n_sheets):
+    """Run the workflow, returning list of (phase, seconds)."""
+    timings = []
+
+    def phase(name, func):
+        start = time.time()
+        result = func()
+        timings.append((name, time.time() - start))
+        return result
+
+    roots = phase('tree fetch', lambda: ulysses.get_root_items())
+    ids = [sheet.identifier for root in roots
+           for sheet in root.iter_sheets()][:n_sheets]
+    phase('read sheets', lambda: [
+        r.value for r in ulysses.read_sheets(ids, ordered=True)])
+
+    def edit():
+        for identifier in ids:
+            ulysses.attach_keywords(identifier, ['bench-replay'])
+            ulysses.remove_keywords(identifier, ['bench-replay'])
+    phase('bulk edits', edit)
+    phase('export', lambda: [
+        ulysses.write_tree(root, StringIO.StringIO(), 'json')
+        for root in roots])
+    return timings
+
+
+def main(argv):
+    mode, path = argv[:2]
+    n_sheets = int(argv[3]) if len(argv) > 3 else 100
+    if mode == 'record':
+        token = argv[2]
+        if os.path.exists(path):
+            os.remove(path)
+        xcallback.set_transport(xcall.RecordingTransport(path))
+    elif mode == 'replay':
+        token = 'replayed'
+        latency_scale = float(argv[2]) if len(argv) > 2 else 0.0
+        xcallback.set_transport(xcall.ReplayTransport(path, latency_scale))
+    else:
+        raise SystemExit(__doc__)
+    ulysses.set_access_token(token)
+    timings = workflow(n_sheets)
+    for name, seconds in timings:
+        print('%-12s %9.1f ms' % (name, seconds * 1000))
+    print('%-12s %9.1f ms' % ('total', sum(s for _, s in timings) * 1000))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,110 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Benchmark decoding of large Ulysses replies, before and after decode_reply().
+
+Builds a synthetic get-root-items reply and get-item reply with the given
+number of sheets, quoted as Ulysses quotes them, then times:
+
+- legacy -- unquote, decode to unicode, json.loads, json.loads of the nested
+            field (unquoting it again for get-item) and formatting the whole
+            result for the debug log, as the client did before
+- single -- ulysses.replies.decode_reply()
+
+Peak memory is measured by running each pipeline in a fresh interpreter and
+reporting the growth in maximum resident set size.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_reply_decoding.py [n_sheets]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import timeit
+import urllib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ulysses.replies import decode_reply, JSON_BACKEND  # noqa: E402
+
+
+def make_sheet(n):
+    return {'identifier': ('%022d' % n)[-22:], 'type': 'sheet',
+            'title': urllib.quote('sheet %d ‘quoted’' % n),
+            'titleType': 'heading1', 'hasLifetimeIdentifier': True,
+            'changeToken': '1|1E9A917F|unfpAQAAAAADAAAA',
+            'creationDate': 513446267, 'modificationDate': 513446268.980628}
+
+
+def make_group(n_sheets):
+    return {'identifier': 'x' * 22, 'type': 'group', 'title': 'iCloud',
+            'hasLifetimeIdentifier': True, 'containers': [],
+            'sheets': [make_sheet(n) for n in range(n_sheets)]}
+
+
+def make_replies(n_sheets):
+    group = make_group(n_sheets)
+    root_items = urllib.quote(json.dumps({'items': json.dumps([group])}))
+    item = urllib.quote(json.dumps({'item': urllib.quote(json.dumps(group))}))
+    return {'get-root-items': root_items, 'get-item': item}
+
+
+def legacy(action, stdout):
+    reply = json.loads(urllib.unquote(stdout).decode('utf8'))
+    unicode(reply)  # debug log of the decoded reply
+    if action == 'get-root-items':
+        return json.loads(reply['items'])
+    return json.loads(urllib.unquote(reply['item']))
+
+
+def single(action, stdout):
+    field = 'items' if action == 'get-root-items' else 'item'
+    return decode_reply(action, stdout)[field]
+
+
+PIPELINES = {'legacy': legacy, 'single': single}
+
+
+def measure_memory(pipeline, n_sheets):
+    """Return growth in max RSS (KiB) of decoding in a fresh interpreter."""
+    code = ('import sys, resource; sys.path.insert(0, %r); '
+            'import bench_reply_decoding as b; '
+            'replies = b.make_replies(%d); '
+            'before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; '
+            'b.PIPELINES[%r]("get-root-items", replies["get-root-items"]); '
+            'b.PIPELINES[%r]("get-item", replies["get-item"]); '
+            'print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss'
+            ' - before)') % (os.path.dirname(os.path.abspath(__file__)),
+                             n_sheets, pipeline, pipeline)
+    return int(subprocess.check_output([sys.executable, '-c', code]))
+
+
+def main(n_sheets):
+    replies = make_replies(n_sheets)
+    print('%d sheets, %.1f MB get-root-items reply, JSON backend: %s' % (
+        n_sheets, len(replies['get-root-items']) / 1e6, JSON_BACKEND))
+    for action in ('get-root-items', 'get-item'):
+        assert legacy(action, replies[action]) == single(action,
+                                                         replies[action])
+        for name in ('legacy', 'single'):
+            seconds = min(timeit.repeat(
+                lambda: PIPELINES[name](action, replies[action]),
+                number=1, repeat=5))
+            print('%-15s %-7s %8.1f ms' % (action, name, seconds * 1000))
+    for name in ('legacy', 'single'):
+        print('peak memory growth %-7s %8d KiB' % (
+            name, measure_memory(name, n_sheets)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
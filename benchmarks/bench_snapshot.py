@@ -0,0 +1,104 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Benchmark loading a library tree from a pickle and from a snapshot.
+
+Builds a synthetic tree of 100 groups with the given total number of sheets,
+then times, each in a fresh interpreter so the open is cold for Python:
+
+- pickle -- cPickle.load() of the Group tree, then one sheet's title
+- snapshot -- Snapshot() of a write_snapshot() file, then find() of one sheet
+              and its title
+
+and reports the growth in maximum resident set size of each.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_snapshot.py [n_sheets]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ulysses import calls  # noqa: E402
+from ulysses.snapshot import write_snapshot  # noqa: E402
+
+
+def make_tree(n_sheets, n_groups=100):
+    def sheet(n):
+        return {'identifier': ('%022d' % n)[-22:], 'type': 'sheet',
+                'title': 'sheet %d' % n, 'titleType': 'heading1',
+                'hasLifetimeIdentifier': True,
+                'changeToken': '1|1E9A917F|%d' % n,
+                'creationDate': 513446267, 'modificationDate': 513446268.9}
+    per_group = n_sheets // n_groups
+    groups = [{'identifier': 'g%021d' % g, 'type': 'group',
+               'title': 'group %d' % g, 'hasLifetimeIdentifier': True,
+               'containers': [], 'sheets': [
+                   sheet(g * per_group + n) for n in range(per_group)]}
+              for g in range(n_groups)]
+    return calls.Group(title='iCloud', type='group', identifier='x' * 22,
+                       hasLifetimeIdentifier=True, sheets=[],
+                       containers=groups)
+
+
+LOADERS = {
+    'pickle': ('import cPickle; '
+               'tree = cPickle.load(open(path, "rb")); '
+               'title = tree.containers[50].sheets[0].title'),
+    'snapshot': ('from ulysses.snapshot import Snapshot; '
+                 'snapshot = Snapshot(path); '
+                 'title = snapshot.find(identifier).title'),
+}
+
+
+def measure(name, path, identifier):
+    """Return (ms, KiB of max RSS growth) of loading in a fresh interpreter."""
+    code = ('import sys, time, resource; sys.path.insert(0, %r); '
+            'path, identifier = %r, %r; '
+            'import ulysses.calls; '
+            'before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; '
+            'start = time.time(); '
+            '%s; '
+            'print((time.time() - start) * 1000); '
+            'print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss'
+            ' - before)') % (
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                path, identifier, LOADERS[name])
+    ms, kib = subprocess.check_output([sys.executable, '-c', code]).split()
+    return float(ms), int(kib)
+
+
+def main(n_sheets):
+    import cPickle
+    tree = make_tree(n_sheets)
+    identifier = tree.containers[50].sheets[0].identifier
+    directory = tempfile.mkdtemp()
+    paths = {'pickle': os.path.join(directory, 'tree.pickle'),
+             'snapshot': os.path.join(directory, 'tree.snapshot')}
+    with open(paths['pickle'], 'wb') as f:
+        cPickle.dump(tree, f, cPickle.HIGHEST_PROTOCOL)
+    write_snapshot(tree, paths['snapshot'])
+    print('%d sheets' % n_sheets)
+    for name in ('pickle', 'snapshot'):
+        ms, kib = measure(name, paths[name], identifier)
+        print('%-8s %6.1f MB file %8.1f ms %8d KiB' % (
+            name, os.path.getsize(paths[name]) / 1e6, ms, kib))
+    for path in paths.values():
+        os.remove(path)
+    os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,102 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import json
+import urllib
+
+import mock
+import pytest
+
+import xcall
+from xcall import (RecordingTransport, ReplayMissError, ReplayTransport,
+                   XCallbackError, XCallClient, cassette_key)
+
+
+class FakeTransport(object):
+
+    def __init__(self):
+        self.urls = []
+
+    def exchange(self, url, activate_app=False):
+        self.urls.append(url)
+        if 'bad' in url:
+            return '', 'went wrong'
+        return urllib.quote(json.dumps({'action': url.split('?')[0],
+                                        'n': len(self.urls)})), ''
+
+
+@pytest.fixture
+def cassette(tmpdir):
+    return str(tmpdir.join('session.cassette'))
+
+
+def test_cassette_key():
+    assert (cassette_key('app://x-callback-url/a?b=2&access-token=abc&a=1') ==
+            'app://x-callback-url/a?a=1&access-token=&b=2')
+    assert cassette_key('app://x-callback-url/a') == 'app://x-callback-url/a'
+
+
+def test_client_uses_transport():
+    transport = FakeTransport()
+    client = XCallClient('app', transport=transport)
+    assert client.xcall('act', {'x': 'y', 'z': None})['n'] == 1
+    assert transport.urls == ['app://x-callback-url/act?x=y']
+    with pytest.raises(XCallbackError):
+        client.xcall('bad')
+
+
+def test_record_then_replay(cassette):
+    recording = XCallClient('app', transport=RecordingTransport(
+        cassette, FakeTransport()))
+    first = recording.xcall('act', {'access-token': 'secret', 'x': 'y'})
+    second = recording.xcall('act', {'access-token': 'secret', 'x': 'y'})
+    with pytest.raises(XCallbackError):
+        recording.xcall('bad')
+    with open(cassette) as f:
+        assert 'secret' not in f.read()
+
+    replaying = XCallClient('app', transport=ReplayTransport(
+        cassette, latency_scale=0))
+    params = {'x': 'y', 'access-token': 'other'}
+    assert replaying.xcall('act', dict(params)) == first
+    assert replaying.xcall('act', dict(params)) == second
+    # the last exchange is served again once they run out
+    assert replaying.xcall('act', dict(params)) == second
+    with pytest.raises(XCallbackError):
+        replaying.xcall('bad')
+
+
+def test_replay_miss(cassette):
+    XCallClient('app', transport=RecordingTransport(
+        cassette, FakeTransport())).xcall('act')
+    client = XCallClient('app', transport=ReplayTransport(cassette))
+    with pytest.raises(ReplayMissError):
+        client.xcall('other')
+
+
+def test_replay_latency_scaled(cassette):
+    with open(cassette, 'w') as f:
+        f.write(json.dumps({'url': 'app://x-callback-url/act',
+                            'activate_app': False, 'stdout': '1',
+                            'stderr': '', 'duration': 0.5}) + '\n')
+    with mock.patch('xcall.time.sleep') as sleep:
+        ReplayTransport(cassette, latency_scale=2).exchange(
+            'app://x-callback-url/act')
+        sleep.assert_called_once_with(1.0)
+        sleep.reset_mock()
+        ReplayTransport(cassette, latency_scale=0).exchange(
+            'app://x-callback-url/act')
+        assert not sleep.called
+
+
+def test_subprocess_transport_refuses_while_xcall_runs():
+    with mock.patch('xcall.get_pid_of_running_xcall_processes',
+                    return_value=['123']):
+        with pytest.raises(AssertionError):
+            xcall.SubprocessTransport().exchange('app://x-callback-url/act')
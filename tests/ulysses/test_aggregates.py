@@ -0,0 +1,88 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import mock
+import pytest
+
+from ulysses import calls
+from ulysses.aggregates import Aggregate, GroupAggregates
+
+from tests.ulysses.test_calls import tree_dict
+
+
+def content(identifier, text, keywords=(), modified=0, token=None):
+    return calls.SheetWithContent(
+        title='t', type='sheet', identifier=identifier,
+        hasLifetimeIdentifier=True, modificationDate=modified,
+        changeToken=token, text=text, keywords=keywords, notes=[])
+
+
+@pytest.fixture
+def tree():
+    root = calls.Group(**tree_dict())
+    root.get_group_by_title('Project').sheets[0].modificationDate = 30
+    return root
+
+
+def test_build_totals_everything_below(tree):
+    cache = mock.Mock()
+    cache.get.side_effect = lambda identifier, token: {
+        's1': content('s1', u'one two', ['a', 'a'], 30),
+        's2': content('s2', u'three', ['a', 'b'])}.get(identifier)
+    aggregates = GroupAggregates(tree, cache)
+
+    assert aggregates['sub'] == Aggregate(1, 0, {'a': 1, 'b': 1}, 1, 5, 0)
+    assert aggregates['proj'] == Aggregate(2, 30, {'a': 2, 'b': 1}, 3, 12, 0)
+    assert aggregates['inbox'] == Aggregate(1, 0, {}, 0, 0, 1)
+    assert aggregates['root'] == Aggregate(3, 30, {'a': 2, 'b': 1}, 3, 12, 1)
+    assert 'proj' in aggregates and 's1' not in aggregates
+
+
+def test_update_sheet_adjusts_only_ancestors(tree):
+    aggregates = GroupAggregates(tree)
+    inbox = aggregates['inbox']
+    aggregates.update_sheet(content('s2', u'a b c', ['k'], 40))
+
+    assert aggregates['inbox'] == inbox
+    for group_id in ('sub', 'proj', 'root'):
+        assert aggregates[group_id].words == 3
+        assert aggregates[group_id].modified == 40
+        assert aggregates[group_id].keywords == {'k': 1}
+    assert aggregates['proj'].unread == 1
+
+
+def test_newest_is_found_again_when_lost(tree):
+    aggregates = GroupAggregates(tree)
+    aggregates.remove_sheet('s1')
+    assert aggregates['proj'] == Aggregate(1, 0, {}, 0, 0, 1)
+    assert aggregates['root'].modified == 0
+    assert aggregates['root'].sheets == 2
+
+    aggregates.add_sheet(content('s3', u'x', modified=None), 'sub')
+    aggregates.remove_sheet('s2')
+    assert aggregates['sub'].modified is None
+    assert aggregates['root'].modified == 0
+    assert aggregates['root'].characters == 1
+
+
+def test_matches_rebuild_after_changes(tree):
+    aggregates = GroupAggregates(tree)
+    aggregates.update_sheet(content('s1', u'w w w', ['x'], 10))
+    aggregates.add_sheet(content('s4', u'z', ['x'], 20), 'inbox')
+
+    tree.get_group_by_title('Inbox').sheets.append(
+        content('s4', u'z', ['x'], 20))
+    cache = mock.Mock()
+    cache.get.side_effect = lambda identifier, token: {
+        's1': content('s1', u'w w w', ['x'], 10),
+        's4': content('s4', u'z', ['x'], 20)}.get(identifier)
+    tree.get_group_by_title('Project').sheets[0].modificationDate = 10
+    rebuilt = GroupAggregates(tree, cache)
+    for group_id in ('root', 'inbox', 'proj', 'sub'):
+        assert aggregates[group_id] == rebuilt[group_id]
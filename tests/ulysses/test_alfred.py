@@ -0,0 +1,97 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import json
+import os
+import StringIO
+
+import mock
+import pytest
+
+from ulysses import alfred, calls
+from ulysses.alfred import ScriptFilter
+from ulysses.snapshot import write_snapshot
+
+from tests.ulysses.test_calls import tree_dict
+
+
+@pytest.fixture
+def snapshot_path(tmpdir):
+    path = str(tmpdir.join('library.snapshot'))
+    write_snapshot(calls.Group(**tree_dict()), path)
+    return path
+
+
+@pytest.fixture
+def script_filter(snapshot_path, tmpdir):
+    script_filter = ScriptFilter(snapshot_path, str(tmpdir.join('cache')),
+                                 rerun=1.0)
+    yield script_filter
+    script_filter.close()
+
+
+def test_items(script_filter):
+    assert script_filter.items(u'SUB') == [
+        {'uid': 'sub', 'arg': 'sub', 'title': 'Sub',
+         'subtitle': '/iCloud/Project'}]
+    assert script_filter.items('deep') == [
+        {'uid': 's2', 'arg': 's2', 'title': 'deep',
+         'subtitle': '/iCloud/Project/Sub'}]
+    assert script_filter.items('icloud')[0]['subtitle'] == '/'
+    assert script_filter.items('  ') == []
+
+
+def test_repeated_queries_are_read_from_cache(script_filter):
+    first = json.loads(script_filter.document('proj'))
+    with mock.patch.object(alfred, 'TitleIndex') as index_class:
+        document = json.loads(ScriptFilter(
+            script_filter.snapshot_path, script_filter.directory,
+            rerun=1.0).document('Proj '))
+    assert not index_class.called
+    assert document == first
+    assert (script_filter.hits, script_filter.misses) == (0, 1)
+    assert document['rerun'] == 1.0
+    assert [item['uid'] for item in document['items']] == ['proj']
+
+
+def test_new_snapshot_version_misses_and_prunes(script_filter, snapshot_path):
+    script_filter.items('sub')
+    tree = tree_dict()
+    tree['containers'][1]['containers'][0]['title'] = 'Subsection'
+    with mock.patch('time.time', return_value=1e9):
+        write_snapshot(calls.Group(**tree), snapshot_path)
+
+    assert script_filter.items('sub')[0]['title'] == 'Subsection'
+    assert script_filter.misses == 2
+    assert os.listdir(script_filter.directory) == ['%.6f' % 1e9]
+    script_filter.items('sub')
+    assert script_filter.hits == 1
+
+
+def test_prune_leaves_other_files(snapshot_path, tmpdir):
+    # the cache directory holding the snapshot, as in a workflow's data
+    script_filter = ScriptFilter(snapshot_path, str(tmpdir))
+    tmpdir.mkdir('keywords').join('index').write('')
+    tmpdir.mkdir('0.000001')
+    with mock.patch('time.time', return_value=1e9):
+        write_snapshot(calls.Group(**tree_dict()), snapshot_path)
+    script_filter.items('sub')
+    script_filter.close()
+    assert sorted(os.listdir(str(tmpdir))) == [
+        '%.6f' % 1e9, 'keywords', 'library.snapshot']
+    assert os.listdir(str(tmpdir.join('keywords'))) == ['index']
+
+
+def test_main(snapshot_path, tmpdir):
+    stdout = StringIO.StringIO()
+    assert alfred.main([snapshot_path, str(tmpdir.join('cache')), 'inbox'],
+                       stdout=stdout) == 0
+    assert json.loads(stdout.getvalue()) == {'items': [
+        {'uid': 'inbox', 'arg': 'inbox', 'title': 'Inbox',
+         'subtitle': '/iCloud'}]}
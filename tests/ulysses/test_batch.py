@@ -0,0 +1,106 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import json
+import StringIO
+import threading
+import time
+
+import mock
+
+from ulysses import batch, calls
+from ulysses.batch import run_batch
+
+from tests.ulysses.test_calls import tree_dict
+
+
+def lines(*operations):
+    return [json.dumps(operation) + '\n' for operation in operations]
+
+
+def test_results_for_each_operation():
+    client = mock.Mock()
+    client.get_root_items.return_value = [calls.Group(**tree_dict())]
+    client.insert.return_value = None
+    client.trash.side_effect = calls.UlyssesError('No item')
+
+    results = list(run_batch(lines(
+        {'call': 'get_root_items'},
+        {'call': 'insert', 'args': ['s1', 'more'],
+         'kwargs': {'silent_mode': True}, 'id': 'append'},
+        {'call': 'trash', 'args': ['gone']},
+        {'call': 'rm', 'args': ['s1']}) + ['\n', 'not json\n'], client))
+
+    assert [(r['id'], r['call']) for r in results] == [
+        (1, 'get_root_items'), ('append', 'insert'), (3, 'trash'),
+        (4, 'rm'), (6, None)]
+    root = results[0]['result'][0]
+    assert root['title'] == 'iCloud'
+    assert root['containers'][0]['sheets'][0]['identifier'] == (
+        'test' * 5 + 'xx')
+    assert results[1]['error'] is None
+    client.insert.assert_called_once_with('s1', 'more', silent_mode=True)
+    assert results[2]['error'] == 'UlyssesError: No item'
+    assert results[3]['error'] == "Unknown call 'rm'"
+    assert results[4]['error'].startswith('Could not read line 6')
+    assert not client.rm.called
+    json.dumps(results)
+
+
+def test_reads_are_parallel_between_writes():
+    log = []
+    lock = threading.Lock()
+    active = {'now': 0, 'max': 0}
+
+    def read_sheet(id_):
+        with lock:
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        time.sleep(0.01)
+        with lock:
+            active['now'] -= 1
+            log.append(id_)
+        return id_
+
+    client = mock.Mock()
+    client.read_sheet.side_effect = read_sheet
+    client.trash.side_effect = lambda id_: log.append('trash ' + id_)
+
+    operations = ([{'call': 'read_sheet', 'args': ['a%d' % n]}
+                   for n in range(4)] +
+                  [{'call': 'trash', 'args': ['t']}] +
+                  [{'call': 'read_sheet', 'args': ['b%d' % n]}
+                   for n in range(4)])
+    results = list(run_batch(lines(*operations), client, concurrency=4,
+                             ordered=True))
+
+    assert [r['id'] for r in results] == range(1, 10)
+    assert active['max'] > 1
+    assert sorted(log[:4]) == ['a0', 'a1', 'a2', 'a3']
+    assert log[4] == 'trash t'
+    assert sorted(log[5:]) == ['b0', 'b1', 'b2', 'b3']
+
+
+def test_main(tmpdir):
+    path = tmpdir.join('operations.jsonl')
+    path.write(''.join(lines({'call': 'get_version'},
+                             {'call': 'get_version', 'args': [1]})))
+    stdout = StringIO.StringIO()
+    with mock.patch.object(batch, 'UlyssesClient') as client_class:
+        client_class.return_value.get_version.side_effect = [2.0, TypeError(
+            'too many arguments')]
+        status = batch.main(['--access-token', 'token', str(path)],
+                            stdout=stdout)
+
+    client_class.assert_called_once_with('token')
+    assert status == 1
+    assert [json.loads(line) for line in stdout.getvalue().splitlines()] == [
+        {'id': 1, 'call': 'get_version', 'result': 2.0, 'error': None},
+        {'id': 2, 'call': 'get_version', 'result': None,
+         'error': 'TypeError: too many arguments'}]
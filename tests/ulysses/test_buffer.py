@@ -0,0 +1,114 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import mock
+import pytest
+
+from ulysses.buffer import WriteBuffer
+
+
+ID1 = 'a' * 22
+ID2 = 'b' * 22
+
+
+@pytest.fixture
+def calls():
+    with mock.patch('ulysses.buffer.calls') as calls:
+        yield calls
+
+
+def test_consecutive_end_inserts_merge(calls):
+    buf = WriteBuffer()
+    buf.insert(ID1, 'one')
+    buf.insert(ID1, 'two', newline='prepend')
+    buf.insert(ID1, 'three', newline='enclose')
+
+    assert buf.flush() == 1
+    calls.insert.assert_called_once_with(
+        id=ID1, text='one\ntwo\nthree', format='markdown', position='end',
+        newline='append', silent_mode=False)
+    assert (buf.requested, buf.emitted) == (3, 1)
+
+
+def test_inserts_with_other_format_or_position_are_kept(calls):
+    buf = WriteBuffer()
+    buf.insert(ID1, 'one')
+    buf.insert(ID1, 'two', format='text')
+    buf.insert(ID1, 'three', position='begin')
+
+    assert buf.flush() == 3
+
+
+def test_keywords_collapse_to_later_intent(calls):
+    buf = WriteBuffer()
+    buf.attach_keywords(ID1, ['a', 'b'])
+    buf.insert(ID1, 'text')
+    buf.remove_keywords(ID1, ['a', 'c'])
+    buf.attach_keywords(ID1, ['c'])
+
+    assert len(buf) == 3
+    buf.flush()
+    assert calls.mock_calls == [
+        mock.call.attach_keywords(id=ID1, keywords=['b', 'c']),
+        mock.call.remove_keywords(id=ID1, keywords=['a']),
+        mock.call.insert(id=ID1, text='text', format='markdown',
+                         position='end', newline=None, silent_mode=False)]
+
+
+def test_title_collapses_unless_insert_may_change_it(calls):
+    buf = WriteBuffer()
+    buf.set_sheet_title(ID1, 'first', 'heading1')
+    buf.insert(ID1, 'text', newline='prepend')
+    buf.set_sheet_title(ID1, 'second', 'heading2')
+    buf.insert(ID1, 'top', position='begin')
+    buf.set_sheet_title(ID1, 'third', 'heading1')
+    buf.insert(ID1, 'a')  # extends the title if it is the only paragraph
+    buf.set_sheet_title(ID1, 'fourth', 'heading1')
+
+    buf.flush()
+    assert [(c[0], c[2].get('title', c[2].get('text')))
+            for c in calls.mock_calls] == [
+        ('set_sheet_title', 'second'), ('insert', 'text'),
+        ('insert', 'top'), ('set_sheet_title', 'third'), ('insert', 'a'),
+        ('set_sheet_title', 'fourth')]
+
+
+def test_update_note_collapses_until_notes_shift(calls):
+    buf = WriteBuffer()
+    buf.update_note(ID1, 0, 'a')
+    buf.update_note(ID1, 1, 'b')
+    buf.update_note(ID1, 0, 'c')
+    buf.remove_note(ID1, 0)
+    buf.update_note(ID1, 0, 'd')
+
+    buf.flush()
+    assert [c[0] for c in calls.mock_calls] == [
+        'update_note', 'update_note', 'remove_note', 'update_note']
+    assert calls.mock_calls[0][2]['text'] == 'c'
+
+
+def test_ids_flush_in_order_of_first_use(calls):
+    with WriteBuffer() as buf:
+        buf.insert(ID2, 'x')
+        buf.insert(ID1, 'y')
+        buf.insert(ID2, 'z')
+    assert [c[2]['id'] for c in calls.mock_calls] == [ID2, ID1]
+
+
+def test_failed_flush_keeps_unsent_operations(calls):
+    calls.attach_note.side_effect = [Exception('busy'), None]
+    buf = WriteBuffer()
+    buf.insert(ID1, 'x')
+    buf.attach_note(ID1, 'note')
+
+    with pytest.raises(Exception):
+        buf.flush()
+    assert len(buf) == 1
+    assert buf.flush() == 1
+    assert calls.insert.call_count == 1
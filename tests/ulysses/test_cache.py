@@ -0,0 +1,114 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import os
+
+import mock
+import pytest
+
+from ulysses import calls
+from ulysses.cache import SheetCache, cached_read_sheet
+
+
+def sheet(identifier='a' * 22, token='1', text=u'## title ‘quoted’ 100%'):
+    return calls.SheetWithContent(
+        title='title%20%25', type='sheet', identifier=identifier,
+        hasLifetimeIdentifier=True, titleType='heading2',
+        creationDate=513446267, modificationDate=513446268.980628,
+        changeToken=token, text=text, keywords=['k'], notes=['n'])
+
+
+@pytest.fixture(params=[False, True], ids=['plain', 'compressed'])
+def cache(request, tmpdir):
+    return SheetCache(str(tmpdir.join('cache')), compress=request.param)
+
+
+def test_round_trip(cache):
+    cache.put(sheet())
+    cached = cache.get('a' * 22, '1')
+    assert cached == sheet()
+    assert cached.title == 'title %'
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_stale_change_token_misses(cache):
+    cache.put(sheet(token='1'))
+    assert cache.get('a' * 22, '2') is None
+    assert cache.get('b' * 22, '1') is None
+    assert cache.misses == 2
+    assert cache.peek('a' * 22).changeToken == '1'
+
+
+def test_reopen_keeps_entries(cache):
+    cache.put(sheet())
+    reopened = SheetCache(cache.directory)
+    assert reopened.get('a' * 22, '1') == sheet()
+    assert len(reopened) == 1
+    assert [n for n in os.listdir(cache.directory)
+            if n.startswith('.tmp')] == []
+
+
+def test_lru_eviction(tmpdir):
+    cache = SheetCache(str(tmpdir))
+    cache.put(sheet('a' * 22))
+    cache.max_bytes = 2 * cache.size
+    cache.put(sheet('b' * 22))
+    cache.get('a' * 22, '1')  # b is now least recently used
+    cache.put(sheet('c' * 22))
+
+    assert 'a' * 22 in cache and 'c' * 22 in cache
+    assert 'b' * 22 not in cache
+    assert cache.size <= cache.max_bytes
+
+
+def test_corrupt_entry_is_discarded(cache):
+    cache.put(sheet())
+    for name in os.listdir(cache.directory):
+        with open(os.path.join(cache.directory, name), 'wb') as f:
+            f.write('{torn')
+    assert cache.get('a' * 22, '1') is None
+    assert len(cache) == 0
+
+
+def test_cached_read_sheet(cache):
+    with mock.patch('ulysses.cache.calls') as mock_calls:
+        mock_calls.get_item.return_value = sheet()
+        mock_calls.read_sheet.return_value = sheet()
+
+        assert cached_read_sheet('a' * 22, cache) == sheet()
+        assert cached_read_sheet('a' * 22, cache, change_token='1') == sheet()
+
+        assert mock_calls.read_sheet.call_count == 1
+        assert mock_calls.get_item.call_count == 1
+
+
+def test_size_is_kept_up_to_date(cache):
+    def on_disk():
+        return sum(os.path.getsize(os.path.join(cache.directory, name))
+                   for name in os.listdir(cache.directory))
+
+    cache.put(sheet('a' * 22))
+    cache.put(sheet('b' * 22, text=u'longer text'))
+    cache.put(sheet('a' * 22, token='2', text=u'replaced'))
+    assert cache.size == on_disk() > 0
+    cache.discard('b' * 22)
+    assert cache.size == on_disk()
+    assert SheetCache(cache.directory).size == cache.size
+    cache.clear()
+    assert cache.size == 0
+
+
+def test_open_removes_stale_temporary_files(tmpdir):
+    directory = tmpdir.mkdir('cache')
+    for name in ('.tmp-old', '.tmp-new', 'other'):
+        directory.join(name).write('partial')
+    os.utime(str(directory.join('.tmp-old')), (0, 0))
+
+    SheetCache(str(directory))
+    assert sorted(os.listdir(str(directory))) == ['.tmp-new', 'other']
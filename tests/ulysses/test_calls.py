@@ -30,6 +30,7 @@ import time
 import os.path
 
 from ulysses import calls
+import ulysses.client
 import ulysses.xcallback
 
 logger = logging.getLogger(__name__)
@@ -107,14 +108,15 @@ def test_get_root_items__recursive():
 
 
 def test_get_root_items_with_wrong_access_token():
-    original_token = ulysses.xcallback.token_provider.token
+    client = ulysses.client.default_client()
+    original_token = client.access_token
     try:
-        ulysses.xcallback.token_provider.token = 'not_the_right_token'
+        client.access_token = 'not_the_right_token'
         with pytest.raises(calls.UlyssesError) as excinfo:
             calls.get_root_items()
         assert 'Access denied. Code=4' in str(excinfo.value)
     finally:
-        ulysses.xcallback.token_provider.token = original_token
+        client.access_token = original_token
 
 
 @pytest.mark.skip(reason='Takes 20s to fail for some reason')
@@ -447,6 +449,64 @@ class TestItemConstructors():
         assert upcgroup.get_group_by_title('group1') == group1
         assert upcgroup.get_sheet_by_title('upcsheet') == upcsheet
 
+    def test_walk(self):
+        tree = calls.Group(**tree_dict())
+
+        def titles(items):
+            return [item.title for item in items]
+
+        assert titles(tree.walk()) == [
+            'iCloud', 'Inbox', 'test', 'Project', 'one', 'Sub', 'deep']
+        assert titles(tree.walk('bfs')) == [
+            'iCloud', 'Inbox', 'Project', 'test', 'one', 'Sub', 'deep']
+        assert titles(tree.iter_sheets()) == ['test', 'one', 'deep']
+        assert titles(tree.iter_groups(
+            prune=lambda g: g.title == 'Project')) == [
+            'iCloud', 'Inbox', 'Project']
+
+    def test_link_parents(self):
+        tree = calls.Group(link_parents=True, **tree_dict())
+        sub = tree.get_group_by_title('Project').get_group_by_title('Sub')
+
+        assert sub.parent.parent is tree
+        assert tree.parent is None
+        assert sub.sheets[0].path == '/iCloud/Project/Sub/deep'
+        assert tree.resolve_path('/iCloud/Inbox/test') == 'test' * 5 + 'xx'
+        assert sub.get_item_by_path('/iCloud/Project') is sub.parent
+        with pytest.raises(KeyError):
+            tree.resolve_path('/iCloud/missing')
+        assert tree == calls.Group(**tree_dict())
+
+    def test_deep_tree_does_not_recurse(self):
+        d = root = group_dict('g', 'g')
+        for _ in range(5000):
+            d['containers'].append(group_dict('g', 'g'))
+            d = d['containers'][0]
+        tree = calls.Group(link_parents=True, **root)
+        assert len(list(tree.iter_groups())) == 5001
+        assert tree.resolve_path('/g' * 5001) == 'g'
+
+
+def sheet_dict(identifier, title):
+    return {'identifier': identifier, 'title': title, 'type': 'sheet',
+            'hasLifetimeIdentifier': True, 'titleType': None,
+            'changeToken': None, 'creationDate': 0, 'modificationDate': 0}
+
+
+def group_dict(identifier, title, sheets=(), containers=()):
+    return {'identifier': identifier, 'title': title, 'type': 'group',
+            'hasLifetimeIdentifier': True, 'sheets': list(sheets),
+            'containers': list(containers)}
+
+
+def tree_dict():
+    return group_dict('root', 'iCloud', containers=[
+        group_dict('inbox', 'Inbox',
+                   sheets=[sheet_dict('test' * 5 + 'xx', 'test')]),
+        group_dict('proj', 'Project', sheets=[sheet_dict('s1', 'one')],
+                   containers=[group_dict('sub', 'Sub', sheets=[
+                       sheet_dict('s2', 'deep')])])])
+
 
 # http://stackoverflow.com/questions/2030053/random-strings-in-python
 def randomword(length):
@@ -0,0 +1,140 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import json
+import threading
+import urllib
+
+import mock
+import pytest
+
+from ulysses import calls
+from ulysses.client import (Request, UlyssesClient, UlyssesError,
+                            default_client, set_default_client)
+
+from tests.ulysses.test_calls import sheet_dict
+
+
+class FakeTransport(object):
+    """Replies to get-item with a sheet, to new-group and new-sheet with a
+    targetId, and to anything else with {}."""
+
+    def __init__(self):
+        self.urls = []
+
+    def exchange(self, url, activate_app=False):
+        self.urls.append(url)
+        if 'fail' in url:
+            return '', repr({'errorMessage': 'Failed', 'errorCode': 1})
+        if '/get-item?' in url:
+            item = urllib.quote(json.dumps(sheet_dict('s' * 22, 'title')))
+            return urllib.quote(json.dumps({'item': item})), ''
+        if '/new-group?' in url or '/new-sheet?' in url:
+            return urllib.quote(json.dumps({'targetId': 'n' * 22})), ''
+        return urllib.quote('{}'), ''
+
+
+@pytest.fixture
+def client():
+    return UlyssesClient('token', transport=FakeTransport(),
+                         lock=threading.Lock())
+
+
+def test_request_is_immutable_and_drops_none():
+    params = {'id': 'x', 'index': None}
+    request = Request('move', params)
+    assert request.params == (('id', 'x'),)
+    assert params == {'id': 'x', 'index': None}
+    with pytest.raises(AttributeError):
+        request.action = 'copy'
+
+
+def test_call_leaves_params_alone(client):
+    params = {'id': 'x' * 22}
+    client.call('trash', params, send_access_token=True, silent_mode=True)
+    assert params == {'id': 'x' * 22}
+    assert 'access-token=token' in client.transport.urls[0]
+    assert 'silent-mode=YES' in client.transport.urls[0]
+
+
+@pytest.mark.parametrize('call, args', [
+    ('new_group', ('name',)),
+    ('set_group_title', ('g' * 22, 'title')),
+    ('new_sheet', ('text',)),
+    ('set_sheet_title', ('s' * 22, 'title', 'heading1')),
+    ('insert', ('s' * 22, 'text')),
+])
+def test_silent_mode_is_sent_as_silent_mode_yes(client, call, args):
+    # Before UlyssesClient these calls sent a literal silent_mode parameter
+    # (not one Ulysses knows), so silent_mode=True had no effect
+    getattr(client, call)(*args, silent_mode=True)
+    getattr(client, call)(*args)
+    silent, loud = client.transport.urls
+    assert 'silent-mode=YES' in silent
+    assert 'silent-mode' not in loud
+    assert 'silent_mode' not in silent + loud
+
+
+def test_clients_are_independent(client):
+    other = UlyssesClient('other', transport=FakeTransport(),
+                          lock=threading.Lock())
+    assert client.get_item('s' * 22).title == 'title'
+    other.trash('t' * 22)
+
+    assert client.transport.urls[0].startswith('ulysses://x-callback-url/get')
+    assert 'access-token=other' in other.transport.urls[0]
+    assert client.metrics().keys() == ['get-item']
+    assert other.metrics()['trash']['calls'] == 1
+
+
+def test_metrics_count_errors(client):
+    with pytest.raises(UlyssesError):
+        client.call('fail')
+    client.call('trash')
+    metrics = client.metrics()
+    assert (metrics['fail']['calls'], metrics['fail']['errors']) == (1, 1)
+    assert (metrics['trash']['calls'], metrics['trash']['errors']) == (1, 0)
+
+
+def test_listeners_and_gate(client):
+    heard = []
+
+    def listener(*args):
+        heard.append(args)
+    client.add_listener(listener)
+    client.gate = mock.MagicMock()
+    client.attach_keywords('s' * 22, ['a', 'b'])
+    client.remove_listener(listener)
+    client.trash('s' * 22)
+
+    assert heard == [('attach-keywords', {'id': 's' * 22, 'keywords': 'a,b'},
+                      {})]
+    assert client.gate.slot.call_args_list == [mock.call('attach-keywords'),
+                                               mock.call('trash')]
+
+
+def test_module_functions_use_default_client(client):
+    previous = set_default_client(client)
+    try:
+        assert default_client() is client
+        calls.move('s' * 22, index=2, silent_mode=True)
+    finally:
+        assert set_default_client(previous) is client
+    url = client.transport.urls[0]
+    assert url.startswith('ulysses://x-callback-url/move?')
+    assert 'index=2' in url and 'silent-mode=YES' in url
+    assert 'targetGroup' not in url and 'silent_mode' not in url
+
+
+def test_error_code():
+    client = UlyssesClient(transport=FakeTransport())
+    with pytest.raises(UlyssesError) as excinfo:
+        client.call('fail')
+    assert excinfo.value.code == 1
+    assert UlyssesError('busy').code is None
@@ -0,0 +1,87 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import random
+
+import mock
+import pytest
+
+from ulysses import calls
+from ulysses.duplicates import find_duplicates, normalise, sheet_texts
+
+
+def essay(seed, n_words=200):
+    rng = random.Random(seed)
+    words = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta',
+             'theta', 'iota', 'kappa', 'lambda', 'mu', 'nu', 'xi', 'omicron']
+    return ' '.join(rng.choice(words) for _ in range(n_words))
+
+
+def edited(text, n_changes, seed=0):
+    rng = random.Random(seed)
+    words = text.split()
+    for _ in range(n_changes):
+        words[rng.randrange(len(words))] = 'changed'
+    return ' '.join(words)
+
+
+@pytest.fixture
+def texts():
+    a, b = essay(1), essay(2)
+    return [('a1', a),
+            ('b1', b),
+            ('a2', u'  ' + a.upper().replace(' ', '\n\t') + '  '),
+            ('b2', edited(b, 3)),
+            ('c1', essay(3)),
+            ('b3', b),
+            ('d1', u'')]
+
+
+def test_normalise():
+    assert normalise(u'  Hello\n\tWORLD ') == u'hello world'
+    assert normalise('ﬁle') == u'file'  # NFKC ligature
+
+
+@pytest.mark.parametrize('processes', [0, 2])
+def test_find_duplicates(texts, processes):
+    duplicates = find_duplicates(texts, processes=processes)
+    assert duplicates.exact == [['a1', 'a2'], ['b1', 'b3']]
+    assert duplicates.near == [['b1', 'b2', 'b3']]
+
+
+def test_unrelated_texts_are_not_near(texts):
+    duplicates = find_duplicates(
+        [('x%d' % n, essay(100 + n)) for n in range(30)], processes=0)
+    assert duplicates == ([], [])
+
+
+def test_threshold(texts):
+    b = essay(2)
+    pair = [('b1', b), ('b2', edited(b, 60))]
+    assert find_duplicates(pair, processes=0).near == []
+    assert find_duplicates(pair, threshold=0.2, bands=32,
+                           processes=0).near == [['b1', 'b2']]
+
+
+def test_bands_must_divide_num_perm():
+    with pytest.raises(ValueError):
+        find_duplicates([], num_perm=64, bands=10)
+
+
+def test_sheet_texts():
+    def read_sheet(identifier, text):
+        if identifier == 'bad':
+            raise calls.UlyssesError('gone')
+        return calls.SheetWithContent(
+            type='sheet', identifier=identifier, title='t',
+            text=u'text of ' + identifier, keywords=[], notes=[])
+    with mock.patch('ulysses.duplicates.calls') as mock_calls:
+        mock_calls.read_sheet.side_effect = read_sheet
+        assert list(sheet_texts(['s1', 'bad', 's2'])) == [
+            ('s1', u'text of s1'), ('s2', u'text of s2')]
@@ -0,0 +1,90 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import math
+
+import pytest
+
+from ulysses import calls
+from ulysses.frame import MetadataFrame
+
+from tests.ulysses.test_calls import tree_dict
+
+numpy = pytest.importorskip('numpy')
+
+
+@pytest.fixture
+def frame():
+    root = calls.Group(**tree_dict())
+    project = root.get_group_by_title('Project')
+    project.sheets[0].modificationDate = 86400 * 3.5
+    project.get_group_by_title('Sub').sheets[0].modificationDate = None
+    root.get_group_by_title('Inbox').sheets[0].modificationDate = 86400 * 1.5
+    return MetadataFrame.from_tree(root)
+
+
+def test_columns_in_breadth_first_order(frame):
+    assert frame.identifier.tolist() == ['root', 'inbox', 'proj',
+                                         'test' * 5 + 'xx', 's1', 'sub', 's2']
+    assert frame.parent.tolist() == [-1, 0, 0, 1, 2, 2, 5]
+    assert frame.depth.tolist() == [0, 1, 1, 2, 2, 2, 3]
+    assert frame.is_sheet.tolist() == [False, False, False, True, True,
+                                       False, True]
+    assert frame.title_length.tolist() == [6, 5, 7, 4, 3, 3, 4]
+    assert math.isnan(frame.modified[frame.index('proj')])
+    assert math.isnan(frame.modified[frame.index('s2')])
+    assert frame.created[frame.index('s1')] == 0
+
+
+def test_between_and_rollup(frame):
+    recent = frame.between('modified', after=86400)
+    assert recent.tolist() == [False, False, False, True, True, False, False]
+
+    counts = frame.rollup(recent)
+    assert counts[frame.index('root')] == 2
+    assert counts[frame.index('proj')] == 1
+    assert counts[frame.index('sub')] == 0
+    assert frame.rollup(frame.is_sheet).tolist() == [3, 1, 2, 1, 1, 1, 1]
+
+    newest = frame.rollup(frame.modified, how='max')
+    assert newest[frame.index('root')] == 86400 * 3.5
+    assert newest[frame.index('inbox')] == 86400 * 1.5
+    assert math.isnan(newest[frame.index('sub')])
+    with pytest.raises(ValueError):
+        frame.rollup(recent, how='mean')
+
+
+def test_histogram(frame):
+    counts, edges = frame.histogram('modified', bin_seconds=86400)
+    assert counts.tolist() == [1, 0, 1]
+    assert edges.tolist() == [86400, 2 * 86400, 3 * 86400, 4 * 86400]
+
+    counts, edges = frame.histogram(mask=frame.depth == 3)
+    assert counts.tolist() == [] and len(edges) == 1
+
+
+def test_to_datetime64(frame):
+    dates = frame.to_datetime64('modified')
+    assert str(dates[frame.index('s1')]) == '2001-01-04T12:00:00.000'
+    assert numpy.isnat(dates[frame.index('s2')])
+
+
+def test_rollup_on_a_large_tree():
+    groups = [{'identifier': 'g%d' % g, 'title': 'g', 'type': 'group',
+               'sheets': [{'identifier': 's%d-%d' % (g, n), 'title': 's',
+                           'type': 'sheet', 'modificationDate': n}
+                          for n in range(100)],
+               'containers': []} for g in range(100)]
+    root = calls.Group(identifier='root', title='root', type='group',
+                       sheets=[], containers=groups)
+    frame = MetadataFrame.from_tree(root)
+    assert len(frame) == 10101
+    edited = frame.rollup(frame.between('modified', after=50))
+    assert edited[0] == 100 * 50
+    assert (edited[1:101] == 50).all()
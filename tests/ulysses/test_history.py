@@ -0,0 +1,120 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import os
+import random
+
+import pytest
+
+from ulysses import calls
+from ulysses.history import HistoryStore
+
+from tests.ulysses.test_calls import group_dict, sheet_dict, tree_dict
+
+
+def library(d):
+    return [calls.Group(**d)]
+
+
+def structure(groups):
+    """Return nested (id, title, changeToken, children) tuples."""
+    def item(i):
+        if i.type == 'sheet':
+            return (i.identifier, i.title, i.changeToken)
+        return (i.identifier, i.title, [item(c) for c in i.sheets] +
+                [item(c) for c in i.containers or []])
+    return [item(group) for group in groups]
+
+
+def edited():
+    d = tree_dict()
+    inbox, project = d['containers']
+    sheet = inbox['sheets'].pop()
+    project['containers'][0]['sheets'].insert(0, sheet)  # moved
+    project['sheets'][0]['changeToken'] = 'new-token'  # changed
+    project['title'] = 'Projects'  # retitled
+    project['containers'][0]['sheets'].pop()  # s2 removed
+    inbox['containers'].append(group_dict('new', 'New', sheets=[
+        sheet_dict('n1', 'one')]))  # added with a sheet
+    return d
+
+
+def test_records_changes(tmpdir):
+    history = HistoryStore(str(tmpdir))
+    assert history.record(library(tree_dict()), 100) == []
+    changes = history.record(library(edited()), 200)
+
+    moved = 'test' * 5 + 'xx'
+    assert sorted((c.kind, c.identifier, c.before, c.after, c.index)
+                  for c in changes) == [
+        ('added', 'n1', None, {'parent': 'new', 'type': 'sheet',
+                               'title': 'one', 'changeToken': None}, 0),
+        ('added', 'new', None, {'parent': 'inbox', 'type': 'group',
+                                'title': 'New', 'changeToken': None}, 0),
+        ('changed', 's1', None, 'new-token', None),
+        ('moved', moved, 'inbox', 'sub', 0),
+        ('removed', 's2', {'parent': 'sub', 'type': 'sheet',
+                           'title': 'deep', 'changeToken': None}, None, None),
+        ('retitled', 'proj', 'Project', 'Projects', None)]
+    assert set(c.time for c in changes) == set([200])
+    assert history.record(library(edited()), 300) == []
+
+
+def test_at_and_changes_across_rebases(tmpdir):
+    history = HistoryStore(str(tmpdir), rebase_every=2)
+    history.record(library(tree_dict()), 100)
+    history.record(library(edited()), 200)
+    reordered = edited()
+    reordered['containers'].reverse()
+    history.record(library(reordered), 300)
+    history.record(library(tree_dict()), 400)
+    assert len(os.listdir(str(tmpdir))) == 2
+
+    reopened = HistoryStore(str(tmpdir), rebase_every=2)
+    assert (reopened.first, reopened.last) == (100, 400)
+    for store in (history, reopened):
+        assert structure(store.at(150)) == structure(library(tree_dict()))
+        assert structure(store.at(299)) == structure(library(edited()))
+        assert structure(store.at(300)) == structure(library(reordered))
+        assert structure(store.at(1000)) == structure(library(tree_dict()))
+    with pytest.raises(KeyError):
+        history.at(99)
+
+    assert [c.kind for c in history.changes(200, 300)] == ['ordered']
+    assert set(c.time for c in history.changes(300)) == set([400])
+    assert list(history.changes()) == (list(history.changes(None, 250)) +
+                                       list(history.changes(250)))
+    with pytest.raises(ValueError):
+        history.record(library(tree_dict()), 350)
+
+
+def test_random_edits_round_trip(tmpdir):
+    rng = random.Random(0)
+    history = HistoryStore(str(tmpdir), rebase_every=5)
+    d = group_dict('root', 'iCloud', containers=[
+        group_dict('g%d' % g, 'g%d' % g,
+                   sheets=[sheet_dict('s%d-%d' % (g, n), 's')
+                           for n in range(5)]) for g in range(4)])
+    expected = {}
+    for step in range(20):
+        groups = d['containers']
+        source, target = rng.choice(groups), rng.choice(groups)
+        if source['sheets']:
+            sheet = source['sheets'].pop(rng.randrange(len(source['sheets'])))
+            target['sheets'].insert(
+                rng.randint(0, len(target['sheets'])), sheet)
+        rng.shuffle(rng.choice(groups)['sheets'])
+        target['sheets'].append(sheet_dict('new%d' % step, 'new'))
+        rng.choice(groups)['title'] = 'title %d' % step
+        history.record(library(d), step)
+        expected[step] = structure(library(d))
+
+    reopened = HistoryStore(str(tmpdir))
+    for step, tree in sorted(expected.items()):
+        assert structure(reopened.at(step)) == tree
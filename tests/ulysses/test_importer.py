@@ -0,0 +1,128 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import io
+import itertools
+import json
+import os
+import threading
+
+import mock
+import pytest
+
+from ulysses.importer import DirectoryImporter
+
+
+@pytest.fixture
+def tree(tmpdir):
+    """notes/{a.md, b.txt, skip.png, sub/{c.md, deeper/d.html}}"""
+    root = tmpdir.mkdir('notes')
+    root.join('a.md').write('# a')
+    root.join('b.txt').write('b')
+    root.join('skip.png').write('')
+    sub = root.mkdir('sub')
+    sub.join('c.md').write(u'# c ‘quoted’'.encode('utf-8'), 'wb')
+    sub.mkdir('deeper').join('d.html').write('<p>d</p>')
+    return str(root)
+
+
+@pytest.fixture
+def calls():
+    """Patched calls, also recording (name, args, result) in calls.log.
+
+    A MagicMock's call counts are not thread safe, so tests running the
+    worker pool assert on calls.log, which is appended under a lock.
+    """
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    def recording(name, prefix=None):
+        def call(*args, **kwargs):
+            with lock:
+                result = None
+                if prefix is not None:
+                    result = '%s%d' % (prefix, next(counter))
+                calls.log.append((name, args, result))
+                return result
+        return call
+
+    with mock.patch('ulysses.importer.calls') as calls:
+        calls.log = []
+        calls.new_group.side_effect = recording('new_group', 'g')
+        calls.new_sheet.side_effect = recording('new_sheet', 's')
+        calls.attach_keywords.side_effect = recording('attach_keywords')
+        yield calls
+
+
+def test_plan(tree):
+    levels = DirectoryImporter(tree).plan()
+    assert levels == [
+        [('.', ['a.md', 'b.txt'])],
+        [('sub', [os.path.join('sub', 'c.md')])],
+        [(os.path.join('sub', 'deeper'),
+          [os.path.join('sub', 'deeper', 'd.html')])]]
+
+
+def test_run_creates_groups_before_their_sheets(tree, calls):
+    ids = DirectoryImporter(
+        tree, parent='/iCloud', workers=1,
+        keywords_for=lambda path: ['imported']).run()
+
+    assert len(ids) == 7
+    assert calls.new_group.call_args_list[0] == mock.call(
+        u'notes', '/iCloud', silent_mode=True)
+    sub_id = ids['sub']
+    calls.new_sheet.assert_any_call(u'# c ‘quoted’', sub_id, 'markdown',
+                                    silent_mode=True)
+    calls.new_sheet.assert_any_call(u'<p>d</p>', ids['sub/deeper'], 'html',
+                                    silent_mode=True)
+    assert calls.attach_keywords.call_count == 4
+    created = set()
+    for name, args, result in calls.log:
+        if name == 'new_group':
+            created.add(result)
+        elif name == 'new_sheet':
+            assert args[1] in created
+
+
+def test_run_with_concurrent_workers(tree, calls):
+    ids = DirectoryImporter(tree, workers=4,
+                            keywords_for=lambda path: ['imported']).run()
+
+    assert len(ids) == 7
+    names = [name for name, _, _ in calls.log]
+    assert names.count('new_group') == 3
+    assert names.count('new_sheet') == 4
+    assert names.count('attach_keywords') == 4
+    assert sorted(args[0] for name, args, _ in calls.log
+                  if name == 'attach_keywords') == sorted(
+        identifier for path, identifier in ids.items()
+        if identifier.startswith('s'))
+
+
+def test_resume_from_journal_skips_completed_work(tree, calls, tmpdir):
+    journal = str(tmpdir.join('journal'))
+    calls.attach_keywords.side_effect = [None, Exception('crash')] + [None] * 9
+    importer = DirectoryImporter(tree, journal_path=journal, workers=1,
+                                 keywords_for=lambda path: ['imported'])
+    first = importer.run()
+    assert len(importer.errors) == 1
+    assert calls.new_sheet.call_count == 4
+
+    calls.reset_mock()
+    second = DirectoryImporter(tree, journal_path=journal,
+                               keywords_for=lambda path: ['imported']).run()
+
+    assert second == first
+    assert calls.new_group.call_count == 0
+    assert calls.new_sheet.call_count == 0
+    assert calls.attach_keywords.call_count == 1
+    with io.open(journal) as f:
+        kinds = [json.loads(line)['kind'] for line in f if line.strip()]
+    assert kinds.count('keywords') == 4
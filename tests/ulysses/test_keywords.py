@@ -0,0 +1,107 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import mock
+import pytest
+
+from ulysses.client import default_client
+from ulysses import calls
+from ulysses.keywords import KeywordIndex
+
+from tests.ulysses.test_calls import group_dict, sheet_dict
+
+
+ID1, ID2, ID3 = 'a' * 22, 'b' * 22, 'c' * 22
+
+KEYWORDS = {ID1: ['draft', 'blog'], ID2: ['blog'], ID3: ['done']}
+
+
+def library(tokens=None):
+    tokens = tokens or {}
+    sheets = []
+    for identifier in (ID1, ID2, ID3):
+        d = sheet_dict(identifier, 'sheet')
+        d['changeToken'] = tokens.get(identifier, '1')
+        sheets.append(d)
+    return calls.Group(**group_dict('root', 'iCloud', sheets=sheets[:1],
+                                    containers=[group_dict(
+                                        'sub', 'Sub', sheets=sheets[1:])]))
+
+
+def read_sheet(identifier, text=False):
+    return calls.SheetWithContent(
+        title='sheet', type='sheet', identifier=identifier,
+        changeToken=read_sheet.tokens.get(identifier, '1'), text=u'',
+        keywords=KEYWORDS[identifier], notes=[])
+
+
+@pytest.fixture
+def mock_read_sheet():
+    read_sheet.tokens = {}
+    with mock.patch('ulysses.parallel.calls') as mock_calls:
+        mock_calls.read_sheet.side_effect = read_sheet
+        yield mock_calls.read_sheet
+
+
+@pytest.fixture
+def index(mock_read_sheet):
+    index = KeywordIndex()
+    index.refresh(library())
+    return index
+
+
+def test_query(index):
+    assert index.query(all_of=['blog']) == {ID1, ID2}
+    assert index.query(all_of=['blog', 'draft']) == {ID1}
+    assert index.query(any_of=['draft', 'done']) == {ID1, ID3}
+    assert index.query(all_of=['blog'], none_of=['draft']) == {ID2}
+    assert index.query(none_of=['blog']) == {ID3}
+    assert index.query(all_of=['missing']) == set()
+    assert index.counts() == {'draft': 1, 'blog': 2, 'done': 1}
+
+
+def test_refresh_reads_only_changed_sheets(index, mock_read_sheet):
+    mock_read_sheet.reset_mock()
+    KEYWORDS[ID2] = ['done']
+    read_sheet.tokens[ID2] = '2'
+    try:
+        tree = library(tokens={ID2: '2'})
+        tree.containers[0].sheets.pop(1)  # ID3 trashed
+        assert index.refresh(tree) == 1
+    finally:
+        KEYWORDS[ID2] = ['blog']
+    mock_read_sheet.assert_called_once_with(ID2, False)
+    assert index.counts() == {'draft': 1, 'blog': 1, 'done': 1}
+    assert ID3 not in index
+
+
+def test_save_and_load(index, tmpdir):
+    index.path = str(tmpdir.join('dir', 'keywords.json'))
+    index.save()
+    loaded = KeywordIndex(index.path)
+    assert loaded.counts() == index.counts()
+    assert loaded.keywords_of(ID1) == ['draft', 'blog']
+
+
+def test_save_without_path(index):
+    assert index.path is None
+    with pytest.raises(ValueError):
+        index.save()
+
+
+def test_listen_to_keyword_calls(index):
+    index.listen()
+    try:
+        with mock.patch.object(default_client(), 'xcall_client'):
+            calls.attach_keywords(ID2, ['draft', 'new'])
+            calls.remove_keywords(ID1, ['draft'])
+    finally:
+        index.stop_listening()
+    assert index.query(all_of=['draft']) == {ID2}
+    assert index.keywords_of(ID2) == ['blog', 'draft', 'new']
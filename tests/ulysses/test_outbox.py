@@ -0,0 +1,168 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import io
+import json
+
+import mock
+import pytest
+
+from ulysses.outbox import Outbox, APPLIED, FAILED, PENDING, WRITE_CALLS
+from ulysses.xcallback import UlyssesError
+
+
+@pytest.fixture
+def calls():
+    with mock.patch('ulysses.outbox.calls') as calls:
+        for name in WRITE_CALLS:
+            getattr(calls, name).return_value = None
+        calls.new_sheet.return_value = 's' * 22
+        yield calls
+
+
+@pytest.fixture
+def journal(tmpdir):
+    return str(tmpdir.join('outbox'))
+
+
+def events(journal):
+    with io.open(journal, encoding='utf-8') as f:
+        return [(entry.get('op'), entry.get('event'))
+                for entry in (json.loads(line) for line in f if line.strip())]
+
+
+def test_calls_are_made_in_order(calls, journal):
+    with Outbox(journal) as outbox:
+        first = outbox.new_sheet(u'# café', 'g' * 22)
+        second = outbox.attach_keywords('s' * 22, ['a'])
+        third = outbox.submit('insert', 's' * 22, 'more', position='begin')
+        assert outbox.wait(timeout=5)
+
+    assert calls.mock_calls == [
+        mock.call.new_sheet(u'# café', 'g' * 22),
+        mock.call.attach_keywords('s' * 22, ['a']),
+        mock.call.insert('s' * 22, 'more', position='begin')]
+    assert [op.id for op in outbox.applied] == [first, second, third]
+    assert outbox.status(first).result == 's' * 22
+    assert [e for e in events(journal) if e[0] == first] == [
+        (first, 'queued'), (first, 'started'), (first, 'applied')]
+
+
+def test_submit_is_journalled_before_any_call(calls, journal):
+    outbox = Outbox(journal, start=False)
+    op = outbox.trash('s' * 22)
+    assert outbox.status(op).state == PENDING
+    assert [pending.id for pending in outbox.pending] == [op]
+    assert events(journal) == [(op, 'queued')]
+    assert not calls.trash.called
+    outbox.close()
+
+
+def test_rejects_unknown_calls_and_arguments(calls, journal):
+    outbox = Outbox(journal, start=False)
+    with pytest.raises(ValueError):
+        outbox.submit('read_sheet', 's' * 22)
+    with pytest.raises(AttributeError):
+        outbox.read_sheet
+    with pytest.raises(TypeError):
+        outbox.insert('s' * 22, object())
+    with pytest.raises(TypeError):
+        outbox.insert('s' * 22)
+    with pytest.raises(TypeError):
+        outbox.insert('s' * 22, 'x', positon='end')
+    with pytest.raises(ValueError):
+        outbox.insert('bad', 'x')
+    with pytest.raises(ValueError):
+        outbox.trash(None)
+    assert outbox.operations == {}
+    outbox.close()
+
+
+def test_retries_then_fails(calls, journal):
+    calls.attach_note.side_effect = [UlyssesError('busy'), None]
+    calls.trash.side_effect = UlyssesError('gone')
+    with Outbox(journal, retries=2, retry_delay=0.001) as outbox:
+        note = outbox.attach_note('s' * 22, 'text')
+        trash = outbox.trash('t' * 22)
+        move = outbox.move('s' * 22, index=0)
+        assert outbox.wait(timeout=5)
+
+    assert outbox.status(note).state == APPLIED
+    assert outbox.status(note).attempts == 2
+    assert outbox.status(trash).state == FAILED
+    assert outbox.status(trash).attempts == 3
+    assert outbox.status(trash).error == 'gone'
+    assert outbox.status(move).state == APPLIED
+
+
+def test_reopened_outbox_resumes_pending(calls, journal):
+    outbox = Outbox(journal, start=False)
+    op = outbox.insert('s' * 22, 'text')
+    outbox.close()
+
+    with Outbox(journal) as outbox:
+        assert outbox.wait(op, timeout=5)
+        assert outbox.status(op).state == APPLIED
+        assert outbox.insert('s' * 22, 'again') == op + 1
+        assert outbox.wait(timeout=5)
+    calls.insert.assert_called_with('s' * 22, 'again')
+
+
+def test_interrupted_calls(calls, journal):
+    with io.open(journal, 'wb') as f:
+        for op, call in ((1, 'new_sheet'), (2, 'attach_keywords')):
+            f.write(json.dumps({'op': op, 'event': 'queued', 'call': call,
+                                'args': ['x'], 'kwargs': {}}) + '\n')
+            f.write(json.dumps({'op': op, 'event': 'started'}) + '\n')
+        f.write('{"op": 2, "ev')  # torn line
+
+    with Outbox(journal) as outbox:
+        assert outbox.wait(timeout=5)
+        assert outbox.status(1).state == FAILED  # may have made a sheet
+        assert outbox.status(2).state == APPLIED  # safe to repeat
+    assert not calls.new_sheet.called
+    calls.attach_keywords.assert_called_once_with(u'x')
+
+
+def test_compact_keeps_unfinished_operations(calls, journal):
+    calls.trash.side_effect = UlyssesError('gone')
+    with Outbox(journal, retries=0) as outbox:
+        outbox.insert('s' * 22, 'text')
+        trash = outbox.trash('t' * 22)
+        assert outbox.wait(timeout=5)
+        outbox.compact()
+    assert events(journal) == [(None, None), (trash, 'queued'),
+                               (trash, 'failed')]
+
+    outbox = Outbox(journal, start=False)
+    assert outbox.status(trash).state == FAILED
+    assert outbox.insert('s' * 22, 'text') == trash + 1
+    outbox.close()
+
+
+def test_rejected_calls_fail_without_delaying_the_next(calls, journal):
+    calls.trash.side_effect = UlyssesError('Sheet not found.', code=1)
+    with Outbox(journal, retry_delay=10) as outbox:
+        trash = outbox.trash('t' * 22)
+        insert = outbox.insert('s' * 22, 'text')
+        assert outbox.wait(timeout=2)
+        assert outbox.status(trash).state == FAILED
+        assert outbox.status(trash).attempts == 1
+        assert outbox.status(insert).state == APPLIED
+
+
+def test_argument_errors_fail_without_delaying_the_next(calls, journal):
+    calls.insert.side_effect = AssertionError()
+    with Outbox(journal, retry_delay=10) as outbox:
+        insert = outbox.insert('s' * 22, 'text', format='rtf')
+        trash = outbox.trash('t' * 22)
+        assert outbox.wait(timeout=2)
+        assert outbox.status(insert).state == FAILED
+        assert outbox.status(insert).attempts == 1
+        assert outbox.status(trash).state == APPLIED
@@ -0,0 +1,86 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import random
+import threading
+import time
+
+import mock
+import pytest
+
+from ulysses.parallel import imap_bounded, read_sheets
+
+
+def slow_square(n):
+    time.sleep(random.random() / 500)
+    if n == 3:
+        raise ValueError('three')
+    return n * n
+
+
+def test_ordered():
+    results = list(imap_bounded(slow_square, range(20), 4, ordered=True))
+    assert [r.id for r in results] == range(20)
+    assert results[2].value == 4
+    assert isinstance(results[3].error, ValueError)
+    assert results[3].value is None
+
+
+def test_completion_order_covers_every_item():
+    results = imap_bounded(slow_square, range(20), 4)
+    assert sorted(r.id for r in results) == range(20)
+
+
+def test_concurrency_bounds_items_in_flight_and_pulled():
+    lock = threading.Lock()
+    active = {'now': 0, 'max': 0}
+    pulled = []
+
+    def work(n):
+        with lock:
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        time.sleep(0.002)
+        with lock:
+            active['now'] -= 1
+        return n
+
+    def ids():
+        for n in range(30):
+            pulled.append(n)
+            yield n
+
+    results = imap_bounded(work, ids(), 3, ordered=True)
+    next(results)
+    assert len(pulled) <= 4
+    list(results)
+    assert active['max'] <= 3
+
+
+@pytest.mark.parametrize('ordered', [False, True])
+def test_base_exceptions_in_workers_are_raised(ordered):
+    def interrupted(n):
+        if n == 2:
+            raise KeyboardInterrupt()
+        return slow_square(n)
+
+    with pytest.raises(KeyboardInterrupt):
+        list(imap_bounded(interrupted, range(5), 2, ordered))
+
+
+def test_invalid_concurrency():
+    with pytest.raises(ValueError):
+        list(imap_bounded(slow_square, [1], 0))
+
+
+def test_read_sheets():
+    with mock.patch('ulysses.parallel.calls') as calls:
+        calls.read_sheet.side_effect = lambda id_, text: (id_, text)
+        results = list(read_sheets(['a', 'b'], text=True, ordered=True))
+    assert [r.value for r in results] == [('a', True), ('b', True)]
@@ -0,0 +1,96 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import time
+
+import mock
+import pytest
+
+from ulysses import calls
+from ulysses.cache import SheetCache
+from ulysses.prefetch import Prefetcher
+
+
+def content(identifier):
+    return calls.SheetWithContent(
+        title='t', type='sheet', identifier=identifier,
+        hasLifetimeIdentifier=True, changeToken=identifier + '-token',
+        text=u'text of ' + identifier, keywords=[], notes=[])
+
+
+def group_reply(n_sheets):
+    """get-item reply for group 'g' with sheets s0.. modified in order."""
+    return {'item': {'identifier': 'g', 'type': 'group', 'sheets': [
+        {'identifier': 's%d' % i, 'changeToken': 's%d-token' % i,
+         'modificationDate': i} for i in range(n_sheets)]}}
+
+
+@pytest.fixture
+def client():
+    client = mock.Mock()
+    client.read_sheet.side_effect = lambda identifier, text: content(
+        identifier)
+    return client
+
+
+@pytest.fixture
+def prefetcher(client, tmpdir):
+    prefetcher = Prefetcher(SheetCache(str(tmpdir)), client, idle_delay=0,
+                            start=False)
+    yield prefetcher
+    prefetcher.close()
+
+
+def listener(client):
+    return client.add_listener.call_args[0][0]
+
+
+def test_group_listing_predicts_newest_sheets(client, prefetcher):
+    listener(client)('get-item', {'id': 'g'}, group_reply(5))
+    assert prefetcher.pending() == ['s4', 's3', 's2']
+
+    listener(client)('open', {'id': 'unknown'}, {})
+    assert prefetcher.pending() == ['s4', 's3', 's2']
+    prefetcher.cancel()
+    assert prefetcher.pending() == []
+    assert prefetcher.metrics()['cancelled'] == 3
+
+
+def test_reads_predict_neighbours_and_history(client, prefetcher):
+    listener(client)('get-item', {'id': 'g'}, group_reply(5))
+    prefetcher.cancel()
+    listener(client)('read-sheet', {'id': 's2'}, {})
+    assert prefetcher.pending() == ['s3', 's1']
+    listener(client)('read-sheet', {'id': 's0'}, {})
+    listener(client)('read-sheet', {'id': 's2'}, {})
+    assert prefetcher.pending()[0] == 's0'  # read after s2 before
+
+
+def test_prefetched_reads_are_hits(client, tmpdir):
+    with Prefetcher(SheetCache(str(tmpdir)), client, idle_delay=0,
+                    max_pending=2) as prefetcher:
+        listener(client)('get-item', {'id': 'g'}, group_reply(5))
+        deadline = time.time() + 5
+        while (prefetcher.metrics()['prefetched'] < 2 and
+               time.time() < deadline):
+            time.sleep(0.01)
+        prefetcher.cancel()
+
+        assert prefetcher.read_sheet('s4', 's4-token').text == u'text of s4'
+        # not in a listed group, so predicts nothing more
+        assert prefetcher.read_sheet('x', 'x-token').text == u'text of x'
+        metrics = prefetcher.metrics()
+    assert (metrics['prefetched'], metrics['used'], metrics['hits']) == (
+        2, 1, 1)
+    assert metrics['hit_rate'] == 0.5
+    assert metrics['precision'] == 0.5
+    assert client.read_sheet.call_args_list == [
+        mock.call('s4', text=True), mock.call('s3', text=True),
+        mock.call('x', text=True)]
+    client.remove_listener.assert_called_once_with(listener(client))
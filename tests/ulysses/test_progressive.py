@@ -0,0 +1,132 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import threading
+import time
+
+import mock
+import pytest
+
+from ulysses import calls
+from ulysses.progressive import ProgressiveFetch, fetch_tree
+
+from tests.ulysses.test_calls import tree_dict
+
+
+def unlisted(d):
+    """Return group dict d without its containers, as in a reply from
+    get_root_items(recursive=False)."""
+    return dict((k, v) for k, v in d.items() if k != 'containers')
+
+
+def shallow(d):
+    """Return group dict d as get_item(id, recursive=False) returns it."""
+    return dict(d, containers=[dict(unlisted(c), sheets=[])
+                               for c in d['containers']])
+
+
+def index_groups(d, index):
+    index[d['identifier']] = d
+    for c in d['containers']:
+        index_groups(c, index)
+    return index
+
+
+@pytest.fixture
+def ulysses_calls():
+    full = tree_dict()
+    groups = index_groups(full, {})
+    with mock.patch('ulysses.progressive.calls') as mock_calls:
+        mock_calls.get_root_items.side_effect = (
+            lambda recursive: [calls.Group(**unlisted(full))])
+        mock_calls.get_item.side_effect = (
+            lambda id_, recursive: calls.Group(**shallow(groups[id_])))
+        yield mock_calls
+
+
+def test_fetch_tree(ulysses_calls):
+    roots = fetch_tree()
+    assert roots == [calls.Group(**tree_dict())]
+    ulysses_calls.get_root_items.assert_called_once_with(recursive=False)
+    assert ulysses_calls.get_item.call_args_list[0] == mock.call(
+        'root', recursive=False)
+
+
+def test_yields_groups_breadth_first(ulysses_calls):
+    fetch = ProgressiveFetch(concurrency=1)
+    titles = [group.title for group in fetch]
+    assert titles == ['iCloud', 'Inbox', 'Project', 'Sub']
+    assert fetch.complete
+
+
+def test_partial_tree_visible_while_fetching(ulysses_calls):
+    fetch = ProgressiveFetch(concurrency=1)
+    it = iter(fetch)
+    next(it)
+    root = fetch.roots[0]
+    assert root.get_group_by_title('Project').containers is None
+    next(it)
+    next(it)
+    assert root.get_group_by_title('Project').containers[0].title == 'Sub'
+    assert root.get_group_by_title('Project').containers[0].containers is None
+    it.close()
+    assert not fetch.complete
+
+
+def test_max_depth(ulysses_calls):
+    fetch = ProgressiveFetch(max_depth=1)
+    assert sorted(group.title for group in fetch) == [
+        'Inbox', 'Project', 'iCloud']
+    assert fetch.complete
+    sub = fetch.roots[0].get_group_by_title('Project').containers[0]
+    assert sub.containers is None and sub.sheets == []
+
+    fetch = ProgressiveFetch(max_depth=0)
+    assert [group.title for group in fetch] == ['iCloud']
+    assert [group.title for group in fetch.roots[0].containers] == [
+        'Inbox', 'Project']
+
+
+def test_time_budget(ulysses_calls):
+    release = threading.Event()
+    get_item = ulysses_calls.get_item.side_effect
+
+    def slow_get_item(id_, recursive):
+        if id_ == 'proj':
+            release.wait(5)
+        return get_item(id_, recursive)
+    ulysses_calls.get_item.side_effect = slow_get_item
+    start = time.time()
+    fetch = ProgressiveFetch(time_budget=0.2, concurrency=2)
+    titles = [group.title for group in fetch]
+    release.set()
+    assert time.time() - start < 2
+    assert titles == ['iCloud', 'Inbox']
+    assert not fetch.complete
+
+
+def test_errors_leave_group_unexpanded(ulysses_calls):
+    get_item = ulysses_calls.get_item.side_effect
+
+    def failing_get_item(id_, recursive):
+        if id_ == 'proj':
+            raise calls.UlyssesError('nope')
+        return get_item(id_, recursive)
+    ulysses_calls.get_item.side_effect = failing_get_item
+    fetch = ProgressiveFetch()
+    assert sorted(group.title for group in fetch) == ['Inbox', 'iCloud']
+    assert fetch.errors.keys() == ['proj']
+    assert not fetch.complete
+
+
+def test_run_once(ulysses_calls):
+    fetch = ProgressiveFetch()
+    list(fetch)
+    with pytest.raises(RuntimeError):
+        list(fetch)
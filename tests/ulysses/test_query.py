@@ -0,0 +1,102 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import pytest
+
+from ulysses import calls
+from ulysses.keywords import KeywordIndex
+from ulysses.query import Query, QueryEngine
+
+from tests.ulysses.test_calls import group_dict, sheet_dict
+
+
+def dated(identifier, title, date):
+    sheet = sheet_dict(identifier, title)
+    sheet['creationDate'] = sheet['modificationDate'] = date
+    return sheet
+
+
+@pytest.fixture
+def engine():
+    root = calls.Group(**group_dict('root', 'iCloud', containers=[
+        group_dict('inbox', 'Inbox', sheets=[dated('i1', 'Draft one', 10),
+                                             dated('i2', u'Café notes', 20)]),
+        group_dict('blog', 'Blog', sheets=[dated('b1', 'draft two', 30)],
+                   containers=[group_dict('old', 'Old', sheets=[
+                       dated('o1', 'Drafts', 40),
+                       dated('o2', 'Done', 50)])])]))
+    index = KeywordIndex()
+    for identifier, keywords in (('i1', ['x']), ('b1', ['x', 'y']),
+                                 ('o1', ['y'])):
+        index._set(identifier, None, keywords)
+    return QueryEngine(root, index)
+
+
+def ids(plan):
+    return [item.identifier for item in plan]
+
+
+def test_empty_query_scans_everything_in_walk_order(engine):
+    plan = engine.plan(Query())
+    assert ids(plan) == ['root', 'inbox', 'i1', 'i2', 'blog', 'b1', 'old',
+                         'o1', 'o2']
+    assert plan.explain() == 'scan of the whole tree (~9 candidates)'
+
+
+def test_title_prefix_uses_title_index(engine):
+    plan = engine.plan(Query().titled('DRAFT*'))
+    assert plan.explain() == ("title index prefix range u'draft' "
+                              "(~3 candidates)\n"
+                              "filter: title matches u'draft*'")
+    assert ids(plan) == ['i1', 'b1', 'o1']
+    assert ids(engine.plan(Query().titled('cafe notes'))) == ['i2']
+    assert ids(engine.plan(Query().titled('draft ???'))) == ['i1', 'b1']
+
+
+def test_pattern_without_prefix_scans(engine):
+    plan = engine.plan(Query().titled('*s').under('/iCloud/Blog'))
+    assert plan.access == "scan under '/iCloud/Blog'"
+    assert plan.estimate == 4
+    assert ids(plan) == ['o1']
+
+
+def test_most_selective_index_wins(engine):
+    query = Query().of_type('sheet').modified_between(after=15, before=40)
+    plan = engine.plan(query)
+    assert plan.access == 'modified date range in [15, 40]'
+    assert plan.estimate == 3
+    assert ids(plan) == ['i2', 'b1', 'o1']
+
+    plan = engine.plan(query.under('/iCloud/Inbox'))
+    assert plan.estimate == 2
+    assert ids(plan) == ['i2']
+
+    plan = engine.plan(query.with_id('b1'))
+    assert plan.access == "identifier lookup 'b1'"
+    assert ids(plan) == ['b1']
+
+
+def test_keywords(engine):
+    plan = engine.plan(Query().with_keywords(all_of=['y']).titled('d*'))
+    assert plan.access == 'keyword index all_of y'
+    assert ids(plan) == ['b1', 'o1']
+    assert ids(engine.plan(Query().with_keywords(none_of=['x']))) == ['o1']
+
+    with pytest.raises(ValueError):
+        QueryEngine([]).plan(Query().with_keywords(any_of=['x']))
+
+
+def test_groups_and_unknown_paths(engine):
+    assert ids(engine.plan(Query().of_type('group').under('/iCloud'))) == [
+        'inbox', 'blog', 'old']
+    assert ids(engine.plan(Query().created_between(before=100))) == [
+        'i1', 'i2', 'b1', 'o1', 'o2']
+    assert ids(engine.plan(Query().under('/iCloud/Nope'))) == []
+    with pytest.raises(ValueError):
+        Query().of_type('filter')
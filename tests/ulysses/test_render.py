@@ -0,0 +1,74 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import json
+import StringIO
+
+import ulysses
+from ulysses import calls
+from ulysses.render import render_tree, write_tree
+
+from tests.ulysses.test_calls import group_dict, sheet_dict
+
+
+def library():
+    return calls.Group(**group_dict('root', 'iCloud', containers=[
+        group_dict('inbox', 'Inbox', sheets=[sheet_dict('test', 'test')]),
+        group_dict('proj', 'Project', sheets=[sheet_dict('s1', 'one'),
+                                              sheet_dict('s2', 'two')],
+                   containers=[group_dict('sub', 'Sub')])]))
+
+
+def test_treeview():
+    assert ulysses.treeview(library()) == [
+        'root - iCloud:',
+        'inbox -    Inbox:',
+        'test -       test',
+        'proj -    Project:',
+        's1 -       one',
+        's2 -       two',
+        'sub -       Sub:']
+
+
+def test_max_depth():
+    assert list(render_tree(library(), max_depth=1)) == [
+        'root - iCloud:', 'inbox -    Inbox:', 'proj -    Project:']
+    assert list(render_tree(library(), max_depth=0)) == ['root - iCloud:']
+
+
+def test_predicate_prunes_subtrees():
+    lines = render_tree(library(), predicate=lambda i: i.title != 'Project')
+    assert list(lines) == [
+        'root - iCloud:', 'inbox -    Inbox:', 'test -       test']
+
+
+def test_json_lines():
+    items = [json.loads(line) for line in render_tree(library(), 'json')]
+    assert items[2] == {'identifier': 'test', 'title': 'test',
+                        'type': 'sheet', 'depth': 2}
+
+
+def test_write_alfred():
+    stream = StringIO.StringIO()
+    write_tree(library(), stream, 'alfred', max_depth=1)
+    items = json.loads(stream.getvalue())['items']
+    assert [i['uid'] for i in items] == ['root', 'inbox', 'proj']
+    assert items[1] == {'uid': 'inbox', 'title': 'Inbox', 'arg': 'inbox',
+                        'subtitle': 'group'}
+
+
+def test_deep_nesting_does_not_recurse():
+    root = group = calls.Group(**group_dict('g0', 'g0'))
+    for n in range(1, 5000):
+        sub_group = calls.Group(**group_dict('g%d' % n, 'g%d' % n))
+        group.containers.append(sub_group)
+        group = sub_group
+    lines = list(render_tree(root))
+    assert len(lines) == 5000
+    assert lines[-1] == 'g4999 - ' + '   ' * 4999 + 'g4999:'
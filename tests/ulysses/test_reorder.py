@@ -0,0 +1,97 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import random
+
+import mock
+import pytest
+
+from ulysses import calls
+from ulysses.reorder import (Move, longest_increasing_subsequence,
+                             plan_moves, reorder)
+
+from tests.ulysses.test_calls import group_dict, sheet_dict
+
+
+def apply_moves(current, moves):
+    order = list(current)
+    for move in moves:
+        order.remove(move.id)
+        order.insert(move.index, move.id)
+    return order
+
+
+def test_longest_increasing_subsequence():
+    values = [3, 1, 4, 1, 5, 9, 2, 6]
+    indexes = longest_increasing_subsequence(values)
+    assert [values[i] for i in indexes] == [1, 4, 5, 6]
+    assert longest_increasing_subsequence([]) == []
+    assert longest_increasing_subsequence([2, 1]) == [1]
+
+
+def test_plan_moves_only_moves_out_of_place_items():
+    current = list('abcdefgh')
+    desired = list('abdefgch')  # c moved late
+    assert plan_moves(current, desired) == [Move('c', 6)]
+    assert plan_moves(current, current) == []
+    assert plan_moves(current, list('habcdefg')) == [Move('h', 0)]
+
+
+def test_plan_moves_random_permutations():
+    rng = random.Random(1)
+    for n in (1, 2, 5, 30):
+        for _ in range(50):
+            current = range(n)
+            desired = list(current)
+            rng.shuffle(desired)
+            moves = plan_moves(current, desired)
+            assert apply_moves(current, moves) == desired
+            positions = [desired.index(i) for i in current]
+            assert len(moves) == n - len(
+                longest_increasing_subsequence(positions))
+
+
+def test_plan_moves_rejects_other_items():
+    with pytest.raises(ValueError):
+        plan_moves(['a', 'b'], ['a', 'c'])
+    with pytest.raises(ValueError):
+        plan_moves(['a', 'b'], ['a', 'a'])
+
+
+@pytest.fixture
+def mock_calls():
+    group = calls.Group(**group_dict(
+        'g' * 22, 'Group',
+        sheets=[sheet_dict(c * 22, c) for c in 'abcd'],
+        containers=[group_dict(c * 22, c) for c in 'xy']))
+    with mock.patch('ulysses.reorder.calls') as mock_calls:
+        mock_calls.get_item.return_value = group
+        yield mock_calls
+
+
+def test_reorder_dry_run(mock_calls):
+    moves = reorder('g' * 22, ['d' * 22, 'a' * 22, 'b' * 22, 'c' * 22],
+                    dry_run=True)
+    assert moves == [Move('d' * 22, 0)]
+    assert not mock_calls.move.called
+
+
+def test_reorder(mock_calls):
+    moves = reorder('g' * 22, ['y' * 22, 'b' * 22, 'x' * 22, 'a' * 22,
+                               'c' * 22, 'd' * 22], silent_mode=True)
+    # sheets and sub-groups are ordered separately, one move each
+    assert moves == [Move('a' * 22, 1), Move('x' * 22, 1)]
+    assert mock_calls.move.call_args_list == [
+        mock.call('a' * 22, index=1, silent_mode=True),
+        mock.call('x' * 22, index=1, silent_mode=True)]
+
+
+def test_reorder_unknown_id(mock_calls):
+    with pytest.raises(ValueError):
+        reorder('g' * 22, ['z' * 22])
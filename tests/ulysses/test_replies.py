@@ -0,0 +1,64 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import json
+import urllib
+
+from ulysses.replies import decode_reply, unquote
+
+
+TITLE = u'50% ‘quoted’ & more'
+
+
+def sheet():
+    return {'identifier': 'ENYa9PBxg3Vj7ws4MO_SWA', 'type': 'sheet',
+            'title': urllib.quote(TITLE.encode('utf8')),
+            'modificationDate': 513446268.980628}
+
+
+def ulysses_reply(reply):
+    return urllib.quote(json.dumps(reply, ensure_ascii=False).encode('utf8'))
+
+
+def legacy_decode(stdout, field=None, quoted=False):
+    """Decoding as done before decode_reply()."""
+    reply = json.loads(urllib.unquote(stdout).decode('utf8'))
+    if field:
+        nested = reply[field]
+        reply[field] = json.loads(urllib.unquote(nested) if quoted
+                                  else nested)
+    return reply
+
+
+def test_plain_reply():
+    stdout = ulysses_reply({'apiVersion': '2'})
+    assert decode_reply('get-version', stdout) == {'apiVersion': '2'}
+
+
+def test_get_root_items():
+    stdout = ulysses_reply({'items': json.dumps([sheet(), sheet()])})
+    reply = decode_reply('get-root-items', stdout)
+    assert reply == legacy_decode(stdout, 'items')
+    assert reply['items'][1]['modificationDate'] == 513446268.980628
+
+
+def test_get_item_and_read_sheet():
+    for action, field in (('get-item', 'item'), ('read-sheet', 'sheet')):
+        nested = urllib.quote(json.dumps(sheet()))
+        stdout = ulysses_reply({field: nested})
+        reply = decode_reply(action, stdout)
+        assert reply == legacy_decode(stdout, field, quoted=True)
+        assert urllib.unquote(reply[field]['title'].encode('utf8')).decode(
+            'utf8') == TITLE
+
+
+def test_unquote_matches_urllib():
+    for s in ['', 'plain', '%41%42', 'back\\slash%5C%41', '50%', '%4',
+              '%zz%41', '%E2%80%98quoted%E2%80%99', '%%41']:
+        assert unquote(s) == urllib.unquote(s)
@@ -0,0 +1,96 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import threading
+import time
+
+import mock
+
+import ulysses.xcallback
+from ulysses.client import default_client
+from ulysses.scheduler import (CallScheduler, install_scheduler, priority,
+                               uninstall_scheduler, BACKGROUND, INTERACTIVE,
+                               NORMAL)
+
+
+def queue_calls(scheduler, priorities):
+    """Queue a call per priority behind a running one; return start order."""
+    started = []
+    scheduler.acquire(NORMAL)  # Ulysses is busy
+
+    def call(n, priority_class):
+        scheduler.acquire(priority_class)
+        started.append(n)
+        scheduler.release(priority_class)
+
+    threads = []
+    for n, priority_class in enumerate(priorities):
+        thread = threading.Thread(target=call, args=(n, priority_class))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.01)
+    scheduler.release(NORMAL)
+    for thread in threads:
+        thread.join()
+    return started
+
+
+def test_higher_classes_go_first():
+    started = queue_calls(CallScheduler(),
+                          [BACKGROUND, NORMAL, BACKGROUND, INTERACTIVE])
+    assert started == [3, 1, 0, 2]
+
+
+def test_starved_call_goes_first():
+    scheduler = CallScheduler(max_wait={BACKGROUND: 0.005})
+    started = queue_calls(scheduler, [BACKGROUND, INTERACTIVE])
+    assert started == [0, 1]
+
+
+def test_class_limit():
+    scheduler = CallScheduler(max_in_flight=2, class_limits={BACKGROUND: 1})
+    scheduler.acquire(BACKGROUND)
+    acquired = threading.Event()
+
+    def second_background():
+        scheduler.acquire(BACKGROUND)
+        acquired.set()
+
+    threading.Thread(target=second_background).start()
+    assert not acquired.wait(0.05)
+    scheduler.acquire(INTERACTIVE)  # other classes still get through
+    assert scheduler.metrics()['background']['queued'] == 1
+    scheduler.release(BACKGROUND)
+    assert acquired.wait(1)
+
+
+def test_metrics():
+    scheduler = CallScheduler()
+    queue_calls(scheduler, [BACKGROUND])
+    metrics = scheduler.metrics()
+    assert metrics['background']['completed'] == 1
+    assert metrics['background']['max_wait'] > 0.005
+    assert metrics['normal'] == {'queued': 0, 'running': 0, 'completed': 1,
+                                 'mean_wait': metrics['normal']['mean_wait'],
+                                 'max_wait': metrics['normal']['max_wait'],
+                                 'oldest_wait': 0.0}
+
+
+def test_call_ulysses_goes_through_installed_scheduler():
+    scheduler = install_scheduler()
+    try:
+        with mock.patch.object(default_client(), 'xcall_client'):
+            ulysses.xcallback.call_ulysses('get-item', {})
+            with priority(BACKGROUND):
+                ulysses.xcallback.call_ulysses('get-item', {})
+    finally:
+        uninstall_scheduler()
+    metrics = scheduler.metrics()
+    assert metrics['interactive']['completed'] == 1
+    assert metrics['background']['completed'] == 1
@@ -0,0 +1,146 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import pytest
+
+from ulysses import calls
+from ulysses.search import TitleIndex, fold
+
+from tests.ulysses.test_calls import group_dict, sheet_dict
+
+
+def sheet(identifier, title, date=0):
+    d = sheet_dict(identifier, title)
+    d['modificationDate'] = date
+    return d
+
+
+@pytest.fixture
+def library():
+    return calls.Group(**group_dict('root', 'iCloud', containers=[
+        group_dict('blog', 'Blog', sheets=[
+            sheet('s1', u'Café review'),
+            sheet('s2', 'Project notes', date=10),
+            sheet('s3', 'Notes on the project', date=20)]),
+        group_dict('proj', 'Project', containers=[
+            group_dict('old', 'Archive', sheets=[
+                sheet('s4', 'project', date=0)])])]))
+
+
+@pytest.fixture
+def index(library):
+    return TitleIndex(library)
+
+
+def ids(items):
+    return [item.identifier for item in items]
+
+
+def test_fold():
+    assert fold(u'Café') == u'cafe'
+    assert fold('Caf\xc3\xa9') == u'cafe'
+    assert fold(u'Straße') == u'strasse'
+    assert fold(u'ÆON') == u'aeon'
+
+
+def test_len(index):
+    assert len(index) == 8
+
+
+def test_search_folds_accents(index):
+    assert ids(index.search('cafe')) == ['s1']
+    assert ids(index.search(u'CAFÉ')) == ['s1']
+
+
+def test_search_ranks_exact_then_prefix_then_substring(index):
+    assert ids(index.search('project')) == ['proj', 's4', 's2', 's3']
+
+
+def test_search_recency_breaks_ties(index):
+    assert ids(index.search('notes')) == ['s3', 's2']
+
+
+def test_search_prefix_as_you_type(index):
+    assert ids(index.search('proj no'))[0] == 's2'
+
+
+def test_search_tolerates_typo(index):
+    assert 's2' in ids(index.search('projetc notes', min_similarity=0.3))
+
+
+def test_search_type(index):
+    assert ids(index.search('project', type_='group')) == ['proj']
+    assert 'proj' not in ids(index.search('project', type_='sheet'))
+
+
+def test_search_type_group_includes_every_container(index):
+    trash = dict(group_dict('bin', 'Project trash'), type='trash')
+    index.add(calls.Group(**trash), depth=1)
+    assert ids(index.search('project', type_='group')) == ['proj', 'bin']
+    assert 'bin' not in ids(index.search('project', type_='sheet'))
+    index.remove('bin')
+    assert ids(index.search('project', type_='group')) == ['proj']
+
+
+def test_search_limit_and_scores(index):
+    results = index.search('project', limit=2, with_scores=True)
+    assert [item.identifier for _, item in results] == ['proj', 's4']
+    assert results[0][0] > results[1][0]
+
+
+def test_search_empty_query(index):
+    assert index.search('  ') == []
+
+
+def test_remove(index):
+    index.remove('s1')
+    assert index.search('cafe') == []
+    assert len(index) == 7
+    index.remove('missing')
+
+
+def test_update(index):
+    item = calls.Sheet(**sheet('s1', 'Tea review'))
+    index.update(item)
+    assert index.search('cafe') == []
+    assert ids(index.search('tea')) == ['s1']
+    assert index._entries['s1'].depth == 2
+
+
+def test_add(index):
+    index.add(calls.Sheet(**sheet('s5', 'Cafeteria')), depth=1)
+    assert ids(index.search('cafe')) == ['s5', 's1']  # shallower first
+
+
+def test_search_words_in_order(index):
+    assert ids(index.search('notes proj'))[0] == 's3'
+    assert ids(index.search('proj notes'))[0] == 's2'
+
+
+def test_search_many_matches_walks_by_rank():
+    groups = [group_dict('g%d' % n, 'Group', sheets=[
+        sheet('g%ds%d' % (n, m), 'Draft %d' % m, date=n * 100 + m)
+        for m in range(50)]) for n in range(4)]
+    index = TitleIndex(calls.Group(**group_dict('root', 'iCloud',
+                                                containers=groups)))
+    assert ids(index.search('d', limit=3)) == ['g3s49', 'g3s48', 'g3s47']
+    assert ids(index.search('draft 1', limit=2)) == ['g3s1', 'g2s1']
+
+
+def test_search_typo_among_many_titles():
+    sheets = [sheet('d%d' % m, 'Draft %d' % m, date=m) for m in range(200)]
+    sheets += [sheet('j%d' % m, 'Journal', date=m) for m in range(3)]
+    index = TitleIndex(calls.Group(**group_dict('root', 'iCloud',
+                                                sheets=sheets)))
+    # few titles share the rarest trigrams: counted from the postings
+    scored = index.search('jurnal', limit=5, with_scores=True)
+    assert [item.identifier for _, item in scored] == ['j2', 'j1', 'j0']
+    assert set(quality for (quality, _), _ in scored) == set([0.6 * 4 / 6])
+    # many do: found by walking titles in rank order
+    assert ids(index.search('drafr', limit=2)) == ['d199', 'd198']
@@ -0,0 +1,101 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import pytest
+
+from ulysses import calls
+from ulysses.snapshot import GroupView, SheetView, Snapshot, write_snapshot
+
+from tests.ulysses.test_calls import group_dict, sheet_dict, tree_dict
+
+
+@pytest.fixture
+def tree():
+    d = tree_dict()
+    sheet = d['containers'][0]['sheets'][0]
+    sheet.update(title=u'café', titleType='heading1',
+                 changeToken='1|2', creationDate=513446267,
+                 modificationDate=513446268.980628)
+    d['containers'][1]['containers'][0]['sheets'][0]['modificationDate'] = None
+    return calls.Group(**d)
+
+
+@pytest.fixture
+def snapshot(tree, tmpdir):
+    path = str(tmpdir.join('library.snapshot'))
+    write_snapshot(tree, path)
+    with Snapshot(path) as snapshot:
+        yield snapshot
+
+
+def test_round_trip(tree, snapshot):
+    assert snapshot.roots()[0].materialize() == tree
+
+
+def test_len(snapshot):
+    assert len(snapshot) == 7
+
+
+def test_breadth_first_order(snapshot):
+    titles = [snapshot.item(i).title for i in range(len(snapshot))]
+    assert titles == ['iCloud', 'Inbox', 'Project', u'café', 'one', 'Sub',
+                      'deep']
+    assert snapshot.item(4).parent.title == 'Project'
+
+
+def test_views(snapshot):
+    root = snapshot.roots()[0]
+    assert isinstance(root, GroupView)
+    assert root.parent is None
+    inbox = root.get_group_by_title('Inbox')
+    sheet = inbox.sheets[0]
+    assert isinstance(sheet, SheetView)
+    assert sheet.title == u'café'
+    assert sheet.titleType == 'heading1'
+    assert sheet.changeToken == '1|2'
+    assert sheet.creationDate == 513446267
+    assert sheet.modificationDate == 513446268.980628
+    assert sheet.hasLifetimeIdentifier is True
+    assert sheet.parent == inbox
+    project = root.get_group_by_title('Project')
+    assert project.get_sheet_by_title('one').modificationDate == 0
+    deep = project.get_group_by_title('Sub').sheets[0]
+    assert deep.modificationDate is None
+    assert deep.titleType is None
+
+
+def test_walk(tree, snapshot):
+    root = snapshot.roots()[0]
+    assert ([item.identifier for item in root.walk()] ==
+            [item.identifier for item in tree.walk()])
+    assert [s.title for s in root.iter_sheets()] == [u'café', 'one', 'deep']
+
+
+def test_find(snapshot):
+    assert snapshot.find('s2').title == 'deep'
+    assert snapshot.find(u'proj').title == 'Project'
+    with pytest.raises(KeyError):
+        snapshot.find('missing')
+
+
+def test_non_recursive_group(tmpdir):
+    group = calls.Group(**group_dict('g', 'G', sheets=[sheet_dict('s', 't')]))
+    group.containers = None
+    path = str(tmpdir.join('s'))
+    write_snapshot([group], path)
+    with Snapshot(path) as snapshot:
+        assert snapshot.roots()[0].containers is None
+        assert snapshot.roots()[0].materialize() == group
+
+
+def test_not_a_snapshot(tmpdir):
+    path = tmpdir.join('junk')
+    path.write('not a snapshot' * 10)
+    with pytest.raises(ValueError):
+        Snapshot(str(path))
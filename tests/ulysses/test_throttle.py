@@ -0,0 +1,105 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+import threading
+import time
+
+import mock
+import pytest
+
+import ulysses.xcallback
+from ulysses.client import UlyssesClient, default_client
+from ulysses.scheduler import CallScheduler, install_scheduler
+from ulysses.throttle import (AdaptiveLimiter, install_limiter,
+                              uninstall_limiter)
+
+from tests.ulysses.test_client import FakeTransport
+
+
+def call(limiter, action='read-sheet', seconds=0.0, error=None):
+    with limiter.slot(action):
+        time.sleep(seconds)
+        if error is not None:
+            raise error
+
+
+def test_fast_calls_increase_concurrency():
+    limiter = AdaptiveLimiter(latency_target=1.0, max_concurrency=3)
+    for _ in range(10):
+        call(limiter)
+    assert limiter.limits()['concurrency'] == 3
+    assert limiter.limits()['interval'] == 0.0
+
+
+def test_slow_call_backs_off():
+    limiter = AdaptiveLimiter(latency_target=0.001, interval_step=0.002)
+    for _ in range(5):
+        call(limiter)
+    call(limiter, seconds=0.01)
+    limits = limiter.limits()
+    assert limits['concurrency'] == 1
+    assert limits['interval'] == 0.002
+    assert limits['rate'] == 500
+
+    start = time.time()
+    call(limiter)
+    call(limiter)
+    assert time.time() - start >= 0.002
+
+
+def test_per_action_targets_and_stats():
+    limiter = AdaptiveLimiter(latency_target={'read-sheet': 0.5, None: 0})
+    call(limiter, 'read-sheet', 0.002)
+    assert limiter.limits()['interval'] == 0.0
+    call(limiter, 'get-item', 0.002)
+    assert limiter.limits()['interval'] > 0.0
+
+    with pytest.raises(ulysses.xcallback.UlyssesError):
+        call(limiter, 'get-item', error=ulysses.xcallback.UlyssesError())
+    stats = limiter.stats()['get-item']
+    assert (stats['calls'], stats['errors'], stats['error_rate']) == (
+        2, 1, 0.5)
+
+
+def test_other_errors_back_off():
+    limiter = AdaptiveLimiter(max_concurrency=4)
+    for _ in range(10):
+        call(limiter)
+    with pytest.raises(AssertionError):
+        call(limiter, error=AssertionError('xcall already running'))
+    assert limiter.limits()['concurrency'] == 2
+
+
+def test_install_wraps_existing_gate():
+    scheduler = install_scheduler(CallScheduler())
+    limiter = install_limiter()
+    try:
+        assert limiter.inner is scheduler
+        with mock.patch.object(default_client(), 'xcall_client'):
+            ulysses.xcallback.call_ulysses('get-version')
+    finally:
+        uninstall_limiter(limiter)
+        ulysses.xcallback.set_call_gate(None)
+    assert limiter.stats()['get-version']['calls'] == 1
+    assert scheduler.metrics()['interactive']['completed'] == 1
+
+
+def test_latency_excludes_waiting_for_the_lock():
+    lock = threading.Lock()
+    limiter = AdaptiveLimiter(latency_target=0.02)
+    client = UlyssesClient(transport=FakeTransport(), gate=limiter,
+                           lock=lock)
+    lock.acquire()
+    timer = threading.Timer(0.05, lock.release)
+    timer.start()
+    start = time.time()
+    client.call('open-all')
+    assert time.time() - start >= 0.05
+    assert limiter.stats()['open-all']['latency'] < 0.02
+    assert limiter.limits()['interval'] == 0.0
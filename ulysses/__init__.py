@@ -21,6 +21,8 @@ and Sheets
 import logging
 
 from .calls import *
+from ulysses.parallel import get_items, read_sheets
+from ulysses.render import render_tree, write_tree
 from ulysses.xcallback import set_access_token
 
 
@@ -45,13 +47,8 @@ def filter_items(items, title, type_='sheet_or_group'):
 
 
 def treeview(group, indent=0):
-    """"Recursively group structure returning a list of printable lines."""
-    lines = []
-    lines.append(
-        group.identifier + ' - ' + '   ' * indent + group.title + ':')
-    for sheet in group.sheets:
-        lines.append(
-            sheet.identifier + ' - ' + '   ' * (indent + 1) + sheet.title)
-    for sub_group in group.containers:
-        lines.extend(treeview(sub_group, indent + 1))
-    return lines
+    """Return group structure as a list of printable lines.
+
+    See render_tree() to stream lines, limit depth, filter or change format.
+    """
+    return list(render_tree(group, indent=indent))
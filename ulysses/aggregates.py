@@ -0,0 +1,188 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Per-group totals over the whole tree below each group.
+
+Showing sheet and word counts against every group by walking the tree below
+each one repeats work at every level. GroupAggregates computes them for
+every group in one bottom-up pass, and afterwards keeps them current as
+sheets change by adjusting only the changed sheet's ancestors:
+
+    aggregates = GroupAggregates(root, cache=SheetCache('~/.cache/sheets'))
+    aggregates[inbox_id].words
+    aggregates.update_sheet(calls.read_sheet(sheet_id, text=True))
+
+Keyword, word and character counts come from sheets' text, so count only
+sheets whose content is known: given as a SheetWithContent, or found in the
+cache under the sheet's current changeToken. Others are counted in unread.
+"""
+
+import collections
+
+from .calls import SheetWithContent
+
+
+__all__ = ['GroupAggregates', 'Aggregate']
+
+
+class Aggregate(collections.namedtuple('Aggregate', [
+        'sheets', 'modified', 'keywords', 'words', 'characters', 'unread'])):
+    """Totals over every sheet below a group.
+
+    sheets -- number of sheets
+    modified -- newest modificationDate, or None if no sheet has one
+    keywords -- dict of keyword -> number of sheets with it
+    words -- number of whitespace separated words in sheets' text
+    characters -- number of characters in sheets' text
+    unread -- number of sheets whose content was not known, and so are not
+              included in keywords, words or characters
+    """
+    __slots__ = ()
+
+
+class _Totals(object):
+
+    __slots__ = ('sheets', 'modified', 'keywords', 'words', 'characters',
+                 'unread')
+
+    def __init__(self):
+        self.sheets = 0
+        self.modified = None
+        self.keywords = collections.Counter()
+        self.words = 0
+        self.characters = 0
+        self.unread = 0
+
+    def add(self, other, sign=1):
+        self.sheets += sign * other.sheets
+        self.words += sign * other.words
+        self.characters += sign * other.characters
+        self.unread += sign * other.unread
+        for keyword, count in other.keywords.iteritems():
+            self.keywords[keyword] += sign * count
+            if not self.keywords[keyword]:
+                del self.keywords[keyword]
+        if sign > 0 and other.modified > self.modified:
+            self.modified = other.modified
+
+
+class GroupAggregates(object):
+    """Aggregates of every group in a tree, by group id.
+
+    aggregates[group_id] returns the group's Aggregate.
+
+    Attributes:
+
+    root -- the Group the aggregates were built from
+    cache -- SheetCache consulted for the content of sheets, or None
+    """
+
+    def __init__(self, root, cache=None):
+        self.root = root
+        self.cache = cache
+        self._totals = {}  # group id -> _Totals of everything below
+        self._sheets = {}  # sheet id -> _Totals of the sheet alone
+        self._parents = {}  # item id -> id of the group containing it
+        self._children = {}  # group id -> (sheet ids, sub-group ids)
+        self._build()
+
+    def __getitem__(self, group_id):
+        totals = self._totals[group_id]
+        return Aggregate(totals.sheets, totals.modified, dict(totals.keywords),
+                         totals.words, totals.characters, totals.unread)
+
+    def __contains__(self, group_id):
+        return group_id in self._totals
+
+    def update_sheet(self, sheet):
+        """Take account of a changed Sheet or SheetWithContent.
+
+        Updates the totals of the groups containing it, up to the root.
+        """
+        group_id = self._parents[sheet.identifier]
+        old = self._sheets[sheet.identifier]
+        new = self._sheet_totals(sheet)
+        self._sheets[sheet.identifier] = new
+        self._adjust(group_id, new, old)
+
+    def add_sheet(self, sheet, group_id):
+        """Take account of a Sheet (or SheetWithContent) new to a group."""
+        self._parents[sheet.identifier] = group_id
+        self._children[group_id][0].append(sheet.identifier)
+        new = self._sheets[sheet.identifier] = self._sheet_totals(sheet)
+        self._adjust(group_id, new, _Totals())
+
+    def remove_sheet(self, sheet_id):
+        """Take account of a sheet gone from the tree (trashed or moved)."""
+        group_id = self._parents.pop(sheet_id)
+        self._children[group_id][0].remove(sheet_id)
+        old = self._sheets.pop(sheet_id)
+        self._adjust(group_id, _Totals(), old)
+
+    def _build(self):
+        # Reversed breadth-first order visits every group after all the
+        # groups below it
+        groups = list(self.root.iter_groups(order='bfs'))
+        for group in reversed(groups):
+            totals = self._totals[group.identifier] = _Totals()
+            sheet_ids = []
+            for sheet in group.sheets:
+                own = self._sheets[sheet.identifier] = self._sheet_totals(
+                    sheet)
+                self._parents[sheet.identifier] = group.identifier
+                sheet_ids.append(sheet.identifier)
+                totals.add(own)
+            group_ids = []
+            for sub_group in group.containers or []:
+                self._parents[sub_group.identifier] = group.identifier
+                group_ids.append(sub_group.identifier)
+                totals.add(self._totals[sub_group.identifier])
+            self._children[group.identifier] = (sheet_ids, group_ids)
+
+    def _adjust(self, group_id, new, old):
+        """Replace old with new in the totals of group_id and its ancestors.
+
+        O(depth), except where the newest modificationDate was old's and is
+        now no longer, when each group's is found again from its children.
+        """
+        recompute = (old.modified is not None and
+                     not new.modified >= old.modified)
+        while group_id is not None:
+            totals = self._totals[group_id]
+            lost_newest = recompute and totals.modified == old.modified
+            totals.add(old, -1)
+            totals.add(new)
+            if lost_newest:
+                totals.modified = self._newest(group_id)
+            else:
+                recompute = False  # no ancestor's newest can change either
+            group_id = self._parents.get(group_id)
+
+    def _newest(self, group_id):
+        sheet_ids, group_ids = self._children[group_id]
+        dates = ([self._sheets[i].modified for i in sheet_ids] +
+                 [self._totals[i].modified for i in group_ids])
+        dates = [date for date in dates if date is not None]
+        return max(dates) if dates else None
+
+    def _sheet_totals(self, sheet):
+        totals = _Totals()
+        totals.sheets = 1
+        totals.modified = sheet.modificationDate
+        if not isinstance(sheet, SheetWithContent) and self.cache is not None:
+            cached = self.cache.get(sheet.identifier, sheet.changeToken)
+            sheet = cached or sheet
+        if isinstance(sheet, SheetWithContent):
+            totals.keywords.update(set(sheet.keywords))
+            totals.words = len(sheet.text.split())
+            totals.characters = len(sheet.text)
+        else:
+            totals.unread = 1
+        return totals
@@ -0,0 +1,183 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Alfred script filter output for title searches, cached per query.
+
+Alfred runs a script filter afresh for every keystroke, and each run would
+otherwise load the library, index it, search it and serialise the results.
+A ScriptFilter searches a snapshot (see ulysses.snapshot) and keeps each
+query's script filter items on disk, keyed on the snapshot's version (the
+time it was written), so a query typed before, e.g. after a backspace or in
+a later session, is answered by reading one small file:
+
+    script_filter = ScriptFilter('~/.cache/ulysses/library.snapshot',
+                                 '~/.cache/ulysses/alfred', rerun=1.0)
+    script_filter.write(query, sys.stdout)
+
+or from the workflow's script:
+
+    python -m ulysses.alfred --rerun 1 SNAPSHOT CACHE_DIRECTORY "{query}"
+
+Each item has its uid and arg (the identifier), title and subtitle (the
+path of the group holding it, e.g. '/iCloud/Project') worked out when the
+query was first answered. Writing a new snapshot changes its version, so
+later queries miss the cache and are searched again; the directories of
+older versions' results are then removed. Nothing else in the directory is
+touched, so it may be shared, e.g. with the snapshot itself. Given rerun,
+Alfred reruns the script filter that many seconds after showing results,
+so a snapshot refreshed meanwhile is picked up while Alfred is still open.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+from .search import TitleIndex, fold
+from .snapshot import Snapshot
+from .storage import atomic_write, ensure_directory
+
+
+__all__ = ['ScriptFilter', 'main']
+
+
+# name of the directory of results for a snapshot version, e.g. '1492.500000'
+_VERSION = re.compile(r'^\d+\.\d{6}$')
+
+
+class ScriptFilter(object):
+    """Cached Alfred script filter over a snapshot's titles.
+
+    Attributes:
+
+    snapshot_path -- snapshot file searched
+    directory -- directory holding cached results
+    limit -- maximum number of items returned for a query
+    type_ -- type of items returned, 'sheet', 'group' or 'sheet_or_group'
+    rerun -- seconds (0.1 to 5.0) after which Alfred reruns the script
+             filter, or None
+    hits -- number of queries answered from the cache
+    misses -- number of queries searched
+    """
+
+    def __init__(self, snapshot_path, directory, limit=20,
+                 type_='sheet_or_group', rerun=None):
+        self.snapshot_path = os.path.expanduser(snapshot_path)
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.limit = limit
+        self.type_ = type_
+        self.rerun = rerun
+        self.hits = 0
+        self.misses = 0
+        self._index = None  # (version, Snapshot, TitleIndex)
+
+    def items(self, query):
+        """Return list of Alfred item dictionaries matching query."""
+        folded = fold(query).strip()
+        if not folded:
+            return []
+        with Snapshot(self.snapshot_path) as snapshot:
+            version = '%.6f' % snapshot.created
+        path = self._path(version, folded)
+        try:
+            with open(path, 'rb') as f:
+                items = json.loads(f.read())
+            self.hits += 1
+            return items
+        except (IOError, ValueError):
+            pass
+        self.misses += 1
+        items = self._search(version, folded)
+        self._prune(version)
+        ensure_directory(os.path.dirname(path))
+        atomic_write(path, json.dumps(items))
+        return items
+
+    def document(self, query):
+        """Return the script filter JSON document for query."""
+        document = {'items': self.items(query)}
+        if self.rerun is not None:
+            document['rerun'] = self.rerun
+        return json.dumps(document)
+
+    def write(self, query, stream):
+        """Write the script filter JSON document for query to stream."""
+        stream.write(self.document(query) + '\n')
+
+    def close(self):
+        """Release the snapshot held open for searching, if any."""
+        if self._index is not None:
+            self._index[1].close()
+            self._index = None
+
+    # Internals
+
+    def _path(self, version, folded):
+        key = '%s-%d-%s' % (self.type_, self.limit, folded.encode('utf-8'))
+        return os.path.join(self.directory, version,
+                            hashlib.sha1(key).hexdigest() + '.json')
+
+    def _search(self, version, folded):
+        if self._index is None or self._index[0] != version:
+            self.close()
+            snapshot = Snapshot(self.snapshot_path)
+            self._index = (version, snapshot, TitleIndex(snapshot.roots()))
+        results = self._index[2].search(folded, self.limit, self.type_)
+        paths = {}  # group index in the snapshot -> path
+
+        def path(group):
+            if group is None:
+                return u''
+            if group.index not in paths:
+                paths[group.index] = path(group.parent) + u'/' + group.title
+            return paths[group.index]
+
+        return [{'uid': item.identifier, 'arg': item.identifier,
+                 'title': item.title, 'subtitle': path(item.parent) or u'/'}
+                for item in results]
+
+    def _prune(self, version):
+        """Remove cached results of snapshot versions other than version."""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name != version and _VERSION.match(name) and os.path.isdir(
+                    os.path.join(self.directory, name)):
+                shutil.rmtree(os.path.join(self.directory, name),
+                              ignore_errors=True)
+
+
+def main(argv=None, stdout=None):
+    """Write the script filter document for a query; return exit status."""
+    parser = argparse.ArgumentParser(
+        prog='python -m ulysses.alfred',
+        description='Write Alfred script filter JSON for a title search.')
+    parser.add_argument('snapshot', help='snapshot file to search')
+    parser.add_argument('directory', help='directory of cached results')
+    parser.add_argument('query', nargs='?', default='', help='text typed')
+    parser.add_argument('--limit', type=int, default=20,
+                        help='maximum number of items')
+    parser.add_argument('--rerun', type=float,
+                        help='seconds after which Alfred reruns the filter')
+    args = parser.parse_args(argv)
+    script_filter = ScriptFilter(args.snapshot, args.directory, args.limit,
+                                 rerun=args.rerun)
+    try:
+        script_filter.write(args.query, stdout or sys.stdout)
+    finally:
+        script_filter.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
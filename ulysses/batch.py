@@ -0,0 +1,197 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Run many calls in one process from JSON lines.
+
+Scripts calling ulysses once per operation pay interpreter start up and
+`import ulysses` every time. Instead, write one operation per line and run
+them all at once:
+
+    $ cat operations.jsonl
+    {"call": "get_item", "args": ["hZ7IX2jqKbVmPGlYUXkZjQ"]}
+    {"call": "insert", "args": ["aFV99jXk9_AHHqZJ6znb8w", "more"],
+     "kwargs": {"silent_mode": true}, "id": "append"}
+    $ python -m ulysses.batch --access-token TOKEN -j 4 operations.jsonl
+    {"id": 1, "call": "get_item", "result": {...}, "error": null}
+    {"id": "append", "call": "insert", "result": null, "error": null}
+
+Each operation names a function of ulysses.calls, with optional positional
+"args" and keyword "kwargs", and an "id" echoed in its result (the line
+number by default). Operations are read from a file, or stdin if none is
+given, and a result line is written to stdout as each completes. Items are
+written as dictionaries of their attributes, groups with their sheets and
+containers.
+
+All calls are made through one UlyssesClient. Runs of consecutive reads
+(see READ_CALLS) are made from up to --jobs threads at once, so their
+results may come out of order unless --ordered is given; every other call
+waits for the operations before it and is waited for by those after it.
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+from . import calls
+from .client import UlyssesClient, default_client
+from .items import AbstractItem
+from .parallel import imap_bounded
+
+
+__all__ = ['run_batch', 'main', 'CALLS', 'READ_CALLS']
+
+
+logger = logging.getLogger(__name__)
+
+
+CALLS = frozenset(name for name in calls.__all__ if name != 'UlyssesError')
+
+# calls which neither change the library nor bring Ulysses forward, so may be
+# made in any order relative to each other
+READ_CALLS = frozenset([
+    'get_version', 'get_root_items', 'get_item', 'read_sheet',
+    'get_quick_look_url'])
+
+
+class _Operation(object):
+
+    def __init__(self, id, call=None, args=(),  # @ReservedAssignment
+                 kwargs=None, error=None):
+        self.id = id
+        self.call = call
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.error = error
+
+    @property
+    def is_read(self):
+        return self.error is None and self.call in READ_CALLS
+
+
+def run_batch(lines, client=None, concurrency=1, ordered=False):
+    """Yield a result dictionary for each operation as it completes.
+
+    lines -- iterable of JSON operation lines; blank lines are skipped
+    client -- UlyssesClient to call; the default client if None
+    concurrency -- maximum number of reads in flight at once
+    ordered -- yield results in the order of lines if True
+
+    Each result has the operation's id and call, and either the call's
+    result (as JSON compatible values) or an error message.
+    """
+    client = client or default_client()
+    operations = _parse(lines)
+    barrier = []
+
+    def reads():
+        for operation in operations:
+            if not operation.is_read:
+                barrier.append(operation)
+                return
+            yield operation
+
+    def run(operation):
+        return getattr(client, operation.call)(*operation.args,
+                                               **operation.kwargs)
+
+    while True:
+        if concurrency > 1:
+            for outcome in imap_bounded(run, reads(), concurrency, ordered):
+                yield _result(outcome.id, outcome.value, outcome.error)
+        else:
+            for operation in reads():
+                yield _run_one(run, operation)
+        if not barrier:
+            return
+        yield _run_one(run, barrier.pop())
+
+
+def main(argv=None, stdin=None, stdout=None):
+    """Run the operations named on the command line; return exit status.
+
+    The status is 1 if any operation failed.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m ulysses.batch',
+        description='Run ulysses.calls operations read as JSON lines.')
+    parser.add_argument('path', nargs='?', default='-',
+                        help='file of operations, stdin if - or omitted')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='maximum number of reads in flight at once')
+    parser.add_argument('--ordered', action='store_true',
+                        help='write results in the order of operations')
+    parser.add_argument('--access-token',
+                        help='access-token for calls needing one')
+    args = parser.parse_args(argv)
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+
+    client = UlyssesClient(args.access_token)
+    source = stdin if args.path == '-' else open(args.path)
+    failed = False
+    try:
+        for result in run_batch(source, client, args.jobs, args.ordered):
+            failed = failed or result['error'] is not None
+            stdout.write(json.dumps(result) + '\n')
+            stdout.flush()
+    finally:
+        if source is not stdin:
+            source.close()
+    return 1 if failed else 0
+
+
+def _parse(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+            operation = _Operation(entry.get('id', number), entry['call'],
+                                   entry.get('args', ()),
+                                   entry.get('kwargs'))
+        except (ValueError, KeyError, AttributeError, TypeError) as e:
+            yield _Operation(number, error="Could not read line %d: %s" % (
+                number, e))
+            continue
+        if operation.call not in CALLS:
+            operation.error = "Unknown call '%s'" % operation.call
+        yield operation
+
+
+def _run_one(run, operation):
+    if operation.error is not None:
+        return _result(operation, None, operation.error)
+    try:
+        return _result(operation, run(operation), None)
+    except Exception as e:
+        logger.debug('Operation %r failed: %s' % (operation.id, e))
+        return _result(operation, None, e)
+
+
+def _result(operation, value, error):
+    if isinstance(error, Exception):
+        error = '%s: %s' % (type(error).__name__, error)
+    return {'id': operation.id, 'call': operation.call,
+            'result': _jsonable(value), 'error': error}
+
+
+def _jsonable(value):
+    """Return value with items replaced by dictionaries of their state."""
+    if isinstance(value, AbstractItem):
+        return dict((name, _jsonable(attribute)) for name, attribute
+                    in value._state().iteritems())
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(element) for element in value]
+    return value
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,278 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Opt-in write buffer which coalesces repeated edits to the same sheet.
+
+Each Ulysses call is a separate xcall. Code which appends many fragments to a
+sheet, or adds and removes keywords one at a time, can instead write through
+a WriteBuffer which gathers the operations per identifier and, on flush,
+emits the minimal sequence of calls with the same end result:
+
+- consecutive inserts at the 'end' of a sheet are merged into one
+- attach_keywords/remove_keywords on a sheet collapse to at most one call of
+  each, an attach and a later remove of the same keyword (or vice versa)
+  cancelling to the later intent
+- repeated set_sheet_title or update_note (same note index) calls collapse
+  to the last value, unless an insert in between may have changed the title
+  paragraph: one at the 'begin', or at the 'end' without a leading newline
+  (which extends the last paragraph, the title of a one-paragraph sheet)
+
+Operations on the same sheet keep their relative order wherever it matters;
+operations on different sheets are independent of each other.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+from . import calls
+
+
+__all__ = ['WriteBuffer']
+
+
+logger = logging.getLogger(__name__)
+
+
+_NEWLINE_BEFORE = ('prepend', 'enclose')
+_NEWLINE_AFTER = ('append', 'enclose')
+
+
+class WriteBuffer(object):
+    """Gathers write calls per identifier and emits them on flush.
+
+    Use as a context manager to flush on exit:
+
+        with WriteBuffer(window=2.0) as buf:
+            buf.insert(sheet_id, 'fragment 1', newline='prepend')
+            buf.insert(sheet_id, 'fragment 2', newline='prepend')
+            buf.attach_keywords(sheet_id, ['draft'])
+
+    Attributes:
+
+    window -- seconds after the first pending operation at which the buffer
+              flushes itself from a timer thread. None to flush explicitly
+    requested -- number of write operations passed to the buffer
+    emitted -- number of calls actually sent to Ulysses
+    """
+
+    def __init__(self, window=None):
+        self.window = window
+        self.requested = 0
+        self.emitted = 0
+        self._pending = OrderedDict()  # id -> list of [action, value]
+        self._lock = threading.RLock()
+        self._timer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def __len__(self):
+        """Return number of calls the next flush would send."""
+        with self._lock:
+            return sum(len(_expand(op)) for ops in self._pending.values()
+                       for op in ops)
+
+    # Buffered calls (signatures match ulysses.calls)
+
+    def insert(self, id, text, format='markdown',  # @ReservedAssignment
+               position='end', newline=None, silent_mode=False):
+        """Buffer calls.insert(). Consecutive 'end' inserts are merged."""
+        kwargs = dict(id=id, text=text, format=format, position=position,
+                      newline=newline, silent_mode=silent_mode)
+        with self._lock:
+            ops = self._ops(id)
+            previous = _last_op(ops, skip=('keywords',))
+            if (position == 'end' and previous is not None and
+                    previous[0] == 'insert' and
+                    previous[1]['position'] == 'end' and
+                    previous[1]['format'] == format and
+                    previous[1]['silent_mode'] == silent_mode):
+                previous[1].update(_merge_inserts(previous[1], kwargs))
+            else:
+                ops.append(['insert', kwargs])
+            self._added()
+
+    def attach_keywords(self, id, keywords):  # @ReservedAssignment
+        """Buffer calls.attach_keywords()."""
+        self._keywords(id, keywords, 'attach')
+
+    def remove_keywords(self, id, keywords):  # @ReservedAssignment
+        """Buffer calls.remove_keywords()."""
+        self._keywords(id, keywords, 'remove')
+
+    def set_sheet_title(self, sheet, title, type,  # @ReservedAssignment
+                        silent_mode=False):
+        """Buffer calls.set_sheet_title(). Repeated titles collapse."""
+        kwargs = dict(sheet=sheet, title=title, type=type,
+                      silent_mode=silent_mode)
+        with self._lock:
+            ops = self._ops(sheet)
+            for op in reversed(ops):
+                if op[0] == 'set_sheet_title':
+                    op[1] = kwargs
+                    break
+                if op[0] == 'insert' and _may_change_title(op[1]):
+                    ops.append(['set_sheet_title', kwargs])
+                    break
+            else:
+                ops.append(['set_sheet_title', kwargs])
+            self._added()
+
+    def attach_note(self, id, text, format='markdown'):  # @ReservedAssignment
+        """Buffer calls.attach_note()."""
+        with self._lock:
+            self._ops(id).append(
+                ['attach_note', dict(id=id, text=text, format=format)])
+            self._added()
+
+    def update_note(self, id, index, text,  # @ReservedAssignment
+                    format='markdown'):
+        """Buffer calls.update_note(). Repeated updates of a note collapse."""
+        kwargs = dict(id=id, index=index, text=text, format=format)
+        with self._lock:
+            ops = self._ops(id)
+            for op in reversed(ops):
+                if op[0] == 'update_note' and op[1]['index'] == index:
+                    op[1] = kwargs
+                    break
+                if op[0] in ('attach_note', 'remove_note'):
+                    # note indexes may have shifted
+                    ops.append(['update_note', kwargs])
+                    break
+            else:
+                ops.append(['update_note', kwargs])
+            self._added()
+
+    def remove_note(self, id, index):  # @ReservedAssignment
+        """Buffer calls.remove_note()."""
+        with self._lock:
+            self._ops(id).append(['remove_note', dict(id=id, index=index)])
+            self._added()
+
+    # Flushing
+
+    def flush(self):
+        """Send all pending operations to Ulysses and return calls made.
+
+        If a call fails the operations not yet sent stay pending and the
+        error is re-raised.
+        """
+        with self._lock:
+            self._cancel_timer()
+            n_calls = 0
+            while self._pending:
+                identifier, ops = next(self._pending.iteritems())
+                while ops:
+                    for action, kwargs in _expand(ops[0]):
+                        getattr(calls, action)(**kwargs)
+                        n_calls += 1
+                        self.emitted += 1
+                    ops.pop(0)
+                del self._pending[identifier]
+            if n_calls:
+                logger.debug('WriteBuffer flushed %s call(s)' % n_calls)
+            return n_calls
+
+    # Internals
+
+    def _ops(self, identifier):
+        return self._pending.setdefault(identifier, [])
+
+    def _keywords(self, identifier, keywords, intent):
+        with self._lock:
+            ops = self._ops(identifier)
+            for op in ops:
+                if op[0] == 'keywords':
+                    break
+            else:
+                op = ['keywords',
+                      {'id': identifier, 'intents': OrderedDict()}]
+                ops.append(op)
+            intents = op[1]['intents']
+            for keyword in keywords:
+                # Later intent wins; the keyword moves to the end so that
+                # each emitted list keeps the order keywords were given in
+                intents.pop(keyword, None)
+                intents[keyword] = intent
+            self._added()
+
+    def _added(self):
+        self.requested += 1
+        if self.window is not None and self._timer is None:
+            self._timer = threading.Timer(self.window, self._flush_on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_on_timer(self):
+        with self._lock:
+            self._timer = None
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('WriteBuffer failed to flush on timer')
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            if self._timer is not threading.current_thread():
+                self._timer.cancel()
+            self._timer = None
+
+
+def _last_op(ops, skip=()):
+    for op in reversed(ops):
+        if op[0] not in skip:
+            return op
+    return None
+
+
+def _may_change_title(insert):
+    """Return True if insert may change which paragraph or text is the title.
+
+    An insert at the 'end' without a leading newline extends the last
+    paragraph, which on a sheet of one paragraph is the title.
+    """
+    return (insert['position'] == 'begin' or
+            insert['newline'] not in _NEWLINE_BEFORE)
+
+
+def _merge_inserts(first, second):
+    """Return text and newline for one insert equivalent to both."""
+    middle = '\n' * ((first['newline'] in _NEWLINE_AFTER) +
+                     (second['newline'] in _NEWLINE_BEFORE))
+    before = first['newline'] in _NEWLINE_BEFORE
+    after = second['newline'] in _NEWLINE_AFTER
+    if before and after:
+        newline = 'enclose'
+    elif before:
+        newline = 'prepend'
+    elif after:
+        newline = 'append'
+    else:
+        newline = None
+    return {'text': first['text'] + middle + second['text'],
+            'newline': newline}
+
+
+def _expand(op):
+    """Return list of (action, kwargs) calls needed to send a pending op."""
+    action, value = op
+    if action != 'keywords':
+        return [(action, value)]
+    expanded = []
+    for intent in ('attach', 'remove'):
+        keywords = [k for k, i in value['intents'].iteritems() if i == intent]
+        if keywords:
+            expanded.append((intent + '_keywords',
+                             {'id': value['id'], 'keywords': keywords}))
+    return expanded
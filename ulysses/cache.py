@@ -0,0 +1,210 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Bounded on-disk cache of sheet content keyed by changeToken.
+
+read_sheet(id, text=True) is the most expensive Ulysses call. A SheetCache
+keeps the SheetWithContent from each read (text, keywords and notes) on disk
+with the sheet's changeToken. A repeat read of a sheet whose changeToken,
+from a cheap get_item() or tree listing, still matches is then served
+without asking Ulysses for the content again:
+
+    cache = SheetCache('~/.cache/ulysses-sheets', max_bytes=50 * 2 ** 20)
+    sheet = cached_read_sheet(sheet_id, cache, change_token=token)
+
+Each sheet is a file in the cache directory, written atomically (temporary
+file, fsync, rename) so that a crash never leaves a torn entry; temporary
+files a crash left behind are removed when the cache is next opened. The
+least recently used entries are removed once the cache grows beyond
+max_bytes.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+from . import calls
+from .items import SheetWithContent
+from .storage import (atomic_write, ensure_directory,
+                      remove_stale_temporary_files)
+
+
+__all__ = ['SheetCache', 'cached_read_sheet']
+
+
+logger = logging.getLogger(__name__)
+
+
+def cached_read_sheet(id, cache, change_token=None,  # @ReservedAssignment
+                      client=None):
+    """Return SheetWithContent (with text) for id, from cache if current.
+
+    id -- id of sheet(not path or name)
+    cache -- SheetCache
+    change_token -- sheet's current changeToken if already known, for example
+                    from a tree listing. Found with get_item() if None
+    client -- UlyssesClient to make any calls with. The default if None
+    """
+    source = calls if client is None else client
+    if change_token is None:
+        change_token = source.get_item(id).changeToken
+    sheet = cache.get(id, change_token)
+    if sheet is None:
+        sheet = source.read_sheet(id, text=True)
+        cache.put(sheet)
+    return sheet
+
+
+class SheetCache(object):
+    """On-disk LRU cache of SheetWithContent instances.
+
+    Attributes:
+
+    directory -- directory holding one file per cached sheet
+    max_bytes -- size on disk above which least recently used entries are
+                 removed
+    compress -- zlib compress entries if True
+    hits -- number of get() calls answered from the cache
+    misses -- number of get() calls not answered from the cache
+    """
+
+    def __init__(self, directory, max_bytes=50 * 2 ** 20, compress=False):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        ensure_directory(self.directory)
+        remove_stale_temporary_files(self.directory)
+        self._entries = {}  # id -> (last used, size in bytes, path)
+        self._size = 0  # of the entries
+        for name in os.listdir(self.directory):
+            identifier, ext = os.path.splitext(name)
+            if ext in ('.json', '.z'):
+                path = os.path.join(self.directory, name)
+                st = os.stat(path)
+                self._entries[identifier] = (st.st_mtime, st.st_size, path)
+                self._size += st.st_size
+
+    @property
+    def size(self):
+        """Total size of cached entries in bytes."""
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, identifier):
+        return identifier in self._entries
+
+    def get(self, identifier, change_token):
+        """Return cached SheetWithContent if its changeToken matches.
+
+        Returns None if the sheet is not cached or has changed since.
+        """
+        with self._lock:
+            sheet = self._load(identifier)
+            if sheet is None or sheet.changeToken != change_token:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch(identifier)
+            return sheet
+
+    def peek(self, identifier):
+        """Return cached SheetWithContent whatever its changeToken, or None.
+
+        Does not count as a use of the entry.
+        """
+        with self._lock:
+            return self._load(identifier)
+
+    def put(self, sheet):
+        """Cache a SheetWithContent read with text."""
+        data = json.dumps(sheet._state())
+        if self.compress:
+            data = zlib.compress(data)
+        with self._lock:
+            self._remove(sheet.identifier)
+            path = os.path.join(
+                self.directory,
+                sheet.identifier + ('.z' if self.compress else '.json'))
+            atomic_write(path, data)
+            self._entries[sheet.identifier] = (time.time(), len(data), path)
+            self._size += len(data)
+            self._evict()
+
+    def discard(self, identifier):
+        """Remove a sheet from the cache if present."""
+        with self._lock:
+            self._remove(identifier)
+
+    def clear(self):
+        """Remove every sheet from the cache."""
+        with self._lock:
+            for identifier in list(self._entries):
+                self._remove(identifier)
+
+    # Internals
+
+    def _load(self, identifier):
+        if identifier not in self._entries:
+            return None
+        path = self._entries[identifier][2]
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except IOError:
+            # removed by another process
+            self._size -= self._entries.pop(identifier)[1]
+            return None
+        try:
+            if path.endswith('.z'):
+                data = zlib.decompress(data)
+            state = json.loads(data)
+        except (zlib.error, ValueError):
+            logger.warn("Discarding corrupt cache entry for '%s'" % identifier)
+            self._remove(identifier)
+            return None
+        sheet = SheetWithContent.__new__(SheetWithContent)
+        sheet.__dict__.update(state)
+        return sheet
+
+    def _touch(self, identifier):
+        _, size, path = self._entries[identifier]
+        now = time.time()
+        self._entries[identifier] = (now, size, path)
+        try:
+            # persist recency for the next process to open the cache
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+
+    def _remove(self, identifier):
+        entry = self._entries.pop(identifier, None)
+        if entry is not None:
+            self._size -= entry[1]
+            try:
+                os.remove(entry[2])
+            except OSError:
+                pass
+
+    def _evict(self):
+        if self._size <= self.max_bytes:
+            return
+        by_age = sorted(self._entries.iteritems(), key=lambda e: e[1][0])
+        for identifier, _ in by_age:
+            if self._size <= self.max_bytes:
+                break
+            self._remove(identifier)
@@ -11,14 +11,17 @@
 Ulysses calls described at:
 
 - https://ulyssesapp.com/kb/x-callback-url/
+
+Each function makes its call with the default UlyssesClient; see
+ulysses.client to make calls with a client of your own.
 """
 
-import json
 import logging
-import urllib
 
-from .xcallback import call_ulysses, isID
-from .xcallback import UlyssesError  # @UnusedImport
+from .client import default_client
+from .client import UlyssesError  # @UnusedImport
+from .items import (AbstractItem, Group, Sheet,  # @UnusedImport
+                    SheetWithContent)
 
 
 __all__ = ['attach_keywords', 'attach_note', 'authorize', 'copy',
@@ -34,46 +37,32 @@ logger = logging.getLogger(__name__)
 
 def authorize():
     """Return access-token string."""
-    reply = call_ulysses('authorize', {'appname': 'ulysses_python_client.py'})
-    return reply['access-token']
+    return default_client().authorize()
 
 
 def get_version():
     """Return version string."""
-    return float(call_ulysses('get-version')['apiVersion'])
+    return default_client().get_version()
 
 
-def get_root_items(recursive=True):
+def get_root_items(recursive=True, link_parents=False):
     """Return root items.
 
     recursive -- recurse tree below each root item if True
+    link_parents -- give items parent and path attributes if True. See Group
     """
+    return default_client().get_root_items(recursive, link_parents)
 
-    recursive = 'YES' if recursive else 'NO'
-    reply = call_ulysses('get-root-items', locals(), send_access_token=True)
-
-    item_list = json.loads(reply['items'])
-    return [Group(**item) for item in item_list]
 
-
-def get_item(id, recursive=False):  # @ReservedAssignment
+def get_item(id, recursive=False, link_parents=False):  # @ReservedAssignment
     """Return Group or Sheet instance.
 
     identifier -- id of sheet (not name or path)
     recursive -- return sub-groups of group if True
+    link_parents -- give items below a group parent and path attributes if
+                    True. See Group
     """
-    assert isID(id)
-    recursive = 'YES' if recursive else 'NO'
-    reply = call_ulysses('get-item', locals(), send_access_token=True)
-    item = json.loads(urllib.unquote(reply['item']))
-
-    type_ = item['type']
-    if type_ == 'group':
-        return Group(**item)
-    elif type_ == 'sheet':
-        return Sheet(**item)
-    else:
-        raise ValueError('Unsupported type: ' + type_)
+    return default_client().get_item(id, recursive, link_parents)
 
 
 def read_sheet(id, text=False):  # @ReservedAssignment
@@ -82,12 +71,7 @@ def read_sheet(id, text=False):  # @ReservedAssignment
     id -- id of sheet(not path or name)
     text -- return full text of sheet
     """
-
-    text = 'YES' if text else 'NO'
-    reply = call_ulysses('read-sheet', locals(), send_access_token=True)
-    sheet_dict = json.loads(urllib.unquote(reply['sheet']))
-    assert sheet_dict['type'] == 'sheet'
-    return SheetWithContent(**sheet_dict)
+    return default_client().read_sheet(id, text)
 
 
 def get_quick_look_url(id):  # @ReservedAssignment
@@ -95,10 +79,7 @@ def get_quick_look_url(id):  # @ReservedAssignment
 
     id -- id of sheet(not path or name)
     """
-    assert isID(id)
-    url = call_ulysses('get-quick-look-url', locals())['url']
-    uri = urllib.unquote(url).replace('\\', '')
-    return uri.replace('file://', '')
+    return default_client().get_quick_look_url(id)
 
 
 def new_group(name, parent=None, index=None, silent_mode=False):
@@ -108,9 +89,7 @@ def new_group(name, parent=None, index=None, silent_mode=False):
     index -- position of group in parent. 0 is first
     silent_mode -- don't show change in Ulysses if True
     """
-    identifier = call_ulysses('new-group', locals())['targetId']
-    assert isID(identifier)
-    return identifier
+    return default_client().new_group(name, parent, index, silent_mode)
 
 
 def set_group_title(group, title, silent_mode=False):
@@ -120,7 +99,7 @@ def set_group_title(group, title, silent_mode=False):
     title -- New title string
     silent_mode -- don't show change in Ulysses if True
     """
-    call_ulysses('set-group-title', locals(), send_access_token=True)
+    default_client().set_group_title(group, title, silent_mode)
 
 
 def new_sheet(text, group=None, format='markdown',  # @ReservedAssignment
@@ -133,10 +112,7 @@ def new_sheet(text, group=None, format='markdown',  # @ReservedAssignment
     silent_mode -- don't show change in Ulysses if True
 
     """
-    assert format in ('markdown', 'text', 'html', None)
-    identifier = call_ulysses('new-sheet', locals())['targetId']
-    assert isID(identifier)
-    return identifier
+    return default_client().new_sheet(text, group, format, index, silent_mode)
 
 
 def set_sheet_title(sheet, title, type,  # @ReservedAssignment
@@ -150,9 +126,7 @@ def set_sheet_title(sheet, title, type,  # @ReservedAssignment
             e.g '@: My Filename'
     silent_mode -- don't show change in Ulysses if True
     """
-    assert type in ('heading1', 'heading2', 'heading3', 'heading4', 'heading5',
-                    'heading6', 'comment', 'filename')
-    call_ulysses('set-sheet-title', locals(), send_access_token=True)
+    default_client().set_sheet_title(sheet, title, type, silent_mode)
 
 
 def insert(id, text, format='markdown', position='end',  # @ReservedAssignment
@@ -167,11 +141,7 @@ def insert(id, text, format='markdown', position='end',  # @ReservedAssignment
     silent_mode -- don't show change in Ulysses if True
 
     """
-    assert isID(id)
-    assert format in ('markdown', 'text', 'html', )
-    assert position in ('begin', 'end')
-    assert newline in ('prepend', 'append', 'enclose', None)
-    call_ulysses('insert', locals(), send_access_token=True)
+    default_client().insert(id, text, format, position, newline, silent_mode)
 
 
 def attach_keywords(id, keywords):  # @ReservedAssignment
@@ -180,9 +150,7 @@ def attach_keywords(id, keywords):  # @ReservedAssignment
     id -- id of sheet to modify
     keywords -- list of keywords
     """
-    assert isID(id)
-    keywords = ','.join(keywords)
-    call_ulysses('attach-keywords', locals())
+    default_client().attach_keywords(id, keywords)
 
 
 def remove_keywords(id, keywords):  # @ReservedAssignment
@@ -191,9 +159,7 @@ def remove_keywords(id, keywords):  # @ReservedAssignment
     id -- id of sheet to modify
     keywords -- list of keywords
     """
-    assert isID(id)
-    keywords = ','.join(keywords)
-    call_ulysses('remove-keywords', locals(), send_access_token=True)
+    default_client().remove_keywords(id, keywords)
 
 
 def attach_note(id, text, format='markdown'):  # @ReservedAssignment
@@ -203,8 +169,7 @@ def attach_note(id, text, format='markdown'):  # @ReservedAssignment
     text -- text of note
     format -- 'markdown', 'text' or 'html'
     """
-    assert format in ('markdown', 'text', 'html')
-    call_ulysses('attach-note', locals())
+    default_client().attach_note(id, text, format)
 
 
 def update_note(id, index, text, format='markdown'):  # @ReservedAssignment
@@ -215,8 +180,7 @@ def update_note(id, index, text, format='markdown'):  # @ReservedAssignment
     text -- text of note
     format -- 'markdown', 'text' or 'html'
     """
-    assert format in ('markdown', 'text', 'html')
-    call_ulysses('update-note', locals(), send_access_token=True)
+    default_client().update_note(id, index, text, format)
 
 
 def remove_note(id, index):  # @ReservedAssignment
@@ -225,7 +189,7 @@ def remove_note(id, index):  # @ReservedAssignment
     id -- id of sheet
     index -- index of note on sheet (starting at 0)
     """
-    call_ulysses('remove-note', locals(), send_access_token=True)
+    default_client().remove_note(id, index)
 
 
 def trash(id):  # @ReservedAssignment
@@ -233,8 +197,7 @@ def trash(id):  # @ReservedAssignment
 
     identifier -- id of sheet (not name or path)
     """
-    assert isID(id)
-    call_ulysses('trash', locals(), send_access_token=True)
+    default_client().trash(id)
 
 
 def move(id, targetGroup=None, index=None,  # @ReservedAssignment
@@ -249,11 +212,7 @@ def move(id, targetGroup=None, index=None,  # @ReservedAssignment
     silent_mode -- don't show change in Ulysses if True
 
     """
-    assert targetGroup or (index is not None)
-    params = dict(locals())
-    del params['silent_mode']
-    call_ulysses(
-        'move', params, send_access_token=True, silent_mode=silent_mode)
+    default_client().move(id, targetGroup, index, silent_mode)
 
 
 def copy(id, targetGroup=None, index=None,  # @ReservedAssignment
@@ -268,11 +227,7 @@ def copy(id, targetGroup=None, index=None,  # @ReservedAssignment
     silent_mode -- don't show change in Ulysses if True
 
     """
-    assert targetGroup or index
-    params = dict(locals())
-    del params['silent_mode']
-    call_ulysses(
-        'copy', params, send_access_token=True, silent_mode=silent_mode)
+    default_client().copy(id, targetGroup, index, silent_mode)
 
 
 def open(id):  # @ReservedAssignment
@@ -281,203 +236,19 @@ def open(id):  # @ReservedAssignment
     identifier -- id of sheet to move
     id -- id, path or group-name to open
     """
-    assert isID(id)
-    # Open directly rather than via xcall, as xcall will not bring Ulysses
-    # forward
-    call_ulysses('open', locals(), activate_ulysses=True)
+    default_client().open(id)
 
 
 def open_all():  # @ReservedAssignment
     """Open special group 'All', bringing Ulysses forward."""
-    call_ulysses('open-all', activate_ulysses=True)
+    default_client().open_all()
 
 
 def open_recent():  # @ReservedAssignment
     """Open special group 'Last 7 Days', bringing Ulysses forward."""
-    call_ulysses('open-recent', activate_ulysses=True)
+    default_client().open_recent()
 
 
 def open_favorites():  # @ReservedAssignment
     """Open special group 'All', bringing Ulysses forward."""
-    call_ulysses('open-favorites', activate_ulysses=True)
-
-
-# Group & Sheet classes
-
-class AbstractItem(object):
-
-    def __init__(self, title=None, type=None,   # @ReservedAssignment
-                 identifier=None, hasLifetimeIdentifier=None):
-        self.title = urllib.unquote(title)
-        self.type = type
-        self.identifier = identifier
-        self.hasLifetimeIdentifier = hasLifetimeIdentifier
-
-    def __eq__(self, other):
-        return self.__dict__ == other.__dict__
-
-
-class Group(AbstractItem):
-    """Represents a Ulysses Group, Filter or Trash.
-
-    Attributes:
-
-        title -- Name of group
-        type -- always 'group', 'filter' or 'trash'
-        identifier -- Ulysses id
-        hasLifetimeIdentifier -- True if id is unchanged after a move
-        sheets -- list of Sheets, empty for filter.
-        containers -- list of Groups. Will be None if group_dict resulted from
-                      a non-recursive call to Ulysses.
-
-    """
-
-    def __init__(self, title=None, type=None,  # @ReservedAssignment
-                 sheets=None, containers=None, identifier=None,
-                 hasLifetimeIdentifier=None,):
-        """Create a Group and possible the tree below it.
-
-        Best called with **group_dict, where group_dict results from a call
-        to Ulysses.
-
-        """
-        super(Group, self).__init__(title, type, identifier,
-                                    hasLifetimeIdentifier)
-
-        if type not in ('group', 'filter', trash):
-            raise AssertionError(
-                "type was not group, filter or trash but '%s'" % type)
-        self.sheets = []
-        for sheet_dict in sheets:
-            self.sheets.append(Sheet(**sheet_dict))
-        # containers will be None if group was accessed in Ulysses with a
-        # non-recursive query
-        if containers is not None:
-            self.containers = []
-            for container_dict in containers:
-                if container_dict['type'] == 'filter':
-                    logger.warn(
-                        "Ignoring filter '%s'" % container_dict['title'])
-                    continue
-                self.containers.append(Group(**container_dict))
-        else:
-            self.containers = None  # unknown as non-recursive query
-
-    def get_group_by_title(self, title):
-        """Return a group contained immediately within this group.
-
-        Will fail if this Group was accessed non-recursively.
-
-        title -- name of group to return
-        """
-        if self.containers is None:
-            raise Exception('This group was found non-recursively and'
-                            ' therefore has no knowledge of its containers')
-        for group in self.containers:
-            if group.title == title:
-                return group
-        raise KeyError("No group called '%s' found" % title)
-
-    def get_sheet_by_title(self, title):
-        """Return a sheet contained immediately within this group.
-
-        title -- name of sheet to return
-        """
-        for sheet in self.sheets:
-            if sheet.title == title:
-                return sheet
-        raise KeyError("No sheet called '%s' found" % title)
-
-    def __unicode__(self):
-        title = self.title
-        identifier = self.identifier
-        n_sheets = len(self.sheets)
-        if self.containers is not None:
-            n_containers = len(self.containers)
-        else:
-            n_containers = '?unknown?'
-        return (u"Group(title='%(title)s', n_sheets=%(n_sheets)s, n_containers"
-                u"=%(n_containers)s, identifier='%(identifier)s')" % locals())
-
-    def __str__(self):
-        return unicode(self).encode('utf-8')
-
-
-class Sheet(AbstractItem):
-
-    """Represents a Ulysses Sheet.
-
-    Attributes:
-
-    title -- Name (first line) of sheet
-    type -- always 'sheet'
-    identifier -- Ulysses id
-    hasLifetimeIdentifier -- True if id is unchanged after a move
-    titleType -- The markup type of the title. Will be heading1...heading6,
-                 comment if the title is a heading or comment. Will be set to
-                 filename on external folders or Dropbox if the title is the
-                 sheet's filename (e.g. @: My Filename). If no title is given
-                 this value is set to None
-    creationDate -- The timestamp when the sheet was last modified. The
-                    timestamp is given as the number of seconds relative to
-                    00:00:00 UTC on 1 January 2001
-    modificationDate -- The timestamp when the sheet was created
-    changeToken -- a string which change when the sheet is modified
-
-    """
-    def __init__(self,  title=None, type=None,   # @ReservedAssignment
-                 identifier=None, hasLifetimeIdentifier=None,
-                 titleType=None, creationDate=None, modificationDate=None,
-                 changeToken=None):
-        """Create a Sheet.
-
-        Best called with **sheet_dict, where sheet_dict results from a call
-        to Ulysses.
-        """
-
-        super(Sheet, self).__init__(
-            title, type, identifier, hasLifetimeIdentifier)
-        if type != 'sheet':
-            raise ValueError('Unexpected type: ' + str(type))
-        self.changeToken = changeToken
-        self.creationDate = creationDate
-        self.modificationDate = modificationDate
-        self.titleType = titleType
-
-    def __unicode__(self):
-        title = self.title
-        identifier = self.identifier
-        return (u"Sheet(title='%(title)s', identifier='%(identifier)s')"
-                % locals())
-
-    def __str__(self):
-        return unicode(self).encode('utf-8')
-
-
-class SheetWithContent(Sheet):
-    """Represents a Ulysses sheet in more detail than Sheet
-
-    Attributes (as Sheet and in addition):
-
-    text -- The sheets content encoded as Markdown. This is only available if
-            the text parameter was set to True when created with read_sheet()
-    keywords -- list of strings representing keywords
-    notes -- list of strings representing notes in markdown
-
-    """
-    def __init__(self,  title=None, type=None,   # @ReservedAssignment
-                 identifier=None, hasLifetimeIdentifier=None,
-                 titleType=None, creationDate=None, modificationDate=None,
-                 changeToken=None, text=None, keywords=None, notes=None):
-        """Create a Sheet.
-
-        Best called with **sheet_dict, where sheet_dict results from a call
-        to Ulysses.
-        """
-        super(SheetWithContent, self).__init__(
-            title, type, identifier, hasLifetimeIdentifier, titleType,
-            creationDate, modificationDate, changeToken)
-
-        self.text = unicode(text)
-        self.keywords = list(keywords)
-        self.notes = list(notes)
+    default_client().open_favorites()
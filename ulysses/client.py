@@ -0,0 +1,548 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+A Ulysses client holding its own configuration.
+
+A UlyssesClient owns its access-token, transport, call gate, listeners,
+sheet cache and metrics, and has a method for each of the calls in
+ulysses.calls. Clients configured differently can be used side by side, from
+any number of threads:
+
+    client = UlyssesClient(access_token, transport=ReplayTransport(path))
+    client.get_item(identifier).title
+    client.metrics()['get-item']['calls']
+
+The functions in ulysses.calls, and the set_* functions in
+ulysses.xcallback, act on the default client, see default_client().
+
+Each call is built into an immutable Request before it is sent, so nothing
+passed by a caller is modified. Calls to Ulysses from every client sharing
+the one Ulysses application are serialised, as Ulysses handles one
+x-callback-url at a time.
+"""
+
+import collections
+import contextlib
+import logging
+import threading
+import time
+import urllib
+
+import xcall
+
+from .items import Group, Sheet, SheetWithContent
+from .replies import decode_reply
+
+
+__all__ = ['UlyssesClient', 'Request', 'UlyssesError', 'default_client',
+           'set_default_client', 'isID', 'ULYSSES_LOCK']
+
+
+logger = logging.getLogger(__name__)
+
+
+class UlyssesError(xcall.XCallbackError):
+    """Exception representing an x-error callback from Ulysses.
+
+    Attributes:
+
+    code -- errorCode of the x-error reply, or None if not from one
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.code = kwargs.pop('code', None)
+        super(UlyssesError, self).__init__(*args, **kwargs)
+
+
+def ulysses_xerror_handler(xerror, requested_url):
+    d = eval(xerror)
+    error_message = d['errorMessage']
+    if error_message[-1] != '.':
+        error_message += '.'
+    error_code = d['errorCode']
+    raise UlyssesError(
+        ("%(error_message)s Code=%(error_code)s. "
+         "In response to sending the url '%(requested_url)s'") % locals(),
+        code=error_code)
+
+
+def isID(value):
+    """Checks if value looks like a Ulysses ID; i.e. is 22 char long.
+
+    Not an exact science; but good enougth to prevent most mistakes.
+    """
+    return len(value) == 22
+
+
+# Ulysses handles one x-callback-url at a time and SubprocessTransport refuses
+# to run while another xcall process exists, so calls from every client
+# reaching Ulysses are serialised by this lock.
+ULYSSES_LOCK = threading.Lock()
+
+
+class Request(collections.namedtuple(
+        'Request', ['action', 'params', 'activate_app'])):
+    """An immutable call to Ulysses.
+
+    action -- the name of the Ulysses action
+    params -- tuple of (name, value) pairs, sorted by name, without None
+              values
+    activate_app -- bring Ulysses forward if True
+    """
+    __slots__ = ()
+
+    def __new__(cls, action, params=None, activate_app=False):
+        params = tuple(sorted((name, value)
+                              for name, value in (params or {}).iteritems()
+                              if value is not None))
+        return super(Request, cls).__new__(cls, action, params, activate_app)
+
+    def without_token(self):
+        """Return dict of params without the access-token."""
+        return dict((name, value) for name, value in self.params
+                    if name != 'access-token')
+
+
+class UlyssesClient(object):
+    """Client making calls to Ulysses with its own configuration.
+
+    Attributes:
+
+    access_token -- access-token string sent with calls needing one
+    transport -- object with an exchange(url, activate_app) method, e.g. an
+                 xcall.RecordingTransport; running xcall by default
+    gate -- object with a slot(action) method returning a context manager
+            entered before, and exited after, each call, e.g. a
+            ulysses.scheduler.CallScheduler. None for no gate. If it also
+            has a record_latency(action, seconds) method, that is given
+            the time each exchange with Ulysses took, excluding any wait
+            for the lock
+    cache -- ulysses.cache.SheetCache used by cached_read_sheet(), or None
+    lock -- lock held while a call is made; shared by all clients by
+            default. Give a client its own if its transport does not reach
+            Ulysses, e.g. a ReplayTransport
+    """
+
+    def __init__(self, access_token=None, transport=None, gate=None,
+                 cache=None, lock=None):
+        self.access_token = access_token
+        self.gate = gate
+        self.cache = cache
+        self.lock = ULYSSES_LOCK if lock is None else lock
+        self.xcall_client = xcall.XCallClient(
+            'ulysses', ulysses_xerror_handler, success_decoder=decode_reply,
+            transport=transport)
+        self._listeners = ()  # replaced, never modified, so safe to iterate
+        self._listeners_lock = threading.Lock()
+        self._metrics = {}  # action -> [calls, errors, seconds]
+        self._metrics_lock = threading.Lock()
+
+    @property
+    def transport(self):
+        return self.xcall_client.transport
+
+    @transport.setter
+    def transport(self, transport):
+        self.xcall_client.transport = transport or xcall.SubprocessTransport()
+
+    def add_listener(self, listener):
+        """Call listener(action, params, reply) after every successful call.
+
+        params excludes the access-token. Exceptions raised by listener are
+        logged and otherwise ignored.
+        """
+        with self._listeners_lock:
+            self._listeners += (listener,)
+
+    def remove_listener(self, listener):
+        """Stop calling a listener added with add_listener()."""
+        with self._listeners_lock:
+            listeners = list(self._listeners)
+            listeners.remove(listener)
+            self._listeners = tuple(listeners)
+
+    def metrics(self):
+        """Return dict of action -> dict of calls, errors and seconds.
+
+        seconds is the total time taken by calls, including any time spent
+        waiting to be let through.
+        """
+        with self._metrics_lock:
+            return dict((action, {'calls': calls, 'errors': errors,
+                                  'seconds': seconds})
+                        for action, (calls, errors, seconds)
+                        in self._metrics.iteritems())
+
+    def request(self, action, params=None, send_access_token=False,
+                silent_mode=False, activate_ulysses=False):
+        """Return a Request for an action. See call()."""
+        params = dict(params or {})
+        if send_access_token:
+            params['access-token'] = self.access_token
+        if silent_mode:
+            params['silent-mode'] = 'YES'
+        return Request(action, params, activate_ulysses)
+
+    def call(self, action, params=None, send_access_token=False,
+             silent_mode=False, activate_ulysses=False):
+        """Perform a Ulysses action and return json restored result.
+
+        action -- the name of the Ulysses action to perform
+        params -- dictionary of parameters to pass with call. None entries
+                  will be removed before sending.
+        send_access_token -- include the access-token if True
+        silent_mode -- include silent-mode=YES if True. This prevents
+                       actions which alter Ulysses content from bring Ulysses
+                       forward.
+        activate_ulysses -- bring Ulysses forward if True
+        """
+        return self.send(self.request(action, params, send_access_token,
+                                      silent_mode, activate_ulysses))
+
+    def send(self, request):
+        """Make a Request and return json restored result."""
+        start = time.time()
+        failed = True
+        try:
+            gate = self.gate
+            with gate.slot(request.action) if gate else _no_gate():
+                with self.lock:
+                    exchange_start = time.time()
+                    try:
+                        reply = self.xcall_client.xcall(
+                            request.action, dict(request.params),
+                            activate_app=request.activate_app)
+                    finally:
+                        # Time spent waiting for the lock is not the
+                        # call's own latency
+                        record = getattr(gate, 'record_latency', None)
+                        if record is not None:
+                            record(request.action,
+                                   time.time() - exchange_start)
+            failed = False
+        finally:
+            self._count(request.action, failed, time.time() - start)
+        listeners = self._listeners
+        if listeners:
+            params = request.without_token()
+            for listener in listeners:
+                try:
+                    listener(request.action, dict(params), reply)
+                except Exception:
+                    logger.exception('Call listener %r failed' % listener)
+        return reply
+
+    def _count(self, action, failed, seconds):
+        with self._metrics_lock:
+            counts = self._metrics.setdefault(action, [0, 0, 0.0])
+            counts[0] += 1
+            counts[1] += failed
+            counts[2] += seconds
+
+    # Calls. See ulysses.calls for the function wrapping each of these on
+    # the default client
+
+    def authorize(self):
+        """Return access-token string."""
+        reply = self.call('authorize',
+                          {'appname': 'ulysses_python_client.py'})
+        return reply['access-token']
+
+    def get_version(self):
+        """Return version string."""
+        return float(self.call('get-version')['apiVersion'])
+
+    def get_root_items(self, recursive=True, link_parents=False):
+        """Return root items.
+
+        recursive -- recurse tree below each root item if True
+        link_parents -- give items parent and path attributes if True. See
+                        Group
+        """
+        params = {'recursive': 'YES' if recursive else 'NO'}
+        reply = self.call('get-root-items', params, send_access_token=True)
+
+        return [Group(link_parents=link_parents, **item)
+                for item in reply['items']]
+
+    def get_item(self, id, recursive=False,  # @ReservedAssignment
+                 link_parents=False):
+        """Return Group or Sheet instance.
+
+        identifier -- id of sheet (not name or path)
+        recursive -- return sub-groups of group if True
+        link_parents -- give items below a group parent and path attributes
+                        if True. See Group
+        """
+        assert isID(id)
+        params = {'id': id, 'recursive': 'YES' if recursive else 'NO'}
+        reply = self.call('get-item', params, send_access_token=True)
+        item = reply['item']
+
+        type_ = item['type']
+        if type_ == 'group':
+            return Group(link_parents=link_parents, **item)
+        elif type_ == 'sheet':
+            return Sheet(**item)
+        else:
+            raise ValueError('Unsupported type: ' + type_)
+
+    def read_sheet(self, id, text=False):  # @ReservedAssignment
+        """Return a sheet with more detail than get_item().
+
+        id -- id of sheet(not path or name)
+        text -- return full text of sheet
+        """
+        params = {'id': id, 'text': 'YES' if text else 'NO'}
+        reply = self.call('read-sheet', params, send_access_token=True)
+        sheet_dict = reply['sheet']
+        assert sheet_dict['type'] == 'sheet'
+        return SheetWithContent(**sheet_dict)
+
+    def cached_read_sheet(self, id, change_token=None):  # @ReservedAssignment
+        """Return SheetWithContent (with text) for id, through cache if set.
+
+        See ulysses.cache.cached_read_sheet().
+        """
+        if self.cache is None:
+            return self.read_sheet(id, text=True)
+        from .cache import cached_read_sheet
+        return cached_read_sheet(id, self.cache, change_token, client=self)
+
+    def get_quick_look_url(self, id):  # @ReservedAssignment
+        """Get the QuickLook URL for a sheet, i.e. location on the file system.
+
+        id -- id of sheet(not path or name)
+        """
+        assert isID(id)
+        url = self.call('get-quick-look-url', {'id': id})['url']
+        uri = urllib.unquote(url).replace('\\', '')
+        return uri.replace('file://', '')
+
+    def new_group(self, name, parent=None, index=None, silent_mode=False):
+        """Create new group and return id.
+
+        parent -- name, path or id of parent. Create in top-level if None
+        index -- position of group in parent. 0 is first
+        silent_mode -- don't show change in Ulysses if True
+        """
+        params = {'name': name, 'parent': parent, 'index': index}
+        identifier = self.call('new-group', params,
+                               silent_mode=silent_mode)['targetId']
+        assert isID(identifier)
+        return identifier
+
+    def set_group_title(self, group, title, silent_mode=False):
+        """Change group's title and return id.
+
+        group -- Name, path or id of group
+        title -- New title string
+        silent_mode -- don't show change in Ulysses if True
+        """
+        self.call('set-group-title', {'group': group, 'title': title},
+                  send_access_token=True, silent_mode=silent_mode)
+
+    def new_sheet(self, text, group=None,
+                  format='markdown',  # @ReservedAssignment
+                  index=None, silent_mode=False):
+        """Create new sheet and return id.
+
+        parent -- Name, path or id of parent. Create in top-level if None
+        index -- Position of group in parent. 0 is first.
+        format -- 'markdown', 'text' or 'html'
+        silent_mode -- don't show change in Ulysses if True
+
+        """
+        assert format in ('markdown', 'text', 'html', None)
+        params = {'text': text, 'group': group, 'format': format,
+                  'index': index}
+        identifier = self.call('new-sheet', params,
+                               silent_mode=silent_mode)['targetId']
+        assert isID(identifier)
+        return identifier
+
+    def set_sheet_title(self, sheet, title, type,  # @ReservedAssignment
+                        silent_mode=False):
+        """Change first paragraph of sheet.
+
+        sheet -- Identifier of sheet to change
+        title -- New title string. Will be URL-encoded
+        type -- The markup type of the title. Will be 'heading1'...'heading6',
+                'comment' or 'filename' (on external folders with title
+                e.g '@: My Filename'
+        silent_mode -- don't show change in Ulysses if True
+        """
+        assert type in ('heading1', 'heading2', 'heading3', 'heading4',
+                        'heading5', 'heading6', 'comment', 'filename')
+        self.call('set-sheet-title',
+                  {'sheet': sheet, 'title': title, 'type': type},
+                  send_access_token=True, silent_mode=silent_mode)
+
+    def insert(self, id, text,  # @ReservedAssignment
+               format='markdown', position='end',  # @ReservedAssignment
+               newline=None, silent_mode=False):
+        """Insert or append text to a sheet.
+
+        id -- id of sheet
+        text -- text to append
+        format -- 'markdown', 'text' or 'html'
+        position -- 'begin' or 'end'
+        newline -- 'prepend', 'append', 'enclose' or None
+        silent_mode -- don't show change in Ulysses if True
+
+        """
+        assert isID(id)
+        assert format in ('markdown', 'text', 'html', )
+        assert position in ('begin', 'end')
+        assert newline in ('prepend', 'append', 'enclose', None)
+        params = {'id': id, 'text': text, 'format': format,
+                  'position': position, 'newline': newline}
+        self.call('insert', params, send_access_token=True,
+                  silent_mode=silent_mode)
+
+    def attach_keywords(self, id, keywords):  # @ReservedAssignment
+        """Attach keywords to sheet.
+
+        id -- id of sheet to modify
+        keywords -- list of keywords
+        """
+        assert isID(id)
+        self.call('attach-keywords',
+                  {'id': id, 'keywords': ','.join(keywords)})
+
+    def remove_keywords(self, id, keywords):  # @ReservedAssignment
+        """Remove keywords from a sheet.
+
+        id -- id of sheet to modify
+        keywords -- list of keywords
+        """
+        assert isID(id)
+        self.call('remove-keywords',
+                  {'id': id, 'keywords': ','.join(keywords)},
+                  send_access_token=True)
+
+    def attach_note(self, id, text,  # @ReservedAssignment
+                    format='markdown'):  # @ReservedAssignment
+        """Add a new note attachment to a sheet.
+
+        id -- id of sheet
+        text -- text of note
+        format -- 'markdown', 'text' or 'html'
+        """
+        assert format in ('markdown', 'text', 'html')
+        self.call('attach-note', {'id': id, 'text': text, 'format': format})
+
+    def update_note(self, id, index, text,  # @ReservedAssignment
+                    format='markdown'):  # @ReservedAssignment
+        """Update an existing note attachment on a sheet.
+
+        id -- id of sheet
+        index -- index of note on sheet (starting at 0)
+        text -- text of note
+        format -- 'markdown', 'text' or 'html'
+        """
+        assert format in ('markdown', 'text', 'html')
+        self.call('update-note', {'id': id, 'index': index, 'text': text,
+                                  'format': format},
+                  send_access_token=True)
+
+    def remove_note(self, id, index):  # @ReservedAssignment
+        """Add a new note attachment to a sheet.
+
+        id -- id of sheet
+        index -- index of note on sheet (starting at 0)
+        """
+        self.call('remove-note', {'id': id, 'index': index},
+                  send_access_token=True)
+
+    def trash(self, id):  # @ReservedAssignment
+        """Move item to trash.
+
+        identifier -- id of sheet (not name or path)
+        """
+        assert isID(id)
+        self.call('trash', {'id': id}, send_access_token=True)
+
+    def move(self, id, targetGroup=None, index=None,  # @ReservedAssignment
+             silent_mode=False):
+        """Move item to group and/or index (order in a group)
+
+        identifier -- id of sheet to move
+        targetGroup -- id, path or group-name to move to. Optional if index
+                       provided
+        index -- integer position in group to mve to. Optional if
+                 targetIdentifier provided
+        silent_mode -- don't show change in Ulysses if True
+
+        """
+        assert targetGroup or (index is not None)
+        params = {'id': id, 'targetGroup': targetGroup, 'index': index}
+        self.call('move', params, send_access_token=True,
+                  silent_mode=silent_mode)
+
+    def copy(self, id, targetGroup=None, index=None,  # @ReservedAssignment
+             silent_mode=False):
+        """Copy item to group and/or index (order in a group)
+
+        identifier -- id of sheet to move
+        targetGroup -- id, path or group-name to move to. Optional if index
+                       provided
+        index -- integer position in group to mve to. Optional if
+                 targetIdentifier provided
+        silent_mode -- don't show change in Ulysses if True
+
+        """
+        assert targetGroup or index
+        params = {'id': id, 'targetGroup': targetGroup, 'index': index}
+        self.call('copy', params, send_access_token=True,
+                  silent_mode=silent_mode)
+
+    def open(self, id):  # @ReservedAssignment
+        """Open item, bringing Ulysses forward.
+
+        identifier -- id of sheet to move
+        id -- id, path or group-name to open
+        """
+        assert isID(id)
+        # Open directly rather than via xcall, as xcall will not bring
+        # Ulysses forward
+        self.call('open', {'id': id}, activate_ulysses=True)
+
+    def open_all(self):
+        """Open special group 'All', bringing Ulysses forward."""
+        self.call('open-all', activate_ulysses=True)
+
+    def open_recent(self):
+        """Open special group 'Last 7 Days', bringing Ulysses forward."""
+        self.call('open-recent', activate_ulysses=True)
+
+    def open_favorites(self):
+        """Open special group 'All', bringing Ulysses forward."""
+        self.call('open-favorites', activate_ulysses=True)
+
+
+@contextlib.contextmanager
+def _no_gate():
+    yield
+
+
+_default_client = UlyssesClient()
+
+
+def default_client():
+    """Return the UlyssesClient used by the functions in ulysses.calls."""
+    return _default_client
+
+
+def set_default_client(client):
+    """Make client the default and return the previous default."""
+    global _default_client
+    previous, _default_client = _default_client, client
+    return previous
@@ -0,0 +1,205 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Duplicate and near-duplicate sheet detection.
+
+Repeated imports and copy() calls leave near-identical sheets behind, and
+comparing every pair of sheets is quadratic. find_duplicates() instead
+normalises each sheet's text (unicode NFKC, lower cased, whitespace
+collapsed) and fingerprints it in a process pool with:
+
+- a SHA-1 of the normalised text; sheets sharing one are exact duplicates
+- a MinHash signature of its three-word shingles; signatures are split into
+  bands and sheets sharing any band are compared (locality-sensitive
+  hashing), so only likely pairs are ever compared
+
+Near-duplicate pairs whose estimated Jaccard similarity reaches threshold
+are merged into groups with union-find:
+
+    texts = sheet_texts(ids, cache=SheetCache('~/.cache/ulysses-sheets'))
+    duplicates = find_duplicates(texts, threshold=0.8)
+    for group in duplicates.exact:
+        for identifier in group[1:]:  # keep the first
+            ulysses.trash(identifier)
+
+Each group lists ids in the order the texts were given.
+"""
+
+import collections
+import hashlib
+import multiprocessing
+import random
+import re
+import unicodedata
+import zlib
+
+from . import calls
+from .cache import cached_read_sheet
+from .parallel import imap_bounded
+
+
+__all__ = ['find_duplicates', 'sheet_texts', 'normalise', 'Duplicates']
+
+
+class Duplicates(collections.namedtuple('Duplicates', ['exact', 'near'])):
+    """Lists of groups (lists) of sheet ids.
+
+    exact -- groups of sheets with the same normalised text
+    near -- groups of sheets with similar text, each spanning more than one
+            exact group (whose members are all included)
+    """
+    __slots__ = ()
+
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WHITESPACE = re.compile(r'\s+', re.UNICODE)
+
+
+def normalise(text):
+    """Return text NFKC normalised, lower cased and whitespace collapsed."""
+    if not isinstance(text, unicode):
+        text = text.decode('utf-8')
+    text = unicodedata.normalize('NFKC', text).lower()
+    return _WHITESPACE.sub(u' ', text).strip()
+
+
+def sheet_texts(ids, cache=None, change_tokens=None, concurrency=4):
+    """Yield (id, text) for each sheet id, reading sheets concurrently.
+
+    ids -- iterable of sheet ids
+    cache -- SheetCache to read through, or None to always call read_sheet()
+    change_tokens -- dict of id -> changeToken (e.g. from a tree listing) to
+                     check cached entries against without get_item()
+    concurrency -- maximum number of reads in flight at once
+
+    Sheets which cannot be read are skipped.
+    """
+    change_tokens = change_tokens or {}
+
+    def read(identifier):
+        if cache is None:
+            return calls.read_sheet(identifier, text=True)
+        return cached_read_sheet(identifier, cache,
+                                 change_tokens.get(identifier))
+    for result in imap_bounded(read, ids, concurrency, ordered=True):
+        if result.error is None:
+            yield result.id, result.value.text
+
+
+def find_duplicates(texts, threshold=0.8, num_perm=64, bands=16,
+                    processes=None):
+    """Return Duplicates found among texts.
+
+    texts -- iterable of (id, text), e.g. from sheet_texts()
+    threshold -- estimated Jaccard similarity of shingles at or above which
+                 two sheets are near duplicates
+    num_perm -- number of hash functions in each MinHash signature
+    bands -- number of bands signatures are split into for LSH. More bands
+             find less similar pairs, at the cost of more comparisons
+    processes -- size of the process pool fingerprinting texts; None for one
+                 per CPU, 0 to fingerprint in this process
+    """
+    if num_perm % bands:
+        raise ValueError('num_perm must be a multiple of bands')
+    tasks = ((identifier, text, num_perm) for identifier, text in texts)
+    if processes == 0:
+        fingerprints = (_fingerprint(task) for task in tasks)
+        return _group(fingerprints, threshold, num_perm, bands)
+    pool = multiprocessing.Pool(processes)
+    try:
+        return _group(pool.imap(_fingerprint, tasks, chunksize=8),
+                      threshold, num_perm, bands)
+    finally:
+        pool.terminate()
+
+
+def _group(fingerprints, threshold, num_perm, bands):
+    by_digest = collections.OrderedDict()  # digest -> list of ids
+    signatures = collections.OrderedDict()  # first id per digest -> signature
+    sequence = {}  # id -> position in texts
+    for identifier, digest, signature in fingerprints:
+        sequence[identifier] = len(sequence)
+        if digest in by_digest:
+            by_digest[digest].append(identifier)
+        else:
+            by_digest[digest] = [identifier]
+            signatures[identifier] = signature
+    exact = [ids for ids in by_digest.itervalues() if len(ids) > 1]
+    members = dict((ids[0], ids) for ids in by_digest.itervalues())
+
+    rows = num_perm // bands
+    buckets = collections.defaultdict(list)
+    for identifier, signature in signatures.iteritems():
+        for band in range(bands):
+            buckets[(band,) + signature[band * rows:(band + 1) * rows]
+                    ].append(identifier)
+
+    parent = dict((identifier, identifier) for identifier in signatures)
+
+    def find(identifier):
+        root = identifier
+        while parent[root] != root:
+            root = parent[root]
+        while parent[identifier] != root:
+            parent[identifier], identifier = root, parent[identifier]
+        return root
+
+    compared = set()
+    for bucket in buckets.itervalues():
+        for i, a in enumerate(bucket):
+            for b in bucket[i + 1:]:
+                if (a, b) in compared:
+                    continue
+                compared.add((a, b))
+                root_a, root_b = find(a), find(b)
+                if root_a == root_b:
+                    continue
+                same = sum(x == y for x, y in zip(signatures[a],
+                                                  signatures[b]))
+                if same >= threshold * num_perm:
+                    parent[root_b] = root_a
+
+    clusters = collections.OrderedDict()  # root -> first ids of digests
+    for identifier in signatures:
+        clusters.setdefault(find(identifier), []).append(identifier)
+    near = [sorted(sum((members[i] for i in firsts), []), key=sequence.get)
+            for firsts in clusters.itervalues() if len(firsts) > 1]
+    return Duplicates(exact, near)
+
+
+_permutations = {}
+
+
+def _permutations_for(num_perm):
+    if num_perm not in _permutations:
+        rng = random.Random(num_perm)
+        _permutations[num_perm] = [
+            (rng.randint(1, _PRIME - 1), rng.randint(0, _PRIME - 1))
+            for _ in range(num_perm)]
+    return _permutations[num_perm]
+
+
+def _fingerprint(task):
+    """Return (id, digest, MinHash signature) of an (id, text, num_perm)."""
+    identifier, text, num_perm = task
+    text = normalise(text or u'')
+    encoded = text.encode('utf-8')
+    digest = hashlib.sha1(encoded).hexdigest()
+    words = text.split(u' ')
+    if len(words) >= 3:
+        shingles = set(u' '.join(words[i:i + 3])
+                       for i in range(len(words) - 2))
+    else:
+        shingles = set([text])
+    hashes = [zlib.crc32(s.encode('utf-8')) & _MAX_HASH for s in shingles]
+    signature = tuple(min((a * h + b) % _PRIME for h in hashes)
+                      for a, b in _permutations_for(num_perm))
+    return identifier, digest, signature
@@ -0,0 +1,223 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Columnar, NumPy backed table of library metadata for analytics.
+
+Reports over a library (sheets edited per week, per group totals) otherwise
+loop over Sheet objects one at a time. MetadataFrame.from_tree() turns a
+Group tree into one NumPy array per column, a row per item, so that reports
+become a handful of vectorised operations:
+
+    frame = MetadataFrame.from_tree(ulysses.get_root_items())
+    week_ago = time.time() - EPOCH_2001 - 7 * 86400
+    recent = frame.between('modified', after=week_ago)
+    per_group = frame.rollup(recent & frame.is_sheet)
+    per_group[frame.index(inbox_id)]  # sheets edited this week in Inbox
+    counts, edges = frame.histogram('modified', bin_seconds=7 * 86400)
+
+Rows are in breadth-first order, so every row's parent comes before it and
+rows of each depth are contiguous. Dates are float seconds since 2001-01-01
+as Ulysses gives them, NaN where missing; see to_datetime64().
+
+NumPy is needed to build a frame but not to import this module.
+"""
+
+import collections
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .snapshot import TYPES
+
+
+__all__ = ['MetadataFrame', 'EPOCH_2001']
+
+
+# seconds from 1970-01-01 to 2001-01-01, the epoch of Ulysses dates
+EPOCH_2001 = 978307200
+
+
+class MetadataFrame(object):
+    """Columns of metadata, a row per Sheet or Group.
+
+    Attributes (NumPy arrays, one entry per row):
+
+    identifier -- item ids
+    type -- index into snapshot.TYPES ('sheet', 'group', 'filter', 'trash')
+    parent -- row of the containing group, -1 for roots
+    depth -- 0 for roots, 1 for items in them and so on
+    created -- creationDate, NaN for groups and where missing
+    modified -- modificationDate, NaN for groups and where missing
+    title_length -- number of characters in the title
+    """
+
+    COLUMNS = ('identifier', 'type', 'parent', 'depth', 'created',
+               'modified', 'title_length')
+
+    def __init__(self, identifier, type, parent,  # @ReservedAssignment
+                 depth, created, modified, title_length):
+        self.identifier = identifier
+        self.type = type
+        self.parent = parent
+        self.depth = depth
+        self.created = created
+        self.modified = modified
+        self.title_length = title_length
+        self._rows = None
+        # start row of each depth; rows of depth d are
+        # [_level_starts[d], _level_starts[d + 1])
+        self._level_starts = numpy.searchsorted(
+            depth, numpy.arange(depth.max() + 2 if len(depth) else 1))
+
+    @classmethod
+    def from_tree(cls, groups):
+        """Return a MetadataFrame of one Group tree or a list of them."""
+        if numpy is None:
+            raise ImportError('MetadataFrame requires NumPy')
+        if not isinstance(groups, (list, tuple)):
+            groups = [groups]
+        identifiers = []
+        types = []
+        parents = []
+        depths = []
+        created = []
+        modified = []
+        title_lengths = []
+        type_codes = dict((name, i) for i, name in enumerate(TYPES))
+        nan = float('nan')
+        pending = collections.deque((group, -1, 0) for group in groups)
+        while pending:
+            item, parent, depth = pending.popleft()
+            row = len(identifiers)
+            identifiers.append(item.identifier)
+            types.append(type_codes[item.type])
+            parents.append(parent)
+            depths.append(depth)
+            title_lengths.append(len(item.title or u''))
+            if item.type == 'sheet':
+                created.append(_or_nan(item.creationDate, nan))
+                modified.append(_or_nan(item.modificationDate, nan))
+                continue
+            created.append(nan)
+            modified.append(nan)
+            for child in item.sheets + (item.containers or []):
+                pending.append((child, row, depth + 1))
+        return cls(numpy.array(identifiers),
+                   numpy.array(types, dtype=numpy.int8),
+                   numpy.array(parents, dtype=numpy.int32),
+                   numpy.array(depths, dtype=numpy.int32),
+                   numpy.array(created, dtype=numpy.float64),
+                   numpy.array(modified, dtype=numpy.float64),
+                   numpy.array(title_lengths, dtype=numpy.int32))
+
+    def __len__(self):
+        return len(self.identifier)
+
+    def index(self, identifier):
+        """Return the row of the item with identifier."""
+        if self._rows is None:
+            self._rows = dict((value, row) for row, value
+                              in enumerate(self.identifier.tolist()))
+        return self._rows[identifier]
+
+    @property
+    def is_sheet(self):
+        """Boolean mask of sheet rows."""
+        return self.type == TYPES.index('sheet')
+
+    @property
+    def is_group(self):
+        """Boolean mask of group (including filter and trash) rows."""
+        return self.type != TYPES.index('sheet')
+
+    def between(self, column, after=None, before=None):
+        """Return boolean mask of rows whose column is in a range.
+
+        column -- name of a column, e.g. 'modified'
+        after, before -- inclusive bounds; None leaves a side open. NaN
+                         entries are never in range
+        """
+        values = getattr(self, column)
+        mask = ~numpy.isnan(values) if values.dtype.kind == 'f' else (
+            numpy.ones(len(values), dtype=bool))
+        with numpy.errstate(invalid='ignore'):
+            if after is not None:
+                mask &= values >= after
+            if before is not None:
+                mask &= values <= before
+        return mask
+
+    def rollup(self, values, how='sum'):
+        """Return per row totals of values over the row and all rows below.
+
+        values -- array with an entry per row, e.g. a boolean mask to count
+                  the matching items below each group
+        how -- 'sum', or 'max' or 'min' (ignoring NaN)
+
+        Each level of the tree is folded into the one above in a single
+        vectorised step, deepest first.
+        """
+        ufuncs = {'sum': numpy.add, 'max': numpy.fmax, 'min': numpy.fmin}
+        if how not in ufuncs:
+            raise ValueError("how was not 'sum', 'max' or 'min' but '%s'"
+                             % how)
+        ufunc = ufuncs[how]
+        totals = numpy.array(values)
+        if totals.dtype == bool:
+            totals = totals.astype(numpy.int64)
+        starts = self._level_starts
+        for depth in range(len(starts) - 2, 0, -1):
+            level = slice(starts[depth], starts[depth + 1])
+            # the parents of a level are all in the level above
+            above = slice(starts[depth - 1], starts[depth])
+            parents = self.parent[level]
+            if how == 'sum':
+                totals[above] += numpy.bincount(
+                    parents - above.start, totals[level],
+                    minlength=above.stop - above.start).astype(totals.dtype)
+            else:
+                ufunc.at(totals, parents, totals[level])
+        return totals
+
+    def histogram(self, column='modified', bin_seconds=86400, mask=None):
+        """Return (counts, edges) of a date column in bins of bin_seconds.
+
+        Bins are aligned to multiples of bin_seconds from 2001-01-01. mask
+        selects the rows counted; NaN entries are never counted.
+        """
+        values = getattr(self, column)
+        selected = ~numpy.isnan(values)
+        if mask is not None:
+            selected &= mask
+        values = values[selected]
+        if not len(values):
+            return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(1)
+        first = numpy.floor(values.min() / bin_seconds)
+        last = numpy.floor(values.max() / bin_seconds) + 1
+        edges = numpy.arange(first, last + 1) * bin_seconds
+        bins = (numpy.floor(values / bin_seconds) - first).astype(numpy.int64)
+        return numpy.bincount(bins, minlength=len(edges) - 1), edges
+
+    def to_datetime64(self, column='modified'):
+        """Return a date column as numpy.datetime64 values, NaT if missing."""
+        values = getattr(self, column)
+        result = numpy.full(len(values), numpy.datetime64('NaT'),
+                            dtype='datetime64[ms]')
+        known = ~numpy.isnan(values)
+        milliseconds = ((values[known] + EPOCH_2001) * 1000).astype(
+            numpy.int64)
+        result[known] = milliseconds.astype('datetime64[ms]')
+        return result
+
+
+def _or_nan(value, nan):
+    return nan if value is None else value
@@ -0,0 +1,351 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+History of a library's structure, stored as a base and deltas.
+
+Keeping a get-root-items dump per hour would store the whole library every
+time, though little of it changes between dumps. A HistoryStore records
+each tree as the changes since the one before, keyed by identifier:
+
+    history = HistoryStore('~/.ulysses-history')
+    history.record(ulysses.get_root_items())  # e.g. hourly
+
+    last_tuesday = history.at(timestamp)  # root Groups as they were then
+    for change in history.changes(start, end):
+        if change.kind == 'moved' and change.after == trash_id:
+            ...
+
+Changes are:
+
+- added -- after is a dict of the item's parent, type, title and changeToken
+- removed -- before is that dict as it was
+- moved -- before and after are the old and new parent ids (a move to the
+           trash is a trashing)
+- retitled -- before and after are the old and new titles
+- changed -- before and after are the old and new changeTokens
+- ordered -- after is the new order of a group's children, recorded only
+             where it does not follow from the other changes
+
+added and moved changes also give the index of the item among the children
+of its new parent (sheets first, then containers). Roots have parent ''.
+
+The store is a directory of segment files, each a base (the whole library,
+flattened) followed by deltas, one JSON line each. Every rebase_every deltas
+a new segment is started, so rebuilding the library at a point in time
+reads one base and at most rebase_every deltas, and the change log between
+two times is streamed from the deltas without rebuilding any tree.
+
+Only structure is kept: a Sheet rebuilt by at() has its title, identifier
+and changeToken, and None for its other attributes.
+"""
+
+import bisect
+import collections
+import io
+import json
+import logging
+import os
+import time
+
+from .items import Group, Sheet
+from .storage import atomic_write, ensure_directory
+
+
+__all__ = ['HistoryStore', 'Change']
+
+
+logger = logging.getLogger(__name__)
+
+
+ROOT = ''
+
+# fields of an item's flattened state, in order
+_FIELDS = ('parent', 'type', 'title', 'changeToken')
+_PARENT, _TYPE, _TITLE, _TOKEN = range(len(_FIELDS))
+
+
+class Change(collections.namedtuple(
+        'Change', ['time', 'kind', 'identifier', 'before', 'after',
+                   'index'])):
+    """One change to a library between two recorded trees."""
+    __slots__ = ()
+
+
+class HistoryStore(object):
+    """Directory of recorded library trees, stored as a base and deltas.
+
+    Attributes:
+
+    directory -- directory holding the segment files
+    rebase_every -- number of deltas after which a new base is written
+    """
+
+    def __init__(self, directory, rebase_every=48):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.rebase_every = rebase_every
+        ensure_directory(self.directory)
+        self._segments = sorted(  # (base time, path)
+            (float(name[:-len('.jsonl')]), os.path.join(self.directory, name))
+            for name in os.listdir(self.directory) if name.endswith('.jsonl'))
+        self._state = None
+        self._time = None  # of the last tree recorded
+        self._deltas = 0  # in the last segment
+        if self._segments:
+            self._state, self._time, self._deltas = self._replay(
+                self._segments[-1][1])
+
+    @property
+    def first(self):
+        """Time of the first tree recorded, or None."""
+        return self._segments[0][0] if self._segments else None
+
+    @property
+    def last(self):
+        """Time of the last tree recorded with changes, or None."""
+        return self._time
+
+    def record(self, groups, timestamp=None):
+        """Record the library as it is now; return list of Changes.
+
+        groups -- a Group, or list of root Groups, fetched recursively, e.g.
+                  from get_root_items()
+        timestamp -- time.time() of the tree, now if None. Must not be
+                     earlier than the last tree recorded
+        """
+        timestamp = time.time() if timestamp is None else float(timestamp)
+        if self._time is not None and timestamp < self._time:
+            raise ValueError('%s is earlier than the last tree recorded, %s'
+                             % (timestamp, self._time))
+        state = _flatten(groups)
+        if self._state is None:
+            self._write_base(state, timestamp)
+            return []
+        changes = _diff(self._state, state)
+        if changes:
+            self._append(self._segments[-1][1],
+                         {'time': timestamp, 'changes': changes})
+            self._deltas += 1
+        self._state = state
+        self._time = timestamp
+        if self._deltas >= self.rebase_every:
+            self._write_base(state, timestamp)
+        return [Change(timestamp, *change) for change in changes]
+
+    def at(self, timestamp):
+        """Return list of root Groups as last recorded at or before timestamp.
+
+        Raises KeyError if nothing was recorded by then.
+        """
+        start = bisect.bisect_right(
+            [base_time for base_time, _ in self._segments], timestamp)
+        if start == 0:
+            raise KeyError('Nothing recorded by %s' % timestamp)
+        state, _, _ = self._replay(self._segments[start - 1][1], timestamp)
+        return _build(state)
+
+    def changes(self, start=None, end=None):
+        """Yield Changes made after start and no later than end, in order.
+
+        start, end -- times; None leaves a side open
+        """
+        for n, (base_time, path) in enumerate(self._segments):
+            following = (self._segments[n + 1][0]
+                         if n + 1 < len(self._segments) else None)
+            if start is not None and following is not None and (
+                    following <= start):
+                continue  # every change in the segment is before start
+            if end is not None and base_time > end:
+                return
+            for entry in self._deltas_in(path):
+                if start is not None and entry['time'] <= start:
+                    continue
+                if end is not None and entry['time'] > end:
+                    return
+                for change in entry['changes']:
+                    yield Change(entry['time'], *change)
+
+    # Internals
+
+    def _write_base(self, state, timestamp):
+        items, children = state
+        path = os.path.join(self.directory, '%017.6f.jsonl' % timestamp)
+        atomic_write(path, json.dumps({'time': timestamp, 'items': items,
+                                       'children': children}) + '\n')
+        if not self._segments or self._segments[-1][1] != path:
+            self._segments.append((timestamp, path))
+        self._state = state
+        self._time = timestamp
+        self._deltas = 0
+
+    def _append(self, path, entry):
+        with io.open(path, 'ab') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _replay(self, path, until=None):
+        """Return (state, time, deltas) of a segment up to time until."""
+        with io.open(path, 'rb') as f:
+            base = json.loads(f.readline())
+        state = (base['items'], base['children'])
+        recorded = base['time']
+        deltas = 0
+        for entry in self._deltas_in(path):
+            if until is not None and entry['time'] > until:
+                break
+            _apply(state, entry['changes'])
+            recorded = entry['time']
+            deltas += 1
+        return state, recorded, deltas
+
+    def _deltas_in(self, path):
+        with io.open(path, 'rb') as f:
+            f.readline()  # the base, not parsed
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # torn final line from a crash mid-write
+                    logger.warn('Ignoring corrupt history line in %s' % path)
+
+
+def _flatten(groups):
+    """Return (items, children) of a tree.
+
+    items -- dict of id -> [parent, type, title, changeToken]
+    children -- dict of group id (ROOT for the roots) -> list of child ids,
+                sheets then containers
+    """
+    if not isinstance(groups, (list, tuple)):
+        groups = [groups]
+    items = {}
+    children = {ROOT: [group.identifier for group in groups]}
+    stack = [(group, ROOT) for group in reversed(groups)]
+    while stack:
+        item, parent = stack.pop()
+        items[item.identifier] = [parent, item.type, item.title,
+                                  getattr(item, 'changeToken', None)]
+        if item.type == 'sheet':
+            continue
+        containers = item.containers or []
+        children[item.identifier] = (
+            [sheet.identifier for sheet in item.sheets] +
+            [group.identifier for group in containers])
+        stack.extend((child, item.identifier) for child in reversed(
+            item.sheets + containers))
+    return items, children
+
+
+def _diff(old, new):
+    """Return list of [kind, id, before, after, index] changing old to new."""
+    old_items, old_children = old
+    new_items, new_children = new
+    changes = []
+    for identifier in sorted(set(old_items) - set(new_items)):
+        changes.append(['removed', identifier,
+                        _as_dict(old_items[identifier]), None, None])
+    for identifier in sorted(new_items):
+        item = new_items[identifier]
+        if identifier not in old_items:
+            changes.append(['added', identifier, None, _as_dict(item),
+                            new_children[item[_PARENT]].index(identifier)])
+            continue
+        previous = old_items[identifier]
+        if previous[_PARENT] != item[_PARENT]:
+            index = new_children[item[_PARENT]].index(identifier)
+            changes.append(['moved', identifier, previous[_PARENT],
+                            item[_PARENT], index])
+        if previous[_TITLE] != item[_TITLE]:
+            changes.append(['retitled', identifier, previous[_TITLE],
+                            item[_TITLE], None])
+        if previous[_TOKEN] != item[_TOKEN]:
+            changes.append(['changed', identifier, previous[_TOKEN],
+                            item[_TOKEN], None])
+    # Order within groups which the changes so far don't reproduce
+    changed_groups = [group for group, ids in new_children.iteritems()
+                      if old_children.get(group) != ids]
+    if changed_groups:
+        simulated = (dict(old_items), dict(
+            (group, list(ids)) for group, ids in old_children.iteritems()))
+        _apply(simulated, changes)
+        for group in sorted(changed_groups):
+            if simulated[1].get(group) != new_children[group]:
+                changes.append(['ordered', group, None,
+                                list(new_children[group]), None])
+    return changes
+
+
+def _apply(state, changes):
+    """Apply a delta's changes to (items, children) in place."""
+    items, children = state
+    insertions = []  # (index, id, parent)
+    for kind, identifier, before, after, index in changes:
+        if kind == 'removed':
+            item = items.pop(identifier)
+            siblings = children.get(item[_PARENT])
+            if siblings is not None:
+                siblings.remove(identifier)
+            children.pop(identifier, None)
+        elif kind == 'added':
+            items[identifier] = [after[field] for field in _FIELDS]
+            if after['type'] != 'sheet':
+                children[identifier] = []
+            insertions.append((index, identifier, after['parent']))
+        elif kind == 'moved':
+            siblings = children.get(before)
+            if siblings is not None:
+                siblings.remove(identifier)
+            items[identifier] = list(items[identifier])
+            items[identifier][_PARENT] = after
+            insertions.append((index, identifier, after))
+        elif kind in ('retitled', 'changed'):
+            items[identifier] = list(items[identifier])
+            items[identifier][_TITLE if kind == 'retitled' else _TOKEN] = (
+                after)
+    # Inserting in order of final index puts each item after those before
+    # it, provided the others kept their order
+    for index, identifier, parent in sorted(insertions):
+        children[parent].insert(index, identifier)
+    for kind, identifier, _, after, _ in changes:
+        if kind == 'ordered':
+            children[identifier] = list(after)
+
+
+def _as_dict(item):
+    return dict(zip(_FIELDS, item))
+
+
+def _build(state):
+    """Return list of root Groups of (items, children)."""
+    items, children = state
+    roots = []
+    stack = [(identifier, None) for identifier in reversed(children[ROOT])]
+    while stack:
+        identifier, parent = stack.pop()
+        _, type_, title, token = items[identifier]
+        if type_ == 'sheet':
+            sheet = Sheet.__new__(Sheet)
+            sheet.__dict__.update(
+                title=title, type=type_, identifier=identifier,
+                hasLifetimeIdentifier=None, titleType=None,
+                changeToken=token, creationDate=None, modificationDate=None)
+            parent.sheets.append(sheet)
+            continue
+        group = Group.__new__(Group)
+        group.__dict__.update(title=title, type=type_, identifier=identifier,
+                              hasLifetimeIdentifier=None, sheets=[],
+                              containers=[])
+        if parent is None:
+            roots.append(group)
+        else:
+            parent.containers.append(group)
+        stack.extend((child, group)
+                     for child in reversed(children[identifier]))
+    return roots
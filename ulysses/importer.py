@@ -0,0 +1,207 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Bulk import of a local directory tree into Ulysses groups and sheets.
+
+The whole group hierarchy is planned up front and created level by level.
+As soon as a group exists its files are handed to a worker pool which reads
+them and creates the sheets (and attaches any keywords), so sheet creation
+overlaps with the creation of deeper groups.
+
+Every group, sheet and keyword attachment is recorded in a journal file as
+it completes. Re-running an import with the same journal skips everything
+already recorded, so an import interrupted by a crash can be resumed without
+creating duplicates. (A crash in the short window between Ulysses creating an
+item and the journal recording it can still leave one duplicate behind.)
+"""
+
+import io
+import json
+import logging
+import os
+import sys
+import threading
+from multiprocessing.pool import ThreadPool
+
+from . import calls
+
+
+__all__ = ['DirectoryImporter', 'import_directory', 'FORMATS']
+
+
+logger = logging.getLogger(__name__)
+
+
+# file extension -> Ulysses import format
+FORMATS = {
+    '.md': 'markdown',
+    '.markdown': 'markdown',
+    '.txt': 'text',
+    '.html': 'html',
+    '.htm': 'html',
+}
+
+
+def import_directory(directory, parent=None, journal_path=None, **kwargs):
+    """Import a directory tree and return dict of relative path -> id.
+
+    See DirectoryImporter for arguments.
+    """
+    importer = DirectoryImporter(directory, parent, journal_path, **kwargs)
+    return importer.run()
+
+
+class DirectoryImporter(object):
+    """Imports a directory tree of text files into Ulysses.
+
+    The directory itself becomes a group in parent, each sub-directory a
+    group within it and each file with an extension in FORMATS a sheet.
+
+    Attributes:
+
+    directory -- local directory to import
+    parent -- name, path or id of Ulysses group to import into. Top-level if
+              None
+    journal_path -- file recording progress. Resume an interrupted import
+                    by passing the same path again. Not resumable if None
+    workers -- number of threads creating sheets
+    keywords_for -- callable taking a file path and returning a list of
+                    keywords to attach to its sheet, or None
+    silent_mode -- don't show changes in Ulysses if True
+    errors -- list of (relative path, exception) for files that failed
+    """
+
+    def __init__(self, directory, parent=None, journal_path=None, workers=4,
+                 keywords_for=None, silent_mode=True):
+        if isinstance(directory, str):
+            # unicode so that journal paths compare equal to os.walk's
+            directory = directory.decode(sys.getfilesystemencoding())
+        self.directory = os.path.abspath(directory)
+        self.parent = parent
+        self.journal_path = journal_path
+        self.workers = workers
+        self.keywords_for = keywords_for
+        self.silent_mode = silent_mode
+        self.errors = []
+        self._journal = None
+        self._journal_lock = threading.Lock()
+        self._done = {}  # (kind, relative path) -> id
+
+    def plan(self):
+        """Return list of levels, each a list of (dir, [files]) tuples.
+
+        Paths are relative to the imported directory, which is '.'. Each
+        level holds directories of the same depth in sorted order.
+        """
+        levels = []
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            dirnames.sort()
+            rel_dir = os.path.relpath(dirpath, self.directory)
+            depth = 0 if rel_dir == '.' else rel_dir.count(os.sep) + 1
+            files = [os.path.normpath(os.path.join(rel_dir, f))
+                     for f in sorted(filenames)
+                     if os.path.splitext(f)[1].lower() in FORMATS]
+            while len(levels) <= depth:
+                levels.append([])
+            levels[depth].append((rel_dir, files))
+        return levels
+
+    def run(self):
+        """Perform (or resume) the import and return relative path -> id."""
+        self._load_journal()
+        pool = ThreadPool(self.workers)
+        pending = []
+        try:
+            group_ids = {}
+            for level in self.plan():
+                for rel_dir, files in level:
+                    group_ids[rel_dir] = self._ensure_group(rel_dir,
+                                                            group_ids)
+                    for rel_path in files:
+                        pending.append((rel_path, pool.apply_async(
+                            self._import_file,
+                            (rel_path, group_ids[rel_dir]))))
+            for rel_path, result in pending:
+                try:
+                    result.get()
+                except Exception as e:
+                    logger.error("Failed to import '%s': %s" % (rel_path, e))
+                    self.errors.append((rel_path, e))
+        finally:
+            pool.close()
+            pool.join()
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+        return dict((path, identifier)
+                    for (kind, path), identifier in self._done.iteritems()
+                    if kind in ('group', 'sheet'))
+
+    # Internals
+
+    def _ensure_group(self, rel_dir, group_ids):
+        if ('group', rel_dir) in self._done:
+            return self._done[('group', rel_dir)]
+        if rel_dir == '.':
+            title = os.path.basename(self.directory)
+            parent = self.parent
+        else:
+            title = os.path.basename(rel_dir)
+            parent = group_ids[os.path.dirname(rel_dir) or '.']
+        identifier = calls.new_group(title, parent,
+                                     silent_mode=self.silent_mode)
+        self._record('group', rel_dir, identifier)
+        return identifier
+
+    def _import_file(self, rel_path, group_id):
+        path = os.path.join(self.directory, rel_path)
+        identifier = self._done.get(('sheet', rel_path))
+        if identifier is None:
+            with io.open(path, encoding='utf-8') as f:
+                text = f.read()
+            format_ = FORMATS[os.path.splitext(path)[1].lower()]
+            identifier = calls.new_sheet(text, group_id, format_,
+                                         silent_mode=self.silent_mode)
+            self._record('sheet', rel_path, identifier)
+        if (self.keywords_for is not None and
+                ('keywords', rel_path) not in self._done):
+            keywords = self.keywords_for(path)
+            if keywords:
+                calls.attach_keywords(identifier, keywords)
+            self._record('keywords', rel_path, identifier)
+
+    def _load_journal(self):
+        if self.journal_path is None:
+            return
+        if os.path.exists(self.journal_path):
+            with io.open(self.journal_path, encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # torn final line from a crash mid-write
+                        logger.warn('Ignoring corrupt journal line: %r' % line)
+                        continue
+                    self._done[(entry['kind'], entry['path'])] = entry['id']
+        self._journal = io.open(self.journal_path, 'ab')
+        if self._journal.tell() > 0:
+            # start afresh after any torn line
+            self._journal.write('\n')
+
+    def _record(self, kind, rel_path, identifier):
+        with self._journal_lock:
+            self._done[(kind, rel_path)] = identifier
+            if self._journal is not None:
+                entry = {'kind': kind, 'path': rel_path, 'id': identifier}
+                self._journal.write(json.dumps(entry) + '\n')
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
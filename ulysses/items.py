@@ -0,0 +1,308 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Read only Groups (including filters and trash) and Sheets built from the
+replies to Ulysses calls.
+"""
+
+import collections
+import logging
+import urllib
+
+
+__all__ = ['AbstractItem', 'Group', 'Sheet', 'SheetWithContent']
+
+
+logger = logging.getLogger(__name__)
+
+
+class AbstractItem(object):
+
+    # Attributes locating an item in a tree rather than describing it
+    _POSITION_ATTRIBUTES = ('parent', 'path', '_paths')
+
+    def __init__(self, title=None, type=None,   # @ReservedAssignment
+                 identifier=None, hasLifetimeIdentifier=None):
+        # Most titles are not escaped; unquote() would copy them regardless
+        self.title = urllib.unquote(title) if '%' in title else title
+        self.type = type
+        self.identifier = identifier
+        self.hasLifetimeIdentifier = hasLifetimeIdentifier
+
+    def __eq__(self, other):
+        return self._state() == other._state()
+
+    def _state(self):
+        return dict((k, v) for k, v in self.__dict__.iteritems()
+                    if k not in self._POSITION_ATTRIBUTES)
+
+    def _link(self, parent, paths):
+        self.parent = parent
+        if parent is None:
+            self.path = '/' + self.title
+        else:
+            self.path = parent.path + '/' + self.title
+        paths.setdefault(self.path, self)
+        if self.type != 'sheet':
+            self._paths = paths
+
+
+class Group(AbstractItem):
+    """Represents a Ulysses Group, Filter or Trash.
+
+    Attributes:
+
+        title -- Name of group
+        type -- always 'group', 'filter' or 'trash'
+        identifier -- Ulysses id
+        hasLifetimeIdentifier -- True if id is unchanged after a move
+        sheets -- list of Sheets, empty for filter.
+        containers -- list of Groups. Will be None if group_dict resulted from
+                      a non-recursive call to Ulysses.
+
+    With link_parents set, every Group and Sheet in the tree also has:
+
+        parent -- the Group containing it, None for the root of the tree
+        path -- slash-joined titles from the root, e.g. '/iCloud/Inbox/test'
+
+    """
+
+    def __init__(self, title=None, type=None,  # @ReservedAssignment
+                 sheets=None, containers=None, identifier=None,
+                 hasLifetimeIdentifier=None, link_parents=False):
+        """Create a Group and possible the tree below it.
+
+        Best called with **group_dict, where group_dict results from a call
+        to Ulysses.
+
+        link_parents -- set parent and path on every item in the tree, and
+                        index paths for resolve_path(), if True
+
+        """
+        self._init_group(title, type, identifier, hasLifetimeIdentifier)
+        if link_parents:
+            paths = {}
+            self._link(None, paths)
+
+        # Build the tree below with an explicit stack rather than recursion
+        # so that deep trees cannot hit the recursion limit
+        stack = [(self, sheets, containers)]
+        while stack:
+            group, sheets, containers = stack.pop()
+            group.sheets = []
+            for sheet_dict in sheets or []:
+                sheet = Sheet(**sheet_dict)
+                if link_parents:
+                    sheet._link(group, paths)
+                group.sheets.append(sheet)
+            # containers will be None if group was accessed in Ulysses with a
+            # non-recursive query
+            if containers is None:
+                group.containers = None  # unknown as non-recursive query
+                continue
+            group.containers = []
+            children = []
+            for container_dict in containers:
+                if container_dict['type'] == 'filter':
+                    logger.warn(
+                        "Ignoring filter '%s'" % container_dict['title'])
+                    continue
+                sub_group = Group.__new__(Group)
+                sub_group._init_group(
+                    container_dict.get('title'), container_dict.get('type'),
+                    container_dict.get('identifier'),
+                    container_dict.get('hasLifetimeIdentifier'))
+                if link_parents:
+                    sub_group._link(group, paths)
+                group.containers.append(sub_group)
+                children.append((sub_group, container_dict.get('sheets'),
+                                 container_dict.get('containers')))
+            # reversed so the first sub-group claims a duplicated path
+            stack.extend(reversed(children))
+
+    def _init_group(self, title, type,  # @ReservedAssignment
+                    identifier, hasLifetimeIdentifier):
+        super(Group, self).__init__(title, type, identifier,
+                                    hasLifetimeIdentifier)
+        if type not in ('group', 'filter', 'trash'):
+            raise AssertionError(
+                "type was not group, filter or trash but '%s'" % type)
+
+    def walk(self, order='dfs', prune=None):
+        """Yield this group and every Sheet and Group below it.
+
+        Within a group, sheets come before sub-groups.
+
+        order -- 'dfs' (depth first, pre-order) or 'bfs' (breadth first)
+        prune -- callable taking a Group. If it returns True the group is
+                 yielded but nothing below it is
+        """
+        if order not in ('dfs', 'bfs'):
+            raise ValueError("order was not 'dfs' or 'bfs' but '%s'" % order)
+        pending = collections.deque([self])
+        depth_first = order == 'dfs'
+        pop = pending.pop if depth_first else pending.popleft
+        while pending:
+            item = pop()
+            yield item
+            if item.type == 'sheet' or (prune is not None and prune(item)):
+                continue
+            children = item.sheets + (item.containers or [])
+            pending.extend(reversed(children) if depth_first else children)
+
+    def iter_sheets(self, order='dfs', prune=None):
+        """Yield every Sheet below this group. See walk()."""
+        for item in self.walk(order, prune):
+            if item.type == 'sheet':
+                yield item
+
+    def iter_groups(self, order='dfs', prune=None):
+        """Yield this group and every Group below it. See walk()."""
+        for item in self.walk(order, prune):
+            if item.type != 'sheet':
+                yield item
+
+    def resolve_path(self, path):
+        """Return identifier of the item at a path such as '/iCloud/Inbox'.
+
+        Paths start with the title of the root of the tree. Where titles are
+        duplicated the first item met in walk() order wins. Requires the tree
+        to have been created with link_parents set.
+        """
+        return self.get_item_by_path(path).identifier
+
+    def get_item_by_path(self, path):
+        """Return the Sheet or Group at a path. See resolve_path()."""
+        if getattr(self, '_paths', None) is None:
+            raise Exception('This group was not created with link_parents'
+                            ' and therefore has no knowledge of paths')
+        try:
+            return self._paths[path]
+        except KeyError:
+            raise KeyError("No item at path '%s' found" % path)
+
+    def get_group_by_title(self, title):
+        """Return a group contained immediately within this group.
+
+        Will fail if this Group was accessed non-recursively.
+
+        title -- name of group to return
+        """
+        if self.containers is None:
+            raise Exception('This group was found non-recursively and'
+                            ' therefore has no knowledge of its containers')
+        for group in self.containers:
+            if group.title == title:
+                return group
+        raise KeyError("No group called '%s' found" % title)
+
+    def get_sheet_by_title(self, title):
+        """Return a sheet contained immediately within this group.
+
+        title -- name of sheet to return
+        """
+        for sheet in self.sheets:
+            if sheet.title == title:
+                return sheet
+        raise KeyError("No sheet called '%s' found" % title)
+
+    def __unicode__(self):
+        title = self.title
+        identifier = self.identifier
+        n_sheets = len(self.sheets)
+        if self.containers is not None:
+            n_containers = len(self.containers)
+        else:
+            n_containers = '?unknown?'
+        return (u"Group(title='%(title)s', n_sheets=%(n_sheets)s, n_containers"
+                u"=%(n_containers)s, identifier='%(identifier)s')" % locals())
+
+    def __str__(self):
+        return unicode(self).encode('utf-8')
+
+
+class Sheet(AbstractItem):
+
+    """Represents a Ulysses Sheet.
+
+    Attributes:
+
+    title -- Name (first line) of sheet
+    type -- always 'sheet'
+    identifier -- Ulysses id
+    hasLifetimeIdentifier -- True if id is unchanged after a move
+    titleType -- The markup type of the title. Will be heading1...heading6,
+                 comment if the title is a heading or comment. Will be set to
+                 filename on external folders or Dropbox if the title is the
+                 sheet's filename (e.g. @: My Filename). If no title is given
+                 this value is set to None
+    creationDate -- The timestamp when the sheet was last modified. The
+                    timestamp is given as the number of seconds relative to
+                    00:00:00 UTC on 1 January 2001
+    modificationDate -- The timestamp when the sheet was created
+    changeToken -- a string which change when the sheet is modified
+
+    """
+    def __init__(self,  title=None, type=None,   # @ReservedAssignment
+                 identifier=None, hasLifetimeIdentifier=None,
+                 titleType=None, creationDate=None, modificationDate=None,
+                 changeToken=None):
+        """Create a Sheet.
+
+        Best called with **sheet_dict, where sheet_dict results from a call
+        to Ulysses.
+        """
+
+        super(Sheet, self).__init__(
+            title, type, identifier, hasLifetimeIdentifier)
+        if type != 'sheet':
+            raise ValueError('Unexpected type: ' + str(type))
+        self.changeToken = changeToken
+        self.creationDate = creationDate
+        self.modificationDate = modificationDate
+        self.titleType = titleType
+
+    def __unicode__(self):
+        title = self.title
+        identifier = self.identifier
+        return (u"Sheet(title='%(title)s', identifier='%(identifier)s')"
+                % locals())
+
+    def __str__(self):
+        return unicode(self).encode('utf-8')
+
+
+class SheetWithContent(Sheet):
+    """Represents a Ulysses sheet in more detail than Sheet
+
+    Attributes (as Sheet and in addition):
+
+    text -- The sheets content encoded as Markdown. This is only available if
+            the text parameter was set to True when created with read_sheet()
+    keywords -- list of strings representing keywords
+    notes -- list of strings representing notes in markdown
+
+    """
+    def __init__(self,  title=None, type=None,   # @ReservedAssignment
+                 identifier=None, hasLifetimeIdentifier=None,
+                 titleType=None, creationDate=None, modificationDate=None,
+                 changeToken=None, text=None, keywords=None, notes=None):
+        """Create a Sheet.
+
+        Best called with **sheet_dict, where sheet_dict results from a call
+        to Ulysses.
+        """
+        super(SheetWithContent, self).__init__(
+            title, type, identifier, hasLifetimeIdentifier, titleType,
+            creationDate, modificationDate, changeToken)
+
+        self.text = unicode(text)
+        self.keywords = list(keywords)
+        self.notes = list(notes)
@@ -0,0 +1,219 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Persistent inverted index of sheet keywords.
+
+Sheets listed by get_root_items() carry no keywords, so finding the sheets
+with a keyword otherwise means calling read_sheet() on every sheet. A
+KeywordIndex maps each keyword to the set of sheet ids carrying it, built
+from SheetWithContent.keywords, and answers AND/OR/NOT queries and
+per-keyword counts with set operations:
+
+    index = KeywordIndex('~/.cache/ulysses-keywords.json')
+    index.refresh(ulysses.get_root_items())  # reads only changed sheets
+    index.listen()  # track attach_keywords/remove_keywords made here
+    index.query(all_of=['draft'], none_of=['done'])
+    index.save()
+
+refresh() compares each sheet's changeToken with the one recorded when it
+was indexed and reads only sheets which have changed, appeared or gone.
+"""
+
+import json
+import logging
+import os
+import threading
+
+from . import xcallback
+from .parallel import read_sheets
+from .storage import atomic_write, ensure_directory
+
+
+__all__ = ['KeywordIndex']
+
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordIndex(object):
+    """Inverted index of keyword -> sheet ids.
+
+    Attributes:
+
+    path -- file the index is loaded from and saved to, or None
+    """
+
+    def __init__(self, path=None):
+        self.path = path and os.path.abspath(os.path.expanduser(path))
+        self._lock = threading.RLock()
+        self._sheets = {}  # id -> [changeToken, list of keywords]
+        self._postings = {}  # keyword -> set of ids
+        if self.path is not None and os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                for identifier, (token, keywords) in json.load(
+                        f)['sheets'].iteritems():
+                    self._set(identifier, token, keywords)
+
+    def __len__(self):
+        """Return number of sheets indexed."""
+        return len(self._sheets)
+
+    def __contains__(self, identifier):
+        return identifier in self._sheets
+
+    # Queries
+
+    def query(self, all_of=(), any_of=(), none_of=()):
+        """Return set of ids of sheets matching all the given conditions.
+
+        all_of -- keywords every matching sheet has
+        any_of -- keywords of which matching sheets have at least one
+        none_of -- keywords matching sheets do not have
+
+        With no all_of or any_of, sheets are chosen from every sheet indexed.
+        """
+        with self._lock:
+            postings = self._postings
+            if all_of:
+                sets = sorted((postings.get(k, frozenset()) for k in all_of),
+                              key=len)
+                result = set(sets[0])
+                for s in sets[1:]:
+                    result &= s
+            else:
+                result = None
+            if any_of:
+                union = set()
+                for k in any_of:
+                    union |= postings.get(k, frozenset())
+                result = union if result is None else result & union
+            if result is None:
+                result = set(self._sheets)
+            for k in none_of:
+                result -= postings.get(k, frozenset())
+            return result
+
+    def count(self, keyword):
+        """Return number of sheets with keyword."""
+        return len(self._postings.get(keyword, ()))
+
+    def counts(self):
+        """Return dict of keyword -> number of sheets with it."""
+        with self._lock:
+            return dict((k, len(ids)) for k, ids in self._postings.iteritems())
+
+    def keywords_of(self, identifier):
+        """Return list of keywords of an indexed sheet."""
+        return list(self._sheets[identifier][1])
+
+    # Updates
+
+    def update_sheet(self, sheet):
+        """Index, or re-index, a SheetWithContent."""
+        with self._lock:
+            self._set(sheet.identifier, sheet.changeToken, sheet.keywords)
+
+    def remove_sheet(self, identifier):
+        """Remove a sheet from the index if present."""
+        with self._lock:
+            self._unset(identifier)
+
+    def attach(self, identifier, keywords):
+        """Record keywords as attached to an indexed sheet."""
+        with self._lock:
+            if identifier in self._sheets:
+                token, current = self._sheets[identifier]
+                self._set(identifier, token, current + [
+                    k for k in keywords if k not in current])
+
+    def detach(self, identifier, keywords):
+        """Record keywords as removed from an indexed sheet."""
+        with self._lock:
+            if identifier in self._sheets:
+                token, current = self._sheets[identifier]
+                self._set(identifier, token,
+                          [k for k in current if k not in keywords])
+
+    def refresh(self, groups, concurrency=4):
+        """Bring the index up to date with a library tree.
+
+        Sheets new to the index or whose changeToken has moved are read;
+        sheets no longer in the tree are removed. Returns number read.
+
+        groups -- a Group, or list of Groups, from a recursive listing
+        """
+        if not isinstance(groups, (list, tuple)):
+            groups = [groups]
+        tokens = {}
+        for group in groups:
+            for sheet in group.iter_sheets():
+                tokens[sheet.identifier] = sheet.changeToken
+        with self._lock:
+            for identifier in set(self._sheets) - set(tokens):
+                self._unset(identifier)
+            changed = [identifier for identifier, token in tokens.iteritems()
+                       if identifier not in self._sheets or
+                       self._sheets[identifier][0] != token]
+        n_read = 0
+        for result in read_sheets(changed, concurrency=concurrency):
+            if result.error is not None:
+                logger.warn("Could not index sheet '%s': %s" % (
+                    result.id, result.error))
+                continue
+            self.update_sheet(result.value)
+            n_read += 1
+        return n_read
+
+    def listen(self):
+        """Update the index as keywords are attached or removed via calls."""
+        xcallback.add_call_listener(self._on_call)
+
+    def stop_listening(self):
+        """Stop updating the index from calls."""
+        xcallback.remove_call_listener(self._on_call)
+
+    def save(self):
+        """Write the index atomically to path.
+
+        Raises ValueError if the index has no path.
+        """
+        if self.path is None:
+            raise ValueError('No path configured to save the index to')
+        with self._lock:
+            data = json.dumps({'sheets': self._sheets})
+        ensure_directory(os.path.dirname(self.path))
+        atomic_write(self.path, data)
+
+    # Internals
+
+    def _on_call(self, action, params, reply):
+        if action in ('attach-keywords', 'remove-keywords'):
+            keywords = params['keywords'].split(',')
+            if action == 'attach-keywords':
+                self.attach(params['id'], keywords)
+            else:
+                self.detach(params['id'], keywords)
+
+    def _set(self, identifier, token, keywords):
+        self._unset(identifier)
+        keywords = list(keywords)
+        self._sheets[identifier] = [token, keywords]
+        for keyword in keywords:
+            self._postings.setdefault(keyword, set()).add(identifier)
+
+    def _unset(self, identifier):
+        entry = self._sheets.pop(identifier, None)
+        if entry is None:
+            return
+        for keyword in entry[1]:
+            ids = self._postings[keyword]
+            ids.discard(identifier)
+            if not ids:
+                del self._postings[keyword]
@@ -0,0 +1,379 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Durable, asynchronous queue of write calls to Ulysses.
+
+A write call blocks until Ulysses replies, and fails with a UlyssesError if
+Ulysses is busy or not running. An Outbox instead appends each write to a
+journal file (flushed to disk) and returns at once; a background thread then
+makes the calls in order, retrying transient failures:
+
+    outbox = Outbox('~/.ulysses-outbox')
+    op = outbox.attach_note(sheet_id, 'Call back Tuesday')
+    outbox.status(op).state  # 'pending', then 'applied' (or 'failed')
+
+The journal records when each call is queued, started and applied or
+failed, so writes outlive the process: an Outbox opened on the same journal
+carries on with whatever was still pending. A call found started but not
+finished was interrupted; if making it twice is harmless (see IDEMPOTENT) it
+is made again, otherwise it is marked failed rather than risk applying it
+twice.
+
+submit() checks the arguments against the call's signature, and that ids
+look like ids, so a mistaken call raises there rather than in the thread.
+An x-error reply from Ulysses (a UlyssesError with a code), such as an
+unknown id, or a TypeError, ValueError or AssertionError from a bad
+argument, fails the same way however often the call is made, so its
+operation is marked failed at once rather than holding up those behind it.
+Other errors, such as xcall already running or Ulysses not running or not
+replying, are retried; see is_transient().
+"""
+
+import inspect
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+from . import calls
+from .client import UlyssesError, isID
+from .storage import atomic_write
+
+
+__all__ = ['Outbox', 'Operation', 'WRITE_CALLS', 'IDEMPOTENT',
+           'PENDING', 'APPLIED', 'FAILED', 'is_transient']
+
+
+logger = logging.getLogger(__name__)
+
+
+PENDING, APPLIED, FAILED = 'pending', 'applied', 'failed'
+
+# calls in ulysses.calls an Outbox can queue
+WRITE_CALLS = frozenset([
+    'new_group', 'set_group_title', 'new_sheet', 'set_sheet_title', 'insert',
+    'attach_keywords', 'remove_keywords', 'attach_note', 'update_note',
+    'remove_note', 'trash', 'move', 'copy'])
+
+# write calls which leave the library the same whether made once or twice
+IDEMPOTENT = frozenset([
+    'set_group_title', 'set_sheet_title', 'attach_keywords',
+    'remove_keywords', 'update_note', 'trash', 'move'])
+
+# write calls whose id argument must be an id, not a name or path
+_ID_CALLS = frozenset(['insert', 'attach_keywords', 'remove_keywords',
+                       'trash'])
+
+# the functions themselves, for checking arguments even with calls patched
+_FUNCTIONS = dict((name, getattr(calls, name)) for name in WRITE_CALLS)
+
+
+def is_transient(error):
+    """Return True if a call failing with error may succeed if made again.
+
+    A UlyssesError with a code is Ulysses rejecting the request itself; a
+    TypeError, ValueError or AssertionError is a mistake in the arguments.
+    """
+    if isinstance(error, UlyssesError):
+        return error.code is None
+    return not isinstance(error, (TypeError, ValueError, AssertionError))
+
+
+class Operation(object):
+    """A queued write call and what became of it.
+
+    Attributes:
+
+    id -- number of the operation, increasing in the order queued
+    call -- name of the function in ulysses.calls
+    args -- list of positional arguments
+    kwargs -- dict of keyword arguments
+    state -- PENDING, APPLIED or FAILED
+    attempts -- number of times the call has been started
+    result -- return value of the call once applied, e.g. a new sheet's id
+    error -- message of the last error, if any
+    """
+
+    def __init__(self, id, call, args, kwargs):  # @ReservedAssignment
+        self.id = id
+        self.call = call
+        self.args = args
+        self.kwargs = kwargs
+        self.state = PENDING
+        self.attempts = 0
+        self.result = None
+        self.error = None
+
+    def __repr__(self):
+        return '<Operation %d %s: %s>' % (self.id, self.call, self.state)
+
+
+class Outbox(object):
+    """Journalled queue of write calls made in order by a background thread.
+
+    Queue a call with submit(), or by calling the method of the same name:
+    outbox.insert(id, text) is outbox.submit('insert', id, text). Arguments
+    must be JSON serialisable. Each returns the new Operation's id.
+
+    Attributes:
+
+    journal_path -- path of the journal file
+    retries -- number of times a call failing transiently is retried
+               before it is marked failed
+    retry_delay -- seconds before the first retry; doubled for each after
+    operations -- dict of operation id -> Operation
+    """
+
+    def __init__(self, journal_path, retries=5, retry_delay=1.0, start=True):
+        self.journal_path = os.path.expanduser(journal_path)
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.operations = {}
+        self._queue = []  # ids of pending operations in order
+        self._next_id = 1
+        self._lock = threading.Condition()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._journal = None
+        self._load_journal()
+        if start:
+            self.start()
+
+    def __getattr__(self, name):
+        if name in WRITE_CALLS:
+            return lambda *args, **kwargs: self.submit(name, *args, **kwargs)
+        raise AttributeError(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, call, *args, **kwargs):
+        """Queue call(*args, **kwargs) and return the Operation's id.
+
+        Returns once the call is in the journal on disk. Raises TypeError if
+        the arguments don't fit the call and ValueError if an id doesn't
+        look like one.
+        """
+        if call not in WRITE_CALLS:
+            raise ValueError("'%s' is not a write call" % call)
+        arguments = inspect.getcallargs(_FUNCTIONS[call], *args, **kwargs)
+        target = arguments.get('id')
+        if call in _ID_CALLS and not (
+                isinstance(target, basestring) and isID(target)):
+            raise ValueError('%r is not an id' % (target,))
+        with self._lock:
+            identifier = self._next_id
+            self._next_id += 1
+            self._record({'op': identifier, 'event': 'queued', 'call': call,
+                          'args': list(args), 'kwargs': kwargs})
+            self.operations[identifier] = Operation(
+                identifier, call, list(args), kwargs)
+            self._queue.append(identifier)
+            self._lock.notify_all()
+        return identifier
+
+    def status(self, op_id):
+        """Return the Operation with id op_id."""
+        return self.operations[op_id]
+
+    @property
+    def pending(self):
+        """List of operations still to be applied, in order."""
+        return self._in_state(PENDING)
+
+    @property
+    def applied(self):
+        """List of operations applied."""
+        return self._in_state(APPLIED)
+
+    @property
+    def failed(self):
+        """List of operations given up on."""
+        return self._in_state(FAILED)
+
+    def wait(self, op_id=None, timeout=None):
+        """Wait until op_id (or every operation queued) is applied or failed.
+
+        Return True, or False if timeout seconds passed first.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while (self.operations[op_id].state == PENDING if op_id
+                   else self._queue):
+                remaining = (None if deadline is None
+                             else deadline - time.time())
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+        return True
+
+    def start(self):
+        """Start the thread making the calls (done on init by default)."""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._drain)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        """Stop once any call in progress finishes and close the journal.
+
+        Pending operations stay in the journal for the next Outbox opened on
+        it.
+        """
+        self._stopping.set()
+        with self._lock:
+            self._lock.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def compact(self):
+        """Rewrite the journal keeping only pending and failed operations."""
+        with self._lock:
+            # ids are not reused, even of operations dropped here
+            lines = [{'next': self._next_id}]
+            for op_id in sorted(self.operations):
+                operation = self.operations[op_id]
+                if operation.state == APPLIED:
+                    continue
+                lines.append({'op': op_id, 'event': 'queued',
+                              'call': operation.call, 'args': operation.args,
+                              'kwargs': operation.kwargs})
+                if operation.state == FAILED:
+                    lines.append({'op': op_id, 'event': FAILED,
+                                  'error': operation.error})
+            reopen = self._journal is not None
+            if reopen:
+                self._journal.close()
+            atomic_write(self.journal_path, ''.join(
+                json.dumps(line) + '\n' for line in lines))
+            if reopen:
+                self._journal = io.open(self.journal_path, 'ab')
+
+    def _in_state(self, state):
+        with self._lock:
+            return [self.operations[i] for i in sorted(self.operations)
+                    if self.operations[i].state == state]
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                while not self._queue and not self._stopping.is_set():
+                    self._lock.wait()
+                if self._stopping.is_set():
+                    return
+                operation = self.operations[self._queue[0]]
+            self._apply(operation)
+
+    def _apply(self, operation):
+        while not self._stopping.is_set():
+            with self._lock:
+                operation.attempts += 1
+                self._record({'op': operation.id, 'event': 'started'})
+            try:
+                result = getattr(calls, operation.call)(
+                    *operation.args, **operation.kwargs)
+            except Exception as e:
+                with self._lock:
+                    operation.error = str(e)
+                    # the call was not applied, so may safely be made again
+                    self._record({'op': operation.id, 'event': 'error',
+                                  'error': operation.error})
+                logger.warn('Outbox %r attempt %d failed: %s' % (
+                    operation, operation.attempts, e))
+                if operation.attempts > self.retries or not is_transient(e):
+                    self._finish(operation, FAILED, error=operation.error)
+                    return
+                delay = self.retry_delay * 2 ** (operation.attempts - 1)
+                self._stopping.wait(delay)
+            else:
+                self._finish(operation, APPLIED, result=result)
+                return
+
+    def _finish(self, operation, state, **details):
+        with self._lock:
+            entry = {'op': operation.id, 'event': state}
+            entry.update(details)
+            self._record(entry)
+            operation.state = state
+            operation.result = details.get('result')
+            self._queue.remove(operation.id)
+            self._lock.notify_all()
+
+    def _load_journal(self):
+        started = set()
+        if os.path.exists(self.journal_path):
+            with io.open(self.journal_path, encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # torn final line from a crash mid-write
+                        logger.warn('Ignoring corrupt outbox line: %r' % line)
+                        continue
+                    self._replay(entry, started)
+        self._journal = io.open(self.journal_path, 'ab')
+        if self._journal.tell() > 0:
+            # start afresh after any torn line
+            self._journal.write('\n')
+        for op_id in sorted(self.operations):
+            operation = self.operations[op_id]
+            if operation.state != PENDING:
+                continue
+            if op_id in started and operation.call not in IDEMPOTENT:
+                # Ulysses may or may not have made the call
+                operation.state = FAILED
+                operation.error = 'interrupted; may have been applied'
+                self._record({'op': op_id, 'event': FAILED,
+                              'error': operation.error})
+            else:
+                self._queue.append(op_id)
+
+    def _replay(self, entry, started):
+        if 'next' in entry:
+            self._next_id = max(self._next_id, entry['next'])
+            return
+        op_id, event = entry['op'], entry['event']
+        if event == 'queued':
+            self._next_id = max(self._next_id, op_id + 1)
+            self.operations[op_id] = Operation(
+                op_id, entry['call'], entry['args'], entry['kwargs'])
+            return
+        operation = self.operations.get(op_id)
+        if operation is None:
+            return
+        if event == 'started':
+            operation.attempts += 1
+            started.add(op_id)
+        elif event == 'error':
+            operation.error = entry['error']
+            started.discard(op_id)
+        else:
+            operation.state = event
+            operation.result = entry.get('result')
+            operation.error = entry.get('error', operation.error)
+
+    def _record(self, entry):
+        self._journal.write(json.dumps(entry) + '\n')
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
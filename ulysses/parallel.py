@@ -0,0 +1,151 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Multi-item reads with a concurrency limit.
+
+read_sheets() and get_items() run read_sheet() and get_item() over many ids
+from a bounded set of worker threads and yield a Result per id as each
+completes, or in the order the ids were given if asked. At most
+`concurrency` ids are in flight or waiting to be yielded at any time, so
+memory stays bounded however many ids are passed, and ids may come from a
+generator.
+
+Ulysses serves one x-callback-url at a time, so call_ulysses() serialises
+the xcalls themselves; the workers overlap everything around them (building
+urls, decoding replies and constructing items). Calls made by the workers
+take the priority class (see ulysses.scheduler) of the calling thread.
+"""
+
+import collections
+import logging
+import threading
+import Queue
+
+from . import calls
+from .scheduler import current_priority, priority
+
+
+__all__ = ['read_sheets', 'get_items', 'imap_bounded', 'call_worker',
+           'Result']
+
+
+logger = logging.getLogger(__name__)
+
+
+class Result(collections.namedtuple('Result', ['id', 'value', 'error'])):
+    """Outcome of the call for one id: value if it succeeded, else error."""
+    __slots__ = ()
+
+
+def read_sheets(ids, text=False, concurrency=4, ordered=False):
+    """Yield a Result holding a SheetWithContent (or error) per id.
+
+    ids -- iterable of sheet ids
+    text -- return full text of sheets
+    concurrency -- maximum number of ids in flight at once
+    ordered -- yield in the order of ids rather than as completed if True
+    """
+    return imap_bounded(lambda id_: calls.read_sheet(id_, text), ids,
+                        concurrency, ordered)
+
+
+def get_items(ids, recursive=False, concurrency=4, ordered=False):
+    """Yield a Result holding a Group or Sheet (or error) per id.
+
+    ids -- iterable of item ids
+    recursive -- return sub-groups of groups if True
+    concurrency -- maximum number of ids in flight at once
+    ordered -- yield in the order of ids rather than as completed if True
+    """
+    return imap_bounded(lambda id_: calls.get_item(id_, recursive), ids,
+                        concurrency, ordered)
+
+
+def imap_bounded(func, items, concurrency=4, ordered=False):
+    """Yield Result(item, func(item), error) for each item.
+
+    func is called from up to `concurrency` threads. An Exception raised by
+    func is returned as the Result's error rather than raised; any other
+    exception, e.g. a KeyboardInterrupt or SystemExit in a worker, is
+    raised here.
+    """
+    if concurrency < 1:
+        raise ValueError('concurrency must be at least 1')
+    items = iter(items)
+    tasks = Queue.Queue()
+    results = Queue.Queue()
+    workers = [threading.Thread(target=call_worker, args=(
+        func, tasks, results, current_priority())) for _ in range(concurrency)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    state = {'submitted': 0, 'in_flight': 0, 'exhausted': False}
+    buffered = {}  # sequence number -> Result, awaiting its turn if ordered
+
+    def fill():
+        while (not state['exhausted'] and
+               state['in_flight'] + len(buffered) < concurrency):
+            try:
+                item = next(items)
+            except StopIteration:
+                state['exhausted'] = True
+                return
+            tasks.put((state['submitted'], item))
+            state['submitted'] += 1
+            state['in_flight'] += 1
+
+    try:
+        fill()
+        next_to_yield = 0
+        while state['in_flight'] or buffered:
+            if next_to_yield in buffered:
+                yield buffered.pop(next_to_yield)
+                next_to_yield += 1
+                fill()
+                continue
+            sequence, result = results.get()
+            state['in_flight'] -= 1
+            if not isinstance(result.error, (Exception, type(None))):
+                raise result.error
+            if ordered:
+                buffered[sequence] = result
+            else:
+                yield result
+                fill()
+    finally:
+        for _ in workers:
+            tasks.put(None)
+
+
+def call_worker(func, tasks, results, priority_class=None):
+    """Call func on items from a queue until given None; run in a thread.
+
+    tasks -- Queue of (sequence, item) tuples, then None to stop
+    results -- Queue given (sequence, Result(item, value, error)) for each,
+               even if func raises a BaseException such as SystemExit, so a
+               consumer waiting for every item is never left waiting
+    priority_class -- scheduler priority class to make calls with, e.g. the
+                      current_priority() of the thread starting the worker
+    """
+    if priority_class is not None:
+        with priority(priority_class):
+            return call_worker(func, tasks, results, None)
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        sequence, item = task
+        try:
+            result = Result(item, func(item), None)
+        except BaseException as e:
+            logger.debug('Call for %r failed: %r' % (item, e))
+            result = Result(item, None, e)
+        results.put((sequence, result))
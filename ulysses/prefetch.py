@@ -0,0 +1,248 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Speculative background reads of the sheets likely to be read next.
+
+After a group is listed or opened, a few of its most recently modified
+sheets are nearly always read next. A Prefetcher listens to the calls made
+through a UlyssesClient and, when Ulysses has been idle for a moment, reads
+the sheets it predicts into a SheetCache at BACKGROUND priority, so that a
+scheduler (see ulysses.scheduler) lets interactive calls go first:
+
+    prefetcher = Prefetcher(SheetCache('~/.cache/ulysses-sheets'))
+    group = ulysses.get_item(group_id)  # queues its newest sheets
+    sheet = prefetcher.read_sheet(sheet_id)  # likely served from cache
+    prefetcher.metrics()['hit_rate']
+    prefetcher.close()
+
+Predictions come from:
+
+- recency -- the per_group most recently modified sheets of a group listed
+  with get-item, or of a known group opened with open
+- locality -- the sheets either side of a sheet just read, in its group
+- history -- the sheets most often read straight after a sheet just read
+
+The newest predictions are read first, and cancel() drops any not yet read.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from .client import default_client
+from .scheduler import BACKGROUND, priority
+
+
+__all__ = ['Prefetcher']
+
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher(object):
+    """Background reader of likely next sheets into a SheetCache.
+
+    Attributes:
+
+    cache -- SheetCache warmed
+    client -- UlyssesClient listened to and read with
+    per_group -- number of a group's newest sheets read after it is listed
+    idle_delay -- seconds without calls from others to wait before a read
+    max_pending -- number of predictions kept waiting; older are dropped
+    """
+
+    def __init__(self, cache, client=None, per_group=3, idle_delay=0.2,
+                 max_pending=20, start=True):
+        self.cache = cache
+        self.client = client or default_client()
+        self.per_group = per_group
+        self.idle_delay = idle_delay
+        self.max_pending = max_pending
+        self._lock = threading.Condition()
+        self._pending = collections.OrderedDict()  # id -> changeToken
+        self._groups = {}  # group id -> [(sheet id, changeToken, modified)]
+        self._located = {}  # sheet id -> (group id, index in group)
+        self._next = collections.defaultdict(collections.Counter)
+        self._last_read = None
+        self._last_call = 0.0
+        self._prefetched = set()  # ids read ahead and not yet used
+        self._counts = collections.Counter()
+        self._closed = False
+        self._thread = None
+        self.client.add_listener(self._on_call)
+        if start:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def read_sheet(self, id, change_token=None):  # @ReservedAssignment
+        """Return SheetWithContent (with text), from the cache if current.
+
+        As ulysses.cache.cached_read_sheet(), but reads made this way count
+        towards the hit rate.
+        """
+        with self._lock:
+            self._pending.pop(id, None)
+            used = id in self._prefetched
+            self._prefetched.discard(id)
+            self._counts['reads'] += 1
+            self._counts['used'] += used
+            self._read(id)
+        if change_token is None:
+            change_token = self.client.get_item(id).changeToken
+        sheet = self.cache.get(id, change_token)
+        if sheet is None:
+            sheet = self.client.read_sheet(id, text=True)
+            self.cache.put(sheet)
+        elif used:
+            with self._lock:
+                self._counts['hits'] += 1
+        return sheet
+
+    def cancel(self):
+        """Drop every prediction not yet read."""
+        with self._lock:
+            self._counts['cancelled'] += len(self._pending)
+            self._pending.clear()
+
+    def close(self):
+        """Stop listening and prefetching."""
+        self.client.remove_listener(self._on_call)
+        with self._lock:
+            self._closed = True
+            self._pending.clear()
+            self._lock.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def pending(self):
+        """Return list of ids of sheets waiting to be read, next first."""
+        with self._lock:
+            return list(reversed(self._pending))
+
+    def metrics(self):
+        """Return dict of counts and the hit rate.
+
+        prefetched -- sheets read ahead into the cache
+        used -- of those, how many were then read with read_sheet()
+        reads -- reads made with read_sheet()
+        hits -- reads served from the cache thanks to a prefetch
+        cancelled -- predictions dropped by cancel()
+        hit_rate -- hits / reads
+        precision -- used / prefetched
+        """
+        with self._lock:
+            counts = dict((name, self._counts[name]) for name in (
+                'prefetched', 'used', 'reads', 'hits', 'cancelled'))
+        counts['hit_rate'] = (float(counts['hits']) / counts['reads']
+                              if counts['reads'] else 0.0)
+        counts['precision'] = (float(counts['used']) / counts['prefetched']
+                               if counts['prefetched'] else 0.0)
+        return counts
+
+    # Internals
+
+    def _on_call(self, action, params, reply):
+        if getattr(_local, 'prefetching', False):
+            return  # one of our own reads
+        with self._lock:
+            self._last_call = time.time()
+            if action == 'get-item' and reply['item']['type'] == 'group':
+                self._learn_group(reply['item'])
+                self._predict_group(params['id'])
+            elif action == 'open' and params.get('id') in self._groups:
+                self._predict_group(params['id'])
+            elif (action == 'read-sheet' and
+                  params['id'] != self._last_read):  # else seen in read_sheet
+                self._read(params['id'])
+
+    def _learn_group(self, item):
+        sheets = [(sheet['identifier'], sheet.get('changeToken'),
+                   sheet.get('modificationDate'))
+                  for sheet in item.get('sheets') or []]
+        self._groups[item['identifier']] = sheets
+        for index, (identifier, _, _) in enumerate(sheets):
+            self._located[identifier] = (item['identifier'], index)
+
+    def _predict_group(self, group_id):
+        newest = sorted(self._groups[group_id], key=lambda sheet: sheet[2],
+                        reverse=True)[:self.per_group]
+        for identifier, token, _ in reversed(newest):
+            self._queue(identifier, token)
+
+    def _read(self, identifier):
+        """Note a read of a sheet and predict those after it."""
+        if self._last_read is not None and self._last_read != identifier:
+            self._next[self._last_read][identifier] += 1
+        self._last_read = identifier
+        located = self._located.get(identifier)
+        if located is not None:
+            group_id, index = located
+            sheets = self._groups[group_id]
+            for neighbour in (index - 1, index + 1):
+                if 0 <= neighbour < len(sheets):
+                    self._queue(*sheets[neighbour][:2])
+        for following, _ in reversed(
+                self._next[identifier].most_common(2)):
+            self._queue(following, self._token(following))
+
+    def _token(self, identifier):
+        located = self._located.get(identifier)
+        if located is None:
+            return None
+        group_id, index = located
+        return self._groups[group_id][index][1]
+
+    def _queue(self, identifier, token):
+        """Make identifier the next to be read."""
+        if identifier in self._prefetched:
+            return
+        self._pending.pop(identifier, None)
+        self._pending[identifier] = token
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+        self._lock.notify_all()
+
+    def _run(self):
+        _local.prefetching = True
+        while True:
+            with self._lock:
+                while not self._closed:
+                    wait = self._last_call + self.idle_delay - time.time()
+                    if self._pending and wait <= 0:
+                        break
+                    self._lock.wait(wait if self._pending else None)
+                if self._closed:
+                    return
+                identifier, token = self._pending.popitem()
+            cached = self.cache.peek(identifier)
+            if (cached is not None and token is not None and
+                    cached.changeToken == token):
+                continue  # already warm
+            try:
+                with priority(BACKGROUND):
+                    sheet = self.client.read_sheet(identifier, text=True)
+            except Exception as e:
+                logger.warn("Could not prefetch '%s': %s" % (identifier, e))
+                continue
+            self.cache.put(sheet)
+            with self._lock:
+                self._prefetched.add(identifier)
+                self._counts['prefetched'] += 1
+
+
+_local = threading.local()
@@ -0,0 +1,152 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Progressive, breadth-first fetching of the library tree.
+
+get_root_items(recursive=True) returns the whole library in one reply which
+must be waited for, decoded and held in full. A ProgressiveFetch instead gets
+the root items non-recursively and then expands their groups level by level
+with get_item(id, recursive=False) from a bounded pool of workers, filling in
+its `roots` in place and yielding each Group as it is filled in:
+
+    fetch = ProgressiveFetch(max_depth=2, time_budget=1.0)
+    for group in fetch:
+        render(fetch.roots)  # useful long before the whole tree is known
+
+Groups beyond max_depth, or not reached within time_budget, are left as a
+non-recursive call leaves them: no sheets and containers None.
+"""
+
+import collections
+import logging
+import threading
+import time
+import Queue
+
+from . import calls
+from .parallel import call_worker
+from .scheduler import current_priority
+
+
+__all__ = ['ProgressiveFetch', 'fetch_tree']
+
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_tree(max_depth=None, time_budget=None, concurrency=4):
+    """Return list of root Groups, expanded as far as the budgets allow.
+
+    See ProgressiveFetch.
+    """
+    fetch = ProgressiveFetch(max_depth, time_budget, concurrency)
+    for _ in fetch:
+        pass
+    return fetch.roots
+
+
+class ProgressiveFetch(object):
+    """Breadth-first expansion of the library tree. Iterate to run.
+
+    Attributes:
+
+    max_depth -- deepest level of groups to expand; the root items are level
+                 0 and are always expanded. None for no limit
+    time_budget -- seconds after which no more groups are expanded, counted
+                   from the start of iteration. None for no limit
+    concurrency -- maximum number of get_item() calls in flight
+    roots -- list of root Groups, filled in as the fetch proceeds. None
+             before iteration starts
+    errors -- dict of group id -> exception for groups that failed to expand
+    complete -- True once every group within max_depth has been expanded
+    """
+
+    def __init__(self, max_depth=None, time_budget=None, concurrency=4):
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self.concurrency = concurrency
+        self.roots = None
+        self.errors = {}
+        self.complete = False
+        self._started = False
+
+    def __iter__(self):
+        if self._started:
+            raise RuntimeError('A ProgressiveFetch can only be run once')
+        self._started = True
+        deadline = (None if self.time_budget is None
+                    else time.time() + self.time_budget)
+        self.roots = calls.get_root_items(recursive=False)
+        pending = collections.deque()  # (group, depth) awaiting expansion
+        for root in self.roots:
+            if root.containers is None:
+                # a non-recursive get-root-items reply does not list the
+                # groups in each root, so the roots are expanded first
+                pending.append((root, 0))
+                continue
+            yield root
+            self._queue_children(pending, root, 0)
+        tasks = Queue.Queue()
+        results = Queue.Queue()
+        workers = [threading.Thread(target=call_worker, args=(
+            lambda id_: calls.get_item(id_, recursive=False),
+            tasks, results, current_priority()))
+            for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        in_flight = {}  # sequence -> (group, depth)
+        sequence = 0
+        try:
+            while pending or in_flight:
+                while (pending and len(in_flight) < self.concurrency and
+                       not _expired(deadline)):
+                    group, depth = pending.popleft()
+                    tasks.put((sequence, group.identifier))
+                    in_flight[sequence] = (group, depth)
+                    sequence += 1
+                if not in_flight:
+                    break  # out of time with groups still pending
+                try:
+                    timeout = (None if deadline is None
+                               else max(0, deadline - time.time()))
+                    done, result = results.get(timeout=timeout)
+                except Queue.Empty:
+                    break  # out of time; calls in flight are abandoned
+                group, depth = in_flight.pop(done)
+                if not isinstance(result.error, (Exception, type(None))):
+                    raise result.error  # e.g. KeyboardInterrupt
+                if result.error is not None:
+                    logger.warn("Could not expand group '%s': %s" % (
+                        group.identifier, result.error))
+                    self.errors[group.identifier] = result.error
+                    continue
+                group.sheets = result.value.sheets
+                group.containers = result.value.containers
+                self._queue_children(pending, group, depth)
+                yield group
+            else:
+                self.complete = not self.errors
+        finally:
+            for _ in workers:
+                tasks.put(None)
+
+    def _queue_children(self, pending, group, depth):
+        if self.max_depth is not None and depth >= self.max_depth:
+            return
+        for container in group.containers or []:
+            pending.append((container, depth + 1))
+
+
+def _expired(deadline):
+    return deadline is not None and time.time() >= deadline
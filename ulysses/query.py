@@ -0,0 +1,334 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Compound queries over library metadata, planned against indexes.
+
+A Query is built up from conditions on type, identifier, title pattern,
+creation and modification dates, group path and keywords. A QueryEngine
+indexes a library tree once, and plans each query by estimating how many
+items each index could narrow it to: the smallest becomes the access path
+and the remaining conditions filter what it yields. With no usable index
+the plan is a single scan of the tree, pruned to the group named by under()
+if given:
+
+    engine = QueryEngine(ulysses.get_root_items(), keyword_index)
+    query = (Query().of_type('sheet').titled('draft*')
+             .modified_between(after=start).under('/iCloud/Blog'))
+    plan = engine.plan(query)
+    print(plan.explain())
+    for sheet in plan:
+        ...
+
+Titles are matched case and accent insensitively (see search.fold) with
+shell-style wildcards. Dates are seconds since 2001-01-01, as Ulysses gives
+them, and ranges include their ends. Groups have no dates or keywords, so
+never match conditions on them. Results are lazy, and come in walk() order
+whatever the plan.
+"""
+
+import bisect
+import fnmatch
+import re
+
+from .search import fold
+
+
+__all__ = ['Query', 'QueryEngine', 'Plan']
+
+
+_WILDCARD = re.compile(r'[*?[]')
+
+
+class Query(object):
+    """An immutable conjunction of conditions. Each method returns a copy
+    with a condition added; Query() alone matches every item.
+    """
+
+    _FIELDS = ('type_', 'identifier', 'title', 'created', 'modified', 'path',
+               'all_of', 'any_of', 'none_of')
+
+    def __init__(self, **conditions):
+        for field in self._FIELDS:
+            setattr(self, field, conditions.get(field))
+
+    def _with(self, **changes):
+        conditions = dict((field, getattr(self, field))
+                          for field in self._FIELDS)
+        conditions.update(changes)
+        return Query(**conditions)
+
+    def of_type(self, type_):
+        """Match only 'sheet's or only 'group's."""
+        if type_ not in ('sheet', 'group'):
+            raise ValueError("type_ was not 'sheet' or 'group' but '%s'"
+                             % type_)
+        return self._with(type_=type_)
+
+    def with_id(self, identifier):
+        """Match only the item with an identifier."""
+        return self._with(identifier=identifier)
+
+    def titled(self, pattern):
+        """Match titles against a pattern with *, ? and [seq] wildcards."""
+        return self._with(title=fold(pattern))
+
+    def created_between(self, after=None, before=None):
+        """Match sheets created in a range. None leaves a side open."""
+        return self._with(created=(after, before))
+
+    def modified_between(self, after=None, before=None):
+        """Match sheets modified in a range. None leaves a side open."""
+        return self._with(modified=(after, before))
+
+    def under(self, path):
+        """Match items below the group at path, e.g. '/iCloud/Inbox'."""
+        return self._with(path=path.rstrip('/'))
+
+    def with_keywords(self, all_of=(), any_of=(), none_of=()):
+        """Match sheets by keywords. See KeywordIndex.query()."""
+        return self._with(all_of=tuple(all_of), any_of=tuple(any_of),
+                          none_of=tuple(none_of))
+
+    @property
+    def has_keywords(self):
+        return bool(self.all_of or self.any_of or self.none_of)
+
+    def __repr__(self):
+        return 'Query(%s)' % ', '.join(
+            '%s=%r' % (field, getattr(self, field))
+            for field in self._FIELDS if getattr(self, field))
+
+
+class QueryEngine(object):
+    """Indexes of a library tree, by which Queries are planned and run.
+
+    Attributes:
+
+    keyword_index -- KeywordIndex answering keyword conditions, or None
+    """
+
+    def __init__(self, groups, keyword_index=None):
+        self.keyword_index = keyword_index
+        if not isinstance(groups, (list, tuple)):
+            groups = [groups]
+        self._items = []  # every item in walk() order
+        self._ends = {}  # group position -> position after its last item
+        self._paths = {}  # group path -> position
+        self._positions = {}  # id -> position
+        titles = []
+        created = []
+        modified = []
+        for group in groups:
+            stack = [(group, '/' + group.title)]
+            while stack:
+                item, path = stack.pop()
+                if path is None:  # all below the group at item are added
+                    self._ends[item] = len(self._items)
+                    continue
+                position = len(self._items)
+                self._items.append(item)
+                self._positions.setdefault(item.identifier, position)
+                titles.append((fold(item.title), position))
+                if item.type == 'sheet':
+                    if item.creationDate is not None:
+                        created.append((item.creationDate, position))
+                    if item.modificationDate is not None:
+                        modified.append((item.modificationDate, position))
+                    continue
+                self._paths.setdefault(path, position)
+                stack.append((position, None))
+                children = item.sheets + (item.containers or [])
+                stack.extend((child, path + '/' + child.title)
+                             for child in reversed(children))
+        self._titles = _SortedIndex(titles)
+        self._created = _SortedIndex(created)
+        self._modified = _SortedIndex(modified)
+
+    def __len__(self):
+        return len(self._items)
+
+    def plan(self, query):
+        """Return the Plan for a Query."""
+        if query.has_keywords and self.keyword_index is None:
+            raise ValueError('Keyword conditions need a keyword_index')
+        keyword_ids = None
+        if query.has_keywords:
+            keyword_ids = self.keyword_index.query(
+                query.all_of, query.any_of, query.none_of)
+
+        scope = (0, len(self._items))
+        if query.path is not None:
+            position = self._paths.get(query.path)
+            if position is None:
+                scope = (0, 0)
+            else:
+                scope = (position + 1, self._ends[position])
+
+        # (estimated rows, description, callable returning sorted positions)
+        paths = [(scope[1] - scope[0],
+                  'scan %s' % ('under %r' % query.path if query.path
+                               else 'of the whole tree'),
+                  lambda: xrange(*scope))]
+        if query.identifier is not None:
+            position = self._positions.get(query.identifier)
+            found = [] if position is None else [position]
+            paths.append((len(found), 'identifier lookup %r'
+                          % query.identifier, lambda: found))
+        if query.title is not None:
+            prefix = _WILDCARD.split(query.title, 1)[0]
+            if prefix:
+                exact = prefix == query.title
+                lo, hi = self._titles.prefix_range(prefix, exact)
+                paths.append((hi - lo, 'title index %s %r' % (
+                    'lookup' if exact else 'prefix range', prefix),
+                    lambda lo=lo, hi=hi: sorted(
+                        self._titles.positions[lo:hi])))
+        for name, index, bounds in (('created', self._created, query.created),
+                                    ('modified', self._modified,
+                                     query.modified)):
+            if bounds is not None and bounds != (None, None):
+                lo, hi = index.range(*bounds)
+                paths.append((hi - lo, '%s date range %s' % (
+                    name, _describe_range(bounds)),
+                    lambda index=index, lo=lo, hi=hi: sorted(
+                        index.positions[lo:hi])))
+        if keyword_ids is not None:
+            tagged = [self._positions[i] for i in keyword_ids
+                      if i in self._positions]
+            paths.append((len(tagged), 'keyword index %s'
+                          % _describe_keywords(query),
+                          lambda: sorted(tagged)))
+
+        estimate, access, candidates = min(paths, key=lambda path: path[0])
+        scanned = access == paths[0][1]
+        return Plan(self, query, access, estimate, candidates,
+                    None if scanned else scope, keyword_ids)
+
+    def run(self, query):
+        """Return an iterator over the items matching a Query."""
+        return iter(self.plan(query))
+
+
+class Plan(object):
+    """How a Query will be answered. Iterate to run it.
+
+    Attributes:
+
+    query -- the Query
+    access -- description of the index or scan yielding candidates
+    estimate -- number of candidates the access path yields
+    filters -- descriptions of the conditions applied to each candidate
+    """
+
+    def __init__(self, engine, query, access, estimate, positions, scope,
+                 keyword_ids):
+        # scope is the (start, stop) of positions under query.path, None if
+        # positions already keep within it
+        self.query = query
+        self.access = access
+        self.estimate = estimate
+        self._engine = engine
+        self._positions = positions
+        self._predicates = []
+        self.filters = []
+        if scope is not None and scope != (0, len(engine)):
+            lo, hi = scope
+            self._add(lambda position, item: lo <= position < hi,
+                      'under %r' % query.path)
+        if query.identifier is not None:
+            self._add(lambda position, item:
+                      item.identifier == query.identifier,
+                      'identifier = %r' % query.identifier)
+        if query.type_ is not None:
+            self._add(lambda position, item: item.type == query.type_,
+                      'type = %r' % query.type_)
+        if query.title is not None:
+            self._add(lambda position, item: fnmatch.fnmatchcase(
+                fold(item.title), query.title),
+                'title matches %r' % query.title)
+        for name, bounds in (('creationDate', query.created),
+                             ('modificationDate', query.modified)):
+            if bounds is not None and bounds != (None, None):
+                self._add(_date_predicate(name, bounds),
+                          '%s %s' % (name, _describe_range(bounds)))
+        if keyword_ids is not None:
+            self._add(lambda position, item: item.identifier in keyword_ids,
+                      'keywords %s' % _describe_keywords(query))
+
+    def _add(self, predicate, description):
+        self._predicates.append(predicate)
+        self.filters.append(description)
+
+    def explain(self):
+        """Return a description of the plan, one step per line."""
+        lines = ['%s (~%d candidates)' % (self.access, self.estimate)]
+        lines.extend('filter: ' + description
+                     for description in self.filters)
+        return '\n'.join(lines)
+
+    def __iter__(self):
+        items = self._engine._items
+        predicates = self._predicates
+        for position in self._positions():
+            item = items[position]
+            if all(predicate(position, item) for predicate in predicates):
+                yield item
+
+
+class _SortedIndex(object):
+    """Parallel sorted lists of keys and the positions of items having them.
+    """
+
+    def __init__(self, pairs):
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.positions = [position for _, position in pairs]
+
+    def range(self, lo=None, hi=None):
+        """Return (start, stop) of the keys from lo to hi inclusive."""
+        start = 0 if lo is None else bisect.bisect_left(self.keys, lo)
+        stop = (len(self.keys) if hi is None
+                else bisect.bisect_right(self.keys, hi))
+        return start, max(start, stop)
+
+    def prefix_range(self, prefix, exact=False):
+        """Return (start, stop) of the keys equal to, or starting with,
+        prefix."""
+        start = bisect.bisect_left(self.keys, prefix)
+        if exact:
+            return start, bisect.bisect_right(self.keys, prefix)
+        return start, bisect.bisect_left(self.keys, prefix + u'\U0010ffff')
+
+
+def _date_predicate(name, bounds):
+    after, before = bounds
+
+    def predicate(position, item):
+        date = getattr(item, name, None)
+        return (date is not None and (after is None or date >= after) and
+                (before is None or date <= before))
+    return predicate
+
+
+def _describe_range(bounds):
+    after, before = bounds
+    if before is None:
+        return '>= %r' % after
+    if after is None:
+        return '<= %r' % before
+    return 'in [%r, %r]' % (after, before)
+
+
+def _describe_keywords(query):
+    parts = []
+    for name in ('all_of', 'any_of', 'none_of'):
+        if getattr(query, name):
+            parts.append('%s %s' % (name, ', '.join(getattr(query, name))))
+    return '; '.join(parts)
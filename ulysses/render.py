@@ -0,0 +1,98 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Streaming renderers for Group trees.
+
+Lines are yielded one at a time while walking the tree with an explicit
+stack, so output can be printed as soon as it is produced, and neither very
+large nor very deeply nested trees run into memory or recursion limits.
+
+Formats:
+
+- 'text' -- 'identifier - <indent>title' lines, with ':' after group titles
+- 'json' -- one JSON object per line (JSON lines)
+- 'alfred' -- Alfred script filter item dictionaries. Use write_tree() to
+              write them as a complete script filter document
+"""
+
+import json
+
+
+__all__ = ['render_tree', 'write_tree', 'FORMATS']
+
+
+def _text(item, depth):
+    line = item.identifier + ' - ' + '   ' * depth + item.title
+    if item.type != 'sheet':
+        line += ':'
+    return line
+
+
+def _json(item, depth):
+    return json.dumps({'identifier': item.identifier, 'title': item.title,
+                       'type': item.type, 'depth': depth})
+
+
+def _alfred(item, depth):
+    return {'uid': item.identifier, 'title': item.title,
+            'arg': item.identifier, 'subtitle': item.type}
+
+
+FORMATS = {'text': _text, 'json': _json, 'alfred': _alfred}
+
+
+def render_tree(group, format='text', max_depth=None,  # @ReservedAssignment
+                predicate=None, indent=0):
+    """Yield a rendered line (or Alfred item) for each item in a group tree.
+
+    A group's line is followed by its sheets and then its sub-groups.
+
+    group -- Group at the root of the tree
+    format -- 'text', 'json' or 'alfred'
+    max_depth -- don't render items deeper than this below group if given.
+                 0 renders group alone
+    predicate -- callable taking a Sheet or Group. Items for which it returns
+                 False are skipped; for a Group its whole subtree is pruned
+    indent -- depth at which to start rendering group
+    """
+    formatter = FORMATS[format]
+    if predicate is not None and not predicate(group):
+        return
+    stack = [(group, 0)]
+    while stack:
+        group, depth = stack.pop()
+        yield formatter(group, depth + indent)
+        if max_depth is not None and depth >= max_depth:
+            continue
+        for sheet in group.sheets:
+            if predicate is None or predicate(sheet):
+                yield formatter(sheet, depth + 1 + indent)
+        # containers will be None after a non-recursive query
+        for sub_group in reversed(group.containers or []):
+            if predicate is None or predicate(sub_group):
+                stack.append((sub_group, depth + 1))
+
+
+def write_tree(group, stream, format='text', **kwargs):  # @ReservedAssignment
+    """Write a rendered group tree to a file-like stream as it is produced.
+
+    'text' and 'json' are written a line at a time; 'alfred' is written as a
+    script filter document: {"items": [...]}. Accepts the keyword arguments
+    of render_tree().
+    """
+    lines = render_tree(group, format, **kwargs)
+    if format != 'alfred':
+        for line in lines:
+            stream.write(line + '\n')
+        return
+    stream.write('{"items": [')
+    for n, item in enumerate(lines):
+        stream.write((',\n' if n else '\n') + json.dumps(item))
+    stream.write('\n]}\n')
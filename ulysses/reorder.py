@@ -0,0 +1,117 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Reordering of group contents with as few move calls as possible.
+
+Putting a group's sheets in a new order by moving each one to its new index
+moves nearly every sheet even when only a few are out of place. reorder()
+keeps the longest run of items already in the right relative order (the
+longest increasing subsequence of their target positions) where it is, and
+moves only the others, each to just after the item that should precede it:
+
+    reorder(group_id, [id3, id1, id2], dry_run=True)  # -> [Move(id3, 0)]
+
+Sheets and sub-groups are ordered separately, as Ulysses indexes them
+separately; desired_order may give either or both.
+"""
+
+import bisect
+import collections
+
+from . import calls
+
+
+__all__ = ['reorder', 'plan_moves', 'longest_increasing_subsequence', 'Move']
+
+
+class Move(collections.namedtuple('Move', ['id', 'index'])):
+    """A move(id, index=index) call: index is the item's position after it."""
+    __slots__ = ()
+
+
+def reorder(group_id, desired_order, dry_run=False, silent_mode=False):
+    """Order a group's sheets and/or sub-groups, returning the Moves made.
+
+    group_id -- id of the group to reorder
+    desired_order -- ids of all the group's sheets, of all its sub-groups,
+                     or of both, in the order wanted
+    dry_run -- return the Moves without making them if True
+    silent_mode -- don't show changes in Ulysses if True
+    """
+    group = calls.get_item(group_id)
+    sheet_ids = [sheet.identifier for sheet in group.sheets]
+    group_ids = [g.identifier for g in group.containers or []]
+    known = set(sheet_ids) | set(group_ids)
+    unknown = [i for i in desired_order if i not in known]
+    if unknown:
+        raise ValueError("Not in group '%s': %s" % (group_id,
+                                                    ', '.join(unknown)))
+    moves = []
+    for current in (sheet_ids, group_ids):
+        members = set(current)
+        desired = [i for i in desired_order if i in members]
+        if desired:
+            moves.extend(plan_moves(current, desired))
+    if not dry_run:
+        for move in moves:
+            calls.move(move.id, index=move.index, silent_mode=silent_mode)
+    return moves
+
+
+def plan_moves(current, desired):
+    """Return list of Moves turning list current into list desired.
+
+    The Moves are to be made in order; each index allows for the moves before
+    it. Raises ValueError unless desired is a reordering of current.
+    """
+    if len(set(desired)) != len(desired) or set(desired) != set(current):
+        raise ValueError('desired order is not a reordering of the current')
+    target = dict((identifier, i) for i, identifier in enumerate(desired))
+    positions = [target[identifier] for identifier in current]
+    keep = set(current[i] for i in longest_increasing_subsequence(positions))
+
+    order = list(current)
+    moves = []
+    # Place each moved item after its predecessor in desired order, which is
+    # by then either kept or already placed
+    for i, identifier in enumerate(desired):
+        if identifier in keep:
+            continue
+        order.remove(identifier)
+        index = 0 if i == 0 else order.index(desired[i - 1]) + 1
+        order.insert(index, identifier)
+        moves.append(Move(identifier, index))
+    assert order == list(desired)
+    return moves
+
+
+def longest_increasing_subsequence(values):
+    """Return indexes into values of a longest strictly increasing run.
+
+    O(n log n) patience sorting.
+    """
+    tails = []  # tails[k]: least value ending an increasing run of length k+1
+    tail_indexes = []
+    previous = [None] * len(values)
+    for i, value in enumerate(values):
+        k = bisect.bisect_left(tails, value)
+        if k == len(tails):
+            tails.append(value)
+            tail_indexes.append(i)
+        else:
+            tails[k] = value
+            tail_indexes[k] = i
+        previous[i] = tail_indexes[k - 1] if k else None
+    result = []
+    i = tail_indexes[-1] if tail_indexes else None
+    while i is not None:
+        result.append(i)
+        i = previous[i]
+    return result[::-1]
@@ -0,0 +1,102 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Decoding of x-success replies from Ulysses.
+
+A reply arrives url quoted. Some actions also return an item, or list of
+items, as a JSON string nested inside the reply's JSON, and some of those
+nested strings are url quoted a second time. decode_reply() knows the shape
+of each action's reply and decodes it in one pipeline:
+
+- the raw reply is unquoted once and parsed as JSON directly from the
+  utf-8 bytes, without first decoding the whole reply to unicode
+- the nested JSON field, if the action has one, is unquoted only if quoted
+  and then parsed in place, so callers get Python objects back
+- unquoting is done by unquote(), which hands the work to a C codec rather
+  than looping over every escape in Python as urllib.unquote() does. JSON
+  replies are almost entirely escapes, so this is the bulk of the saving
+
+The fastest available JSON library is used: ujson, then simplejson, then
+the standard library's json. JSON_BACKEND names the one chosen.
+"""
+
+import json
+import urllib
+
+
+__all__ = ['decode_reply', 'json_loads', 'unquote', 'JSON_BACKEND',
+           'REPLY_SHAPES']
+
+
+# action -> (name of field holding nested JSON, True if it is quoted again)
+REPLY_SHAPES = {
+    'get-root-items': ('items', False),
+    'get-item': ('item', True),
+    'read-sheet': ('sheet', True),
+}
+
+
+def _select_json_backend():
+    try:
+        import ujson
+        # Older ujson releases round floats such as modificationDate unless
+        # asked not to
+        sample = '513446268.980628'
+        if ujson.loads(sample) == json.loads(sample):
+            return 'ujson', ujson.loads
+        try:
+            if ujson.loads(sample, precise_float=True) == json.loads(sample):
+                return 'ujson', lambda s: ujson.loads(s, precise_float=True)
+        except TypeError:
+            pass
+    except ImportError:
+        pass
+    try:
+        import simplejson
+        return 'simplejson', simplejson.loads
+    except ImportError:
+        pass
+    return 'json', json.loads
+
+
+JSON_BACKEND, json_loads = _select_json_backend()
+
+
+def unquote(s):
+    """Return url unquoted byte string s. Equivalent to urllib.unquote()."""
+    if '%' not in s:
+        return s
+    try:
+        # %XX -> \xXX, existing backslashes escaped, then decoded in C
+        return s.replace('\\', '\\\\').replace('%', '\\x').decode(
+            'string_escape')
+    except ValueError:
+        # a '%' not followed by two hex digits, which urllib leaves alone
+        return urllib.unquote(s)
+
+
+def decode_reply(action, stdout):
+    """Return an x-success reply decoded into Python objects.
+
+    action -- the Ulysses action the reply is for
+    stdout -- the raw, url quoted, utf-8 encoded reply from xcall
+    """
+    reply = json_loads(unquote(stdout))
+    shape = REPLY_SHAPES.get(action)
+    if shape is not None:
+        field, quoted = shape
+        nested = reply.get(field)
+        if isinstance(nested, basestring):
+            if quoted:
+                # Unquoted as utf-8 bytes so that quoted non-ascii text
+                # decodes correctly
+                nested = unquote(nested.encode('utf8'))
+            reply[field] = json_loads(nested)
+    return reply
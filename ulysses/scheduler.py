@@ -0,0 +1,239 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Priority-aware scheduling of calls to Ulysses.
+
+Ulysses handles one x-callback-url at a time, so a bulk background job can
+keep an interactive lookup waiting. A CallScheduler installed in front of
+call_ulysses() queues waiting calls by priority class:
+
+- INTERACTIVE -- user-facing calls; by default open*, get-item, get-version
+                 and authorize
+- NORMAL -- everything else
+- BACKGROUND -- calls made inside a `with priority(BACKGROUND):` block
+
+The highest class waiting goes next, except that a call which has waited
+longer than its class's max_wait is let through first (starvation
+protection). Each class may also be limited in how many of its calls run at
+once. Usage:
+
+    scheduler = install_scheduler()
+
+    with priority(BACKGROUND):
+        for result in read_sheets(ids):  # queues behind interactive calls
+            ...
+
+    scheduler.metrics()['background']['queued']
+"""
+
+import collections
+import contextlib
+import itertools
+import threading
+import time
+
+from . import xcallback
+
+
+__all__ = ['CallScheduler', 'install_scheduler', 'uninstall_scheduler',
+           'priority', 'current_priority', 'INTERACTIVE', 'NORMAL',
+           'BACKGROUND', 'PRIORITY_NAMES', 'ACTION_PRIORITIES']
+
+
+INTERACTIVE, NORMAL, BACKGROUND = 0, 1, 2
+
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', NORMAL: 'normal',
+                  BACKGROUND: 'background'}
+
+# action -> priority used when the calling thread has set none
+ACTION_PRIORITIES = {
+    'authorize': INTERACTIVE,
+    'get-version': INTERACTIVE,
+    'get-item': INTERACTIVE,
+    'open': INTERACTIVE,
+    'open-all': INTERACTIVE,
+    'open-recent': INTERACTIVE,
+    'open-favorites': INTERACTIVE,
+}
+
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def priority(priority_class):
+    """Make calls from this thread within the block use priority_class."""
+    previous = getattr(_local, 'priority', None)
+    _local.priority = priority_class
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def current_priority():
+    """Return priority class set for this thread by priority(), or None."""
+    return getattr(_local, 'priority', None)
+
+
+def install_scheduler(scheduler=None):
+    """Route all calls through scheduler (a new one if None) and return it."""
+    if scheduler is None:
+        scheduler = CallScheduler()
+    xcallback.set_call_gate(scheduler)
+    return scheduler
+
+
+def uninstall_scheduler():
+    """Stop routing calls through any scheduler."""
+    xcallback.set_call_gate(None)
+
+
+class _Waiter(object):
+
+    __slots__ = ('priority', 'sequence', 'enqueued')
+
+    def __init__(self, priority_class, sequence):
+        self.priority = priority_class
+        self.sequence = sequence
+        self.enqueued = time.time()
+
+
+class CallScheduler(object):
+    """Orders calls to Ulysses by priority class.
+
+    Attributes:
+
+    max_in_flight -- calls let through at once across all classes. Ulysses
+                     runs one at a time; more lets the next call prepare
+                     while one is in Ulysses
+    class_limits -- dict of priority class -> calls of that class let
+                    through at once
+    max_wait -- dict of priority class -> seconds after which a waiting
+                call of that class goes ahead of higher classes
+    action_priorities -- dict of action -> default priority class
+    """
+
+    def __init__(self, max_in_flight=1, class_limits=None, max_wait=None,
+                 action_priorities=None):
+        self.max_in_flight = max_in_flight
+        self.class_limits = dict(class_limits or {})
+        self.max_wait = {NORMAL: 2.0, BACKGROUND: 10.0}
+        self.max_wait.update(max_wait or {})
+        if action_priorities is None:
+            action_priorities = ACTION_PRIORITIES
+        self.action_priorities = action_priorities
+        self._cond = threading.Condition()
+        self._queues = dict((p, collections.deque()) for p in PRIORITY_NAMES)
+        self._running = dict((p, 0) for p in PRIORITY_NAMES)
+        self._sequence = itertools.count()
+        self._stats = dict((p, {'completed': 0, 'total_wait': 0.0,
+                                'max_wait': 0.0}) for p in PRIORITY_NAMES)
+
+    def priority_for(self, action):
+        """Return the priority class a call of action made now would get."""
+        priority_class = current_priority()
+        if priority_class is None:
+            priority_class = self.action_priorities.get(action, NORMAL)
+        return priority_class
+
+    @contextlib.contextmanager
+    def slot(self, action):
+        """Context manager holding a place for a call; see set_call_gate()."""
+        priority_class = self.priority_for(action)
+        self.acquire(priority_class)
+        try:
+            yield
+        finally:
+            self.release(priority_class)
+
+    def acquire(self, priority_class):
+        """Block until a call of priority_class may go ahead."""
+        with self._cond:
+            waiter = _Waiter(priority_class, next(self._sequence))
+            self._queues[priority_class].append(waiter)
+            try:
+                while self._next_waiter() is not waiter:
+                    self._cond.wait(self._time_to_next_promotion())
+            except BaseException:
+                self._queues[priority_class].remove(waiter)
+                self._cond.notify_all()
+                raise
+            self._queues[priority_class].popleft()
+            self._running[priority_class] += 1
+            waited = time.time() - waiter.enqueued
+            stats = self._stats[priority_class]
+            stats['total_wait'] += waited
+            stats['max_wait'] = max(stats['max_wait'], waited)
+            # another waiter may be eligible too if there is capacity
+            self._cond.notify_all()
+
+    def release(self, priority_class):
+        """Record a call of priority_class as finished."""
+        with self._cond:
+            self._running[priority_class] -= 1
+            self._stats[priority_class]['completed'] += 1
+            self._cond.notify_all()
+
+    def metrics(self):
+        """Return dict of class name -> queue depth and wait time figures.
+
+        Each value is a dict with 'queued', 'running', 'completed',
+        'mean_wait', 'max_wait' and 'oldest_wait' (seconds the longest
+        waiting call has waited so far).
+        """
+        now = time.time()
+        with self._cond:
+            metrics = {}
+            for priority_class, name in PRIORITY_NAMES.iteritems():
+                queue = self._queues[priority_class]
+                stats = self._stats[priority_class]
+                started = stats['completed'] + self._running[priority_class]
+                metrics[name] = {
+                    'queued': len(queue),
+                    'running': self._running[priority_class],
+                    'completed': stats['completed'],
+                    'mean_wait': (stats['total_wait'] / started
+                                  if started else 0.0),
+                    'max_wait': stats['max_wait'],
+                    'oldest_wait': now - queue[0].enqueued if queue else 0.0,
+                }
+            return metrics
+
+    # Internals (called holding self._cond)
+
+    def _next_waiter(self):
+        """Return the waiter to let through next, or None if none may go."""
+        if sum(self._running.itervalues()) >= self.max_in_flight:
+            return None
+        now = time.time()
+        candidates = []
+        for priority_class, queue in self._queues.iteritems():
+            limit = self.class_limits.get(priority_class)
+            if queue and (limit is None or
+                          self._running[priority_class] < limit):
+                candidates.append(queue[0])
+        if not candidates:
+            return None
+        starved = [w for w in candidates
+                   if now - w.enqueued >= self.max_wait.get(w.priority,
+                                                            float('inf'))]
+        if starved:
+            return min(starved, key=lambda w: w.sequence)
+        return min(candidates, key=lambda w: (w.priority, w.sequence))
+
+    def _time_to_next_promotion(self):
+        # Waiters already past their deadline are woken by release()
+        now = time.time()
+        deadlines = [queue[0].enqueued + self.max_wait[p] - now
+                     for p, queue in self._queues.iteritems()
+                     if queue and p in self.max_wait]
+        deadlines = [d for d in deadlines if d > 0]
+        return min(deadlines) if deadlines else None
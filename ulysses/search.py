@@ -0,0 +1,455 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Fuzzy title search over a library tree.
+
+filter_items() only matches whole titles exactly. A TitleIndex is built once
+from a Group tree and then answers as-you-type queries over folded titles
+(unicode case and accent folded, so 'cafe' finds 'Café'):
+
+    index = TitleIndex(ulysses.get_root_items())
+    for item in index.search('proj not'):
+        ...
+
+Results are ranked first by kind of match: exact, title prefix, word prefix,
+each query word starting a word in turn ('proj no' finds 'Project notes'),
+substring, then shared trigrams (so typos still match). Items matched equally
+well are ranked by recency (modificationDate) less a penalty for depth in the
+tree. add(), remove() and update() keep the index current as items change
+without rebuilding it.
+
+Titles are kept in sorted lists of folded titles and of folded word starts,
+so prefix matches are counted by bisection. A prefix shared by many titles is
+answered by walking ids in rank order until enough match, a rarer one by
+ranking just its matches, so typing a first letter costs no more than a
+rare word. The trigram index is only consulted when prefix matches do not
+fill the result list.
+"""
+
+import bisect
+import heapq
+import itertools
+import unicodedata
+
+
+__all__ = ['TitleIndex', 'fold']
+
+
+# Multi-letter case folds missing from unicode.lower()
+_FOLDS = {u'ß': u'ss', u'ẞ': u'ss', u'æ': u'ae', u'œ': u'oe', u'ø': u'o'}
+
+# Match qualities, best first; a trigram match scores up to FUZZY
+EXACT, PREFIX, WORD_PREFIX, WORDS = 1.0, 0.9, 0.8, 0.75
+SUBSTRING, FUZZY = 0.7, 0.6
+
+
+def fold(text):
+    """Return text lower cased with accents removed, for matching."""
+    if not isinstance(text, unicode):
+        text = text.decode('utf-8')
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    folded = u''.join(c for c in decomposed if not unicodedata.combining(c))
+    for char, replacement in _FOLDS.iteritems():
+        if char in folded:
+            folded = folded.replace(char, replacement)
+    return folded
+
+
+def _trigrams(padded):
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _kind(item):
+    """Return 'sheet' for a Sheet and 'group' for any container."""
+    return 'sheet' if item.type == 'sheet' else 'group'
+
+
+def _word_starts(folded):
+    return [i for i in range(1, len(folded))
+            if folded[i - 1] == u' ' and folded[i] != u' ']
+
+
+class _Entry(object):
+
+    __slots__ = ('item', 'folded', 'depth', 'trigrams')
+
+    def __init__(self, item, folded, depth, trigrams):
+        self.item = item
+        self.folded = folded
+        self.depth = depth
+        self.trigrams = trigrams
+
+
+class _SortedKeys(object):
+    """Parallel sorted lists of keys and the ids they belong to."""
+
+    def __init__(self):
+        self.keys = []
+        self.ids = []
+        self._pending = []
+
+    def add(self, key, identifier):
+        self._pending.append((key, identifier))
+
+    def remove(self, key, identifier):
+        self.settle()
+        i = bisect.bisect_left(self.keys, key)
+        while self.ids[i] != identifier:
+            i += 1
+        del self.keys[i]
+        del self.ids[i]
+
+    def settle(self):
+        """Merge pending additions: one at a time, or by re-sorting if many."""
+        if not self._pending:
+            return
+        if len(self._pending) < 64:
+            for key, identifier in self._pending:
+                i = bisect.bisect_right(self.keys, key)
+                self.keys.insert(i, key)
+                self.ids.insert(i, identifier)
+        else:
+            pairs = sorted(zip(self.keys, self.ids) + self._pending)
+            self.keys = [key for key, _ in pairs]
+            self.ids = [identifier for _, identifier in pairs]
+        self._pending = []
+
+    def prefix_range(self, prefix):
+        """Return (lo, mid, hi): keys[lo:mid] equal prefix and keys[mid:hi]
+        extend it."""
+        self.settle()
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + u'\U0010ffff', lo)
+        mid = bisect.bisect_right(self.keys, prefix, lo, hi)
+        return lo, mid, hi
+
+
+class _Chain(object):
+    """Concatenation of sequences, without the copy."""
+
+    __slots__ = ('parts',)
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def __len__(self):
+        return sum(len(part) for part in self.parts)
+
+    def __iter__(self):
+        return itertools.chain(*self.parts)
+
+
+class _Slice(object):
+    """Slice of a list, without the copy."""
+
+    __slots__ = ('items', 'start', 'stop')
+
+    def __init__(self, items, start, stop):
+        self.items = items
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        # not islice(), which steps through every item before start
+        return itertools.imap(self.items.__getitem__,
+                              xrange(self.start, self.stop))
+
+
+class TitleIndex(object):
+    """Title index of Sheets and Groups.
+
+    Attributes:
+
+    depth_penalty -- seconds of recency one level of depth in the tree is
+                     worth when ranking items matched equally well
+    """
+
+    def __init__(self, groups=(), depth_penalty=7 * 24 * 3600):
+        self.depth_penalty = depth_penalty
+        self._entries = {}  # id -> _Entry
+        self._folded = {}  # id -> folded title
+        self._rank = {}  # id -> modificationDate less depth penalty
+        self._types = {'sheet': set(), 'group': set()}  # containers
+        self._titles = _SortedKeys()  # folded titles
+        self._words = _SortedKeys()  # folded titles from each word start on
+        self._by_rank = _SortedKeys()  # -rank
+        self._postings = {}  # trigram -> set of ids
+        if not isinstance(groups, (list, tuple)):
+            groups = [groups]
+        for group in groups:
+            self.add_tree(group)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, identifier):
+        return identifier in self._entries
+
+    def add_tree(self, group, depth=0):
+        """Index a group and everything below it."""
+        stack = [(group, depth)]
+        while stack:
+            group, depth = stack.pop()
+            self.add(group, depth)
+            for sheet in group.sheets:
+                self.add(sheet, depth + 1)
+            for sub_group in group.containers or []:
+                stack.append((sub_group, depth + 1))
+        self._settle()
+
+    def add(self, item, depth=0):
+        """Index a Sheet or Group (replacing any entry with its id)."""
+        identifier = item.identifier
+        self.remove(identifier)
+        folded = fold(item.title)
+        trigrams = _trigrams(u' ' + folded + u' ')
+        self._entries[identifier] = _Entry(item, folded, depth, trigrams)
+        self._folded[identifier] = folded
+        date = getattr(item, 'modificationDate', None) or 0
+        self._rank[identifier] = date - depth * self.depth_penalty
+        self._by_rank.add(-self._rank[identifier], identifier)
+        self._types[_kind(item)].add(identifier)
+        self._titles.add(folded, identifier)
+        for i in _word_starts(folded):
+            self._words.add(folded[i:], identifier)
+        for trigram in trigrams:
+            self._postings.setdefault(trigram, set()).add(identifier)
+
+    def update(self, item, depth=None):
+        """Re-index an item, e.g. after a retitle; depth None keeps it."""
+        if depth is None:
+            entry = self._entries.get(item.identifier)
+            depth = entry.depth if entry is not None else 0
+        self.add(item, depth)
+
+    def remove(self, identifier):
+        """Remove an item from the index if present."""
+        entry = self._entries.pop(identifier, None)
+        if entry is None:
+            return
+        del self._folded[identifier]
+        self._by_rank.remove(-self._rank.pop(identifier), identifier)
+        self._types[_kind(entry.item)].discard(identifier)
+        self._titles.remove(entry.folded, identifier)
+        for i in _word_starts(entry.folded):
+            self._words.remove(entry.folded[i:], identifier)
+        for trigram in entry.trigrams:
+            ids = self._postings[trigram]
+            ids.discard(identifier)
+            if not ids:
+                del self._postings[trigram]
+
+    def search(self, query, limit=20, type_='sheet_or_group',
+               min_similarity=0.5, with_scores=False):
+        """Return up to limit best matching items, best first.
+
+        query -- text typed so far
+        type_ -- type to match 'sheet', 'group' (any container: groups,
+                 filters and the trash) or 'sheet_or_group'
+        min_similarity -- fraction of the query's trigrams a title must share
+                          to match when it does not contain the query
+        with_scores -- return ((quality, rank), item) tuples if True, where
+                       quality is 1.0 for an exact match down to 0.6 or less
+                       for a trigram match
+        """
+        folded = fold(query).strip()
+        if not folded or limit < 1:
+            return []
+        self._settle()
+        allowed = None if type_ == 'sheet_or_group' else self._types.get(
+            type_, set())
+        results = []  # (quality, rank, id)
+        seen = set()
+        folded_titles = self._folded
+
+        def walk(matches, budget=None):
+            """Return the best ids not yet taken for which matches(id), by
+            walking ids in rank order.
+
+            budget -- number of ids per result wanted to walk before giving
+                      up and returning None
+            """
+            wanted = limit - len(results)
+            give_up = None if budget is None else budget * wanted
+            best = []
+            for walked, i in enumerate(self._by_rank.ids):
+                if walked == give_up:
+                    return None
+                if (matches(i) and i not in seen and
+                        (allowed is None or i in allowed)):
+                    best.append(i)
+                    if len(best) == wanted:
+                        break
+            return best
+
+        def take(quality, ids, matches=None, verify=False):
+            """Add the best of ids to results; return True once full.
+
+            ids -- iterable with len() of ids matched
+            matches -- predicate on a folded title equivalent to membership
+                       of ids, letting a large ids go unmaterialised
+            verify -- ids are candidates only, to be filtered by matches
+            """
+            wanted = limit - len(results)
+            if matches is not None and len(ids) * 32 > len(self._rank):
+                # Many matches: the best are found soonest by walking all ids
+                # in rank order
+                best = walk(lambda i: matches(folded_titles[i]))
+                ids = None
+            else:
+                ids = set(ids) - seen
+                if allowed is not None:
+                    ids &= allowed
+                if verify:
+                    # Check candidates best first, only until enough match
+                    best = []
+                    for i in sorted(ids, key=self._rank.__getitem__,
+                                    reverse=True):
+                        if matches(folded_titles[i]):
+                            best.append(i)
+                            if len(best) == wanted:
+                                break
+                    ids = best
+                else:
+                    best = heapq.nlargest(wanted, ids,
+                                          key=self._rank.__getitem__)
+            results.extend((quality, self._rank[i], i) for i in best)
+            if len(results) >= limit:
+                return True
+            seen.update(ids if ids is not None else best)
+            return False
+
+        lo, mid, hi = self._titles.prefix_range(folded)
+        word_lo, _, word_hi = self._words.prefix_range(folded)
+        word = u' ' + folded
+        if not (take(EXACT, self._titles.ids[lo:mid]) or
+                take(PREFIX, _Slice(self._titles.ids, mid, hi),
+                     lambda title: title.startswith(folded)) or
+                take(WORD_PREFIX, _Slice(self._words.ids, word_lo, word_hi),
+                     lambda title: word in title) or
+                self._take_words(folded, take) or
+                take(SUBSTRING, self._trigram_candidates(folded),
+                     lambda title: folded in title, verify=True)):
+            self._take_similar(folded, min_similarity, take, walk)
+        if with_scores:
+            return [((quality, rank), self._entries[i].item)
+                    for quality, rank, i in results]
+        return [self._entries[i].item for quality, rank, i in results]
+
+    # Internals
+
+    def _settle(self):
+        for keys in (self._titles, self._words, self._by_rank):
+            keys.settle()
+
+    def _take_words(self, folded, take):
+        """Take titles with words starting with each query word in turn."""
+        words = folded.split()
+        if len(words) < 2:
+            return False
+        # Titles with a word starting with each query word have the
+        # trigrams of ' ' + word, so candidates are the intersection of
+        # their postings, rarest first, which ends as soon as it is empty
+        trigrams = set()
+        for w in words:
+            trigrams |= _trigrams(u' ' + w)
+        if trigrams:
+            candidates = self._intersect(trigrams)
+        else:
+            # every word is a single letter: intersect the ids of titles
+            # with a word starting with each, from the sorted keys
+            candidates = None
+            for w in set(words):
+                ids = set()
+                for keys in (self._titles, self._words):
+                    lo, _, hi = keys.prefix_range(w)
+                    ids.update(keys.ids[lo:hi])
+                candidates = ids if candidates is None else candidates & ids
+        if not candidates:
+            return False
+        patterns = [u' ' + w for w in words]
+
+        def matches(title):
+            title = u' ' + title
+            start = 0
+            for pattern in patterns:
+                start = title.find(pattern, start)
+                if start < 0:
+                    return False
+                start += len(pattern)
+            return True
+
+        return take(WORDS, candidates, matches, verify=True)
+
+    def _trigram_candidates(self, folded):
+        """Return ids of titles with every trigram of folded, a superset of
+        those containing it."""
+        if len(folded) < 3:
+            return ()  # any match of a shorter query was at a word start
+        return self._intersect(_trigrams(folded))
+
+    def _intersect(self, trigrams):
+        """Return set of ids of titles with every trigram; don't modify it.
+
+        Postings are intersected rarest first, so each step costs no more
+        than the smallest, and a trigram no title has ends it at once.
+        """
+        postings = sorted((self._postings.get(t, frozenset())
+                           for t in trigrams), key=len)
+        if len(postings) == 1:
+            return postings[0]
+        result = postings[0] & postings[1]
+        for ids in postings[2:]:
+            if not result:
+                break
+            result &= ids
+        return result
+
+    def _take_similar(self, folded, min_similarity, take, walk):
+        """Take titles by number of the query's trigrams shared, most first.
+
+        Titles sharing k of the n trigrams are each in one of the n - k + 1
+        rarest posting lists. Where those hold many ids the level is
+        likely dense, and walking ids in rank order finds its best soonest;
+        if a short walk does not fill the results, or the lists are short,
+        the titles missing at most n - k lists are counted with set
+        operations on the candidates alone.
+        """
+        trigrams = _trigrams(u' ' + folded + u' ')
+        postings = sorted((self._postings.get(t, frozenset())
+                           for t in trigrams), key=len)
+        n = len(postings)
+        needed = max(1, int(n * min_similarity))
+        entries = self._entries
+        for k in range(n, needed - 1, -1):
+            most_missed = n - k
+            candidates = postings[:most_missed + 1]
+            if not any(candidates):
+                continue
+            if sum(len(ids) for ids in candidates) * 32 > len(entries):
+                best = walk(lambda i: len(entries[i].trigrams & trigrams) >= k,
+                            budget=32)
+                if best is not None:
+                    if take(FUZZY * k / n, best):
+                        return
+                    continue
+            # missed[m] -- candidates missing m of the lists read so far
+            missed = [set().union(*candidates)]
+            missed += [set() for _ in range(most_missed)]
+            for ids in postings:
+                for m in range(most_missed, -1, -1):
+                    if m < most_missed:
+                        missed[m + 1] |= missed[m] - ids
+                    missed[m] &= ids
+            if take(FUZZY * k / n, set().union(*missed)):
+                return
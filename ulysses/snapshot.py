@@ -0,0 +1,404 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Memory-mappable snapshots of library trees.
+
+A fresh process otherwise rebuilds the tree from a get-root-items reply, or
+unpickles every Group and Sheet of it. write_snapshot() instead stores a tree
+as parallel arrays (columns), one entry per item, and a single table of the
+strings they refer to:
+
+    write_snapshot(ulysses.get_root_items(), 'library.snapshot')
+
+    with Snapshot('library.snapshot') as snapshot:
+        inbox = snapshot.roots()[0].get_group_by_title('Inbox')
+        snapshot.find(identifier).title
+
+Snapshot() maps the file and reads only its header; the items returned are
+views which read their attributes from the mapped file when accessed, so only
+the pages holding them are ever read. A view's materialize() returns the
+ordinary Group (with everything below it) or Sheet.
+
+Items are stored in breadth-first order, so each item's sheets and then
+containers lie in one run of the columns starting at its child_start.
+"""
+
+import array
+import math
+import mmap
+import struct
+import sys
+import time
+
+from .calls import Group, Sheet
+from .storage import atomic_write
+
+
+__all__ = ['write_snapshot', 'Snapshot', 'GroupView', 'SheetView']
+
+
+MAGIC = 'ULSNAP\x00\x00'
+VERSION = 1
+
+TYPES = ['sheet', 'group', 'filter', 'trash']
+
+# (name, array typecode) of each column, in file order. Strings are stored as
+# indexes into the string table, -1 for None. n_containers is -1 where the
+# tree was fetched non-recursively. lifetime is 0, 1 or 2 for False, True and
+# None. Dates are NaN for None.
+COLUMNS = [
+    ('parent', 'i'), ('child_start', 'i'), ('n_sheets', 'i'),
+    ('n_containers', 'i'), ('title', 'i'), ('identifier', 'i'),
+    ('title_type', 'i'), ('change_token', 'i'), ('creation_date', 'd'),
+    ('modification_date', 'd'), ('type', 'B'), ('lifetime', 'B'),
+]
+
+# magic, version, n_items, n_roots, n_strings, created, then the offset of
+# each column, of the identifier index, of the string offsets and of the
+# string data
+_HEADER = struct.Struct('<8sIIIId%dQ' % (len(COLUMNS) + 3))
+
+_STRUCTS = {'i': struct.Struct('<i'), 'I': struct.Struct('<I'),
+            'd': struct.Struct('<d'), 'B': struct.Struct('<B')}
+
+
+def write_snapshot(groups, path):
+    """Write a snapshot of groups, and everything below them, atomically.
+
+    groups -- a Group, or list of Groups, e.g. from get_root_items()
+    path -- file to write
+    """
+    if not isinstance(groups, (list, tuple)):
+        groups = [groups]
+    columns = dict((name, array.array(code)) for name, code in COLUMNS)
+    strings = []
+    string_refs = {}
+
+    def ref(s):
+        if s is None:
+            return -1
+        if s not in string_refs:
+            string_refs[s] = len(strings)
+            strings.append(s)
+        return string_refs[s]
+
+    # Breadth first, so the children of each item are appended in one run
+    order = list(groups)
+    parents = [-1] * len(groups)
+    i = 0
+    while i < len(order):
+        item = order[i]
+        columns['parent'].append(parents[i])
+        columns['title'].append(ref(item.title))
+        columns['identifier'].append(ref(item.identifier))
+        columns['type'].append(TYPES.index(item.type))
+        columns['lifetime'].append(
+            2 if item.hasLifetimeIdentifier is None
+            else int(bool(item.hasLifetimeIdentifier)))
+        if item.type == 'sheet':
+            columns['child_start'].append(-1)
+            columns['n_sheets'].append(0)
+            columns['n_containers'].append(0)
+            columns['title_type'].append(ref(item.titleType))
+            columns['change_token'].append(ref(item.changeToken))
+            columns['creation_date'].append(_float(item.creationDate))
+            columns['modification_date'].append(
+                _float(item.modificationDate))
+        else:
+            children = item.sheets + (item.containers or [])
+            columns['child_start'].append(len(order))
+            columns['n_sheets'].append(len(item.sheets))
+            columns['n_containers'].append(
+                -1 if item.containers is None else len(item.containers))
+            columns['title_type'].append(-1)
+            columns['change_token'].append(-1)
+            columns['creation_date'].append(float('nan'))
+            columns['modification_date'].append(float('nan'))
+            order.extend(children)
+            parents.extend([i] * len(children))
+        i += 1
+
+    encoded = [s.encode('utf-8') if isinstance(s, unicode) else s
+               for s in strings]
+    identifier_refs = columns['identifier']
+    by_identifier = array.array('i', sorted(
+        (n for n in range(len(order)) if identifier_refs[n] >= 0),
+        key=lambda n: encoded[identifier_refs[n]]))
+    string_offsets = array.array('I', [0])
+    for s in encoded:
+        string_offsets.append(string_offsets[-1] + len(s))
+
+    sections = ([columns[name] for name, _ in COLUMNS] +
+                [by_identifier, string_offsets])
+    parts = []
+    offsets = []
+    position = _HEADER.size
+    for section in sections:
+        if sys.byteorder == 'big':
+            section.byteswap()
+        data = section.tostring()
+        padding = -position % 8
+        parts.append('\x00' * padding)
+        position += padding
+        offsets.append(position)
+        parts.append(data)
+        position += len(data)
+    offsets.append(position)
+    parts.extend(encoded)
+    header = _HEADER.pack(MAGIC, VERSION, len(order), len(groups),
+                          len(strings), time.time(), *offsets)
+    atomic_write(path, header + ''.join(parts))
+
+
+def _float(value):
+    return float('nan') if value is None else float(value)
+
+
+class Snapshot(object):
+    """A snapshot file opened via mmap.
+
+    Attributes:
+
+    path -- the snapshot file
+    created -- time.time() when the snapshot was written
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size or self._map[:8] != MAGIC:
+            self._map.close()
+            raise ValueError("'%s' is not a Ulysses snapshot" % path)
+        fields = _HEADER.unpack_from(self._map, 0)
+        version = fields[1]
+        if version != VERSION:
+            self._map.close()
+            raise ValueError("'%s' is a version %d snapshot, not %d" % (
+                path, version, VERSION))
+        self._n_items, self._n_roots, self._n_strings = fields[2:5]
+        self.created = fields[5]
+        offsets = fields[6:]
+        self._columns = {}
+        for (name, code), offset in zip(COLUMNS, offsets):
+            self._columns[name] = (_STRUCTS[code], offset)
+        self._by_identifier = offsets[len(COLUMNS)]
+        self._string_offsets = offsets[len(COLUMNS) + 1]
+        self._string_data = offsets[len(COLUMNS) + 2]
+
+    def __len__(self):
+        """Return number of items in the snapshot."""
+        return self._n_items
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unmap the file. Views of its items must no longer be used."""
+        self._map.close()
+
+    def roots(self):
+        """Return list of views of the Groups the snapshot was written from."""
+        return [self.item(i) for i in range(self._n_roots)]
+
+    def item(self, index):
+        """Return view of the item at index, in breadth-first order."""
+        if not 0 <= index < self._n_items:
+            raise IndexError('snapshot item index out of range')
+        if self._read('type', index) == 0:
+            return SheetView(self, index)
+        return GroupView(self, index)
+
+    def find(self, identifier):
+        """Return view of the item with identifier.
+
+        Raises KeyError if there is none.
+        """
+        key = (identifier.encode('utf-8') if isinstance(identifier, unicode)
+               else identifier)
+        lo, hi = 0, self._n_items
+        struct_i = _STRUCTS['i']
+        while lo < hi:
+            mid = (lo + hi) // 2
+            index = struct_i.unpack_from(
+                self._map, self._by_identifier + 4 * mid)[0]
+            found = self._bytes(self._read('identifier', index))
+            if found < key:
+                lo = mid + 1
+            elif found > key:
+                hi = mid
+            else:
+                return self.item(index)
+        raise KeyError("No item with identifier '%s' found" % identifier)
+
+    # Internals
+
+    def _read(self, name, index):
+        struct_, offset = self._columns[name]
+        return struct_.unpack_from(self._map, offset + struct_.size * index)[0]
+
+    def _bytes(self, ref):
+        start, end = struct.unpack_from(
+            '<II', self._map, self._string_offsets + 4 * ref)
+        return self._map[self._string_data + start:self._string_data + end]
+
+    def _string(self, ref):
+        if ref < 0:
+            return None
+        return self._bytes(ref).decode('utf-8')
+
+    def _date(self, index, name):
+        value = self._read(name, index)
+        return None if math.isnan(value) else value
+
+
+class _ItemView(object):
+
+    __slots__ = ('snapshot', 'index')
+
+    def __init__(self, snapshot, index):
+        self.snapshot = snapshot
+        self.index = index
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and
+                self.snapshot is other.snapshot and self.index == other.index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.snapshot), self.index))
+
+    @property
+    def title(self):
+        return self.snapshot._string(self.snapshot._read('title', self.index))
+
+    @property
+    def type(self):  # @ReservedAssignment
+        return TYPES[self.snapshot._read('type', self.index)]
+
+    @property
+    def identifier(self):
+        return self.snapshot._string(
+            self.snapshot._read('identifier', self.index))
+
+    @property
+    def hasLifetimeIdentifier(self):
+        return (False, True, None)[self.snapshot._read('lifetime',
+                                                       self.index)]
+
+    @property
+    def parent(self):
+        """View of the Group containing this item, None for a root."""
+        parent = self.snapshot._read('parent', self.index)
+        return None if parent < 0 else self.snapshot.item(parent)
+
+    def __str__(self):
+        return unicode(self).encode('utf-8')
+
+
+class SheetView(_ItemView):
+    """Sheet in a Snapshot, with the attributes of a Sheet."""
+
+    __slots__ = ()
+
+    @property
+    def titleType(self):
+        return self.snapshot._string(
+            self.snapshot._read('title_type', self.index))
+
+    @property
+    def changeToken(self):
+        return self.snapshot._string(
+            self.snapshot._read('change_token', self.index))
+
+    @property
+    def creationDate(self):
+        return self.snapshot._date(self.index, 'creation_date')
+
+    @property
+    def modificationDate(self):
+        return self.snapshot._date(self.index, 'modification_date')
+
+    def materialize(self):
+        """Return the Sheet."""
+        sheet = Sheet.__new__(Sheet)
+        sheet.__dict__.update(
+            title=self.title, type='sheet', identifier=self.identifier,
+            hasLifetimeIdentifier=self.hasLifetimeIdentifier,
+            titleType=self.titleType, changeToken=self.changeToken,
+            creationDate=self.creationDate,
+            modificationDate=self.modificationDate)
+        return sheet
+
+    def __unicode__(self):
+        return u"SheetView(title='%s', identifier='%s')" % (
+            self.title, self.identifier)
+
+
+class GroupView(_ItemView):
+    """Group in a Snapshot, with the attributes and lookups of a Group."""
+
+    __slots__ = ()
+
+    @property
+    def sheets(self):
+        """List of views of the Sheets in this group."""
+        start = self.snapshot._read('child_start', self.index)
+        n_sheets = self.snapshot._read('n_sheets', self.index)
+        return [SheetView(self.snapshot, i)
+                for i in range(start, start + n_sheets)]
+
+    @property
+    def containers(self):
+        """List of views of the Groups in this group, or None if unknown."""
+        n_containers = self.snapshot._read('n_containers', self.index)
+        if n_containers < 0:
+            return None
+        start = (self.snapshot._read('child_start', self.index) +
+                 self.snapshot._read('n_sheets', self.index))
+        return [GroupView(self.snapshot, i)
+                for i in range(start, start + n_containers)]
+
+    walk = Group.__dict__['walk']
+    iter_sheets = Group.__dict__['iter_sheets']
+    iter_groups = Group.__dict__['iter_groups']
+    get_group_by_title = Group.__dict__['get_group_by_title']
+    get_sheet_by_title = Group.__dict__['get_sheet_by_title']
+
+    def materialize(self):
+        """Return the Group, with everything below it."""
+        root = None
+        stack = [(self, None)]
+        while stack:
+            view, parent = stack.pop()
+            group = Group.__new__(Group)
+            group.__dict__.update(
+                title=view.title, type=view.type,
+                identifier=view.identifier,
+                hasLifetimeIdentifier=view.hasLifetimeIdentifier,
+                sheets=[sheet.materialize() for sheet in view.sheets])
+            containers = view.containers
+            group.containers = None if containers is None else []
+            if parent is None:
+                root = group
+            else:
+                parent.containers.append(group)
+            stack.extend((container, group)
+                         for container in reversed(containers or []))
+        return root
+
+    def __unicode__(self):
+        return u"GroupView(title='%s', identifier='%s')" % (
+            self.title, self.identifier)
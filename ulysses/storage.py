@@ -0,0 +1,74 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Helpers for files persisted by the client's caches, indexes and journals.
+"""
+
+import errno
+import os
+import tempfile
+import time
+
+
+__all__ = ['atomic_write', 'ensure_directory', 'remove_stale_temporary_files']
+
+
+# prefix of the temporary files atomic_write() renames into place
+TEMPORARY_PREFIX = '.tmp-'
+
+
+def atomic_write(path, data):
+    """Replace the file at path with data so that it is never seen torn.
+
+    data is written to a temporary file in the same directory, flushed to
+    disk and then renamed over path.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                    prefix=TEMPORARY_PREFIX)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def ensure_directory(directory):
+    """Create directory, and any parents, unless it already exists."""
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def remove_stale_temporary_files(directory, max_age=3600):
+    """Remove temporary files atomic_write() left in directory by a crash.
+
+    Only files last modified more than max_age seconds ago are removed, so
+    that a write in progress in another process is left alone. Returns the
+    number removed.
+    """
+    removed = 0
+    cutoff = time.time() - max_age
+    for name in os.listdir(directory):
+        if not name.startswith(TEMPORARY_PREFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass  # renamed or removed meanwhile
+    return removed
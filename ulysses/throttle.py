@@ -0,0 +1,209 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Rob Walton <dhttps://github.com/robwalton>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-04-17
+
+
+"""
+Adaptive concurrency and rate control for calls to Ulysses.
+
+Bulk jobs that push calls into Ulysses as fast as possible make it sluggish
+for whoever is typing in it, while a fixed sleep between calls wastes
+throughput. An AdaptiveLimiter installed in front of call_ulysses() measures
+how long each call takes and adjusts, AIMD style, both how many calls may be
+in flight and the minimum interval between call starts:
+
+- a call finishing within its latency target additively increases the
+  concurrency limit (by 1/limit) and shortens the interval by one step
+- a call over its target, or failing with anything but a UlyssesError (which
+  reports a problem with the request rather than with load), multiplies the
+  concurrency limit by `backoff` and doubles the interval
+
+A call's latency is the time its exchange with Ulysses took, as reported by
+the client to record_latency(), not counting time spent queued for
+ULYSSES_LOCK behind other calls; otherwise every call queued behind another
+would look slow and the limiter would back off whenever more than one call
+was in flight. Ulysses handles one call at a time, so concurrency above 1
+does not speed up the exchanges themselves, only overlaps the work around
+them (building urls, decoding replies).
+
+Usage:
+
+    limiter = install_limiter(AdaptiveLimiter(latency_target=0.3))
+    ...
+    limiter.limits()  # {'concurrency': 2, 'interval': 0.05, ...}
+"""
+
+import contextlib
+import threading
+import time
+
+from . import xcallback
+from .xcallback import UlyssesError
+
+
+__all__ = ['AdaptiveLimiter', 'install_limiter', 'uninstall_limiter']
+
+
+def install_limiter(limiter=None):
+    """Route all calls through limiter (a new one if None) and return it.
+
+    Any gate already installed, such as a CallScheduler, is kept in front of
+    the limiter.
+    """
+    if limiter is None:
+        limiter = AdaptiveLimiter()
+    previous = xcallback.set_call_gate(limiter)
+    if limiter.inner is None and previous is not limiter:
+        limiter.inner = previous
+    return limiter
+
+
+def uninstall_limiter(limiter):
+    """Stop routing calls through limiter, restoring any gate it wrapped."""
+    xcallback.set_call_gate(limiter.inner)
+
+
+class AdaptiveLimiter(object):
+    """AIMD controller of call concurrency and rate.
+
+    Attributes:
+
+    latency_target -- seconds a call should take, or dict of action ->
+                      seconds with None as the key for other actions
+    max_concurrency -- upper bound for the concurrency limit
+    max_interval -- upper bound, in seconds, for the interval between calls
+    interval_step -- seconds by which the interval shrinks after a good call
+    backoff -- factor applied to the concurrency limit after a bad call
+    smoothing -- weight of the newest sample in per-action latency averages
+    inner -- gate entered before this one, e.g. a CallScheduler, or None
+    """
+
+    def __init__(self, latency_target=0.5, max_concurrency=4,
+                 max_interval=2.0, interval_step=0.01, backoff=0.5,
+                 smoothing=0.2, inner=None):
+        self.latency_target = latency_target
+        self.max_concurrency = max_concurrency
+        self.max_interval = max_interval
+        self.interval_step = interval_step
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.inner = inner
+        self._cond = threading.Condition()
+        self._concurrency = 1.0
+        self._interval = 0.0
+        self._in_flight = 0
+        self._next_start = 0.0
+        self._stats = {}  # action -> dict
+        self._local = threading.local()  # latency of this thread's call
+
+    def target_for(self, action):
+        """Return latency target in seconds for action."""
+        if isinstance(self.latency_target, dict):
+            return self.latency_target.get(action,
+                                           self.latency_target.get(None))
+        return self.latency_target
+
+    @contextlib.contextmanager
+    def slot(self, action):
+        """Context manager holding a place for a call; see set_call_gate()."""
+        if self.inner is not None:
+            with self.inner.slot(action):
+                with self._own_slot(action):
+                    yield
+        else:
+            with self._own_slot(action):
+                yield
+
+    def limits(self):
+        """Return dict of the current limits and calls in flight."""
+        with self._cond:
+            return {'concurrency': int(self._concurrency),
+                    'interval': self._interval,
+                    'rate': 1 / self._interval if self._interval else None,
+                    'in_flight': self._in_flight}
+
+    def stats(self):
+        """Return dict of action -> calls, errors, error_rate and latency.
+
+        latency is an exponentially weighted moving average in seconds.
+        """
+        with self._cond:
+            stats = {}
+            for action, s in self._stats.iteritems():
+                stats[action] = dict(s, error_rate=(float(s['errors']) /
+                                                    s['calls']))
+            return stats
+
+    def record_latency(self, action, seconds):
+        """Note the time a call's exchange with Ulysses took.
+
+        Called by the client from within slot(); without it the whole time
+        spent in the slot is taken as the latency.
+        """
+        self._local.latency = seconds
+
+    # Internals
+
+    @contextlib.contextmanager
+    def _own_slot(self, action):
+        self._acquire()
+        self._local.latency = None
+        start = time.time()
+        try:
+            yield
+        except UlyssesError:
+            self._record(action, self._latency(start), error=True,
+                         congested=False)
+            raise
+        except Exception:
+            self._record(action, self._latency(start), error=True,
+                         congested=True)
+            raise
+        else:
+            latency = self._latency(start)
+            target = self.target_for(action)
+            self._record(action, latency, error=False,
+                         congested=target is not None and latency > target)
+
+    def _latency(self, start):
+        latency = self._local.latency
+        return time.time() - start if latency is None else latency
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                if self._in_flight < int(self._concurrency):
+                    wait = self._next_start - time.time()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            self._in_flight += 1
+            self._next_start = time.time() + self._interval
+
+    def _record(self, action, latency, error, congested):
+        with self._cond:
+            self._in_flight -= 1
+            s = self._stats.setdefault(
+                action, {'calls': 0, 'errors': 0, 'latency': latency})
+            s['calls'] += 1
+            s['errors'] += error
+            s['latency'] += self.smoothing * (latency - s['latency'])
+            if congested:
+                self._concurrency = max(1.0,
+                                        self._concurrency * self.backoff)
+                self._interval = min(
+                    self.max_interval,
+                    max(self._interval * 2, self.interval_step))
+            else:
+                self._concurrency = min(
+                    float(self.max_concurrency),
+                    self._concurrency + 1 / self._concurrency)
+                self._interval = max(0.0,
+                                     self._interval - self.interval_step)
+            self._cond.notify_all()
@@ -9,83 +9,74 @@
 """
 Ulysses specific xcall implementaion.
 
+The functions here configure, and call Ulysses through, the default
+UlyssesClient. See ulysses.client.
 """
 
 import logging
 
-import xcall
+from .client import default_client, isID  # @UnusedImport
+from .client import UlyssesError, ulysses_xerror_handler  # @UnusedImport
 
 logger = logging.getLogger(__name__)
 
 
-# Token provider
+def set_access_token(token):
+    """Set access token required for many Ulysses calls."""
+    default_client().access_token = token
 
-class NonPersistedTokenProvider(object):
-    """Provides an access-token string.
 
-    Atrributes:
+def set_transport(transport):
+    """Send calls through transport and return the previous transport.
 
-    token -- access-token string
+    transport -- e.g. an xcall.RecordingTransport or xcall.ReplayTransport.
+                 None to restore running xcall
     """
-    def __init__(self, token=None):
-        self.token = token
+    client = default_client()
+    previous = client.transport
+    client.transport = transport
+    return previous
 
 
-token_provider = NonPersistedTokenProvider()
+def set_call_gate(gate):
+    """Route every call through gate and return the previous gate.
 
+    gate -- object with a slot(action) method returning a context manager
+            which is entered before, and exited after, each call. None to
+            remove. Calls are still made one at a time whatever the gate.
 
-def set_access_token(token):
-    """Set access token required for many Ulysses calls."""
-    token_provider.token = token
+    See ulysses.scheduler.CallScheduler.
+    """
+    client = default_client()
+    previous, client.gate = client.gate, gate
+    return previous
 
 
-# x-callback-url
+def add_call_listener(listener):
+    """Call listener(action, params, reply) after every successful call.
 
-class UlyssesError(xcall.XCallbackError):
-    """Exception representing an x-error callback from Ulysses.
+    params excludes the access-token. Exceptions raised by listener are
+    logged and otherwise ignored.
     """
-    pass
-
-
-def ulysses_xerror_handler(xerror, requested_url):
-    d = eval(xerror)
-    error_message = d['errorMessage']
-    if error_message[-1] != '.':
-        error_message += '.'
-    error_code = d['errorCode']
-    raise UlyssesError(
-        ("%(error_message)s Code=%(error_code)s. "
-         "In response to sending the url '%(requested_url)s'") % locals())
+    default_client().add_listener(listener)
 
 
-ULYSSES_XCALL = xcall.XCallClient('ulysses', ulysses_xerror_handler,
-                                  json_decode_success=True)
+def remove_call_listener(listener):
+    """Stop calling a listener added with add_call_listener()."""
+    default_client().remove_listener(listener)
 
 
-def call_ulysses(action, params={}, send_access_token=False,
+def call_ulysses(action, params=None, send_access_token=False,
                  silent_mode=False, activate_ulysses=False):
     """Perform a Ulysses action and return json restored result.
 
     action -- the name of the Ulysses action to perform
     params -- dictionary of parameters to pass with call. None entries will
-              be removed before sending.
+              be removed before sending. Not modified.
     send_access_token -- append access-token in params if True
     silent-mode -- append silent-mode=YES to params if True. This prevents
                    actions which alter Ulysses content from bring Ulysses
                    forward.
     """
-
-    if send_access_token:
-        params['access-token'] = token_provider.token
-    if silent_mode:
-        params['silent-mode'] = 'YES'
-
-    return ULYSSES_XCALL.xcall(action, params, activate_app=activate_ulysses)
-
-
-def isID(value):
-    """Checks if value looks like a Ulysses ID; i.e. is 22 char long.
-
-    Not an exact science; but good enougth to prevent most mistakes.
-    """
-    return len(value) == 22
+    return default_client().call(action, params, send_access_token,
+                                 silent_mode, activate_ulysses)
@@ -21,20 +21,38 @@ to ensure that `xcall` is not running, but there is 20-30ms window in which
 multiple calls to this module will result in multiple xcall processes running;
 and the chance of replies being mixed up.
 
+An XCallClient sends urls through a transport, SubprocessTransport (running
+`xcall`) by default. A RecordingTransport wrapped around it saves every
+exchange to a cassette file, and a ReplayTransport serves a cassette back
+without the application, with the recorded or a scaled latency, so that
+workflows can be tested and benchmarked on any machine:
+
+    client = XCallClient('ulysses', transport=RecordingTransport(
+        'session.cassette'))
+    ...
+    client = XCallClient('ulysses', transport=ReplayTransport(
+        'session.cassette', latency_scale=0))
+
 """
 
 import json
 import urllib
 import logging
 import os
+import re
 import subprocess
+import threading
+import time
 
 
-__all__ = ['XCallClient', 'xcall', 'XCallbackError']
+__all__ = ['XCallClient', 'xcall', 'XCallbackError', 'SubprocessTransport',
+           'RecordingTransport', 'ReplayTransport', 'ReplayMissError']
 
 XCALL_PATH = (os.path.dirname(os.path.abspath(__file__)) +
               '/lib/xcall.app/Contents/MacOS/xcall')
 
+LOGGED_REPLY_LENGTH = 1000
+
 
 logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s',
                     level=logging.DEBUG)
@@ -48,6 +66,12 @@ class XCallbackError(Exception):
         Exception.__init__(self, *args, **kwargs)
 
 
+class ReplayMissError(Exception):
+    """Exception raised when a cassette holds no reply to a url.
+    """
+    pass
+
+
 def default_xerror_handler(xerror, requested_url):
     """Handle an x-error callback by raising a generic XCallbackError
 
@@ -88,17 +112,28 @@ class XCallClient(object):
     """
 
     def __init__(self, scheme_name, on_xerror_handler=default_xerror_handler,
-                 json_decode_success=True):
+                 json_decode_success=True, success_decoder=None,
+                 transport=None):
         """Create an xcall client for a particular application.
 
         scheme_name -- the url scheme name, as registered with macOS
         on_xerror_handler -- callable to handle x-error callbacks.
                              See xcall.default_xerror_handler
         json_decode_success -- unmarshal x-success calls if True
+        success_decoder -- callable taking the action and the raw x-success
+                           reply and returning the result. Replaces the
+                           default unquoting and json_decode_success
+                           handling if given
+        transport -- object with an exchange(url, activate_app) method
+                     returning (stdout, stderr). A SubprocessTransport if None
         """
         self.scheme_name = scheme_name
         self.on_xerror_handler = on_xerror_handler
         self.json_decode_success = json_decode_success
+        self.success_decoder = success_decoder
+        if transport is None:
+            transport = SubprocessTransport()
+        self.transport = transport
 
     def xcall(self, action, action_parameters={}, activate_app=False):
         """Perform action and return result across xcall.
@@ -121,13 +156,9 @@ class XCallClient(object):
             if action_parameters[key] is None:
                 del action_parameters[key]
 
-        pid_list = get_pid_of_running_xcall_processes()
-        if pid_list:
-            raise AssertionError('xcall processe(s) already running. pid(s): ' + str(pid_list))
         cmdurl = self._build_url(action, action_parameters)
         logger.debug('--> ' + cmdurl)
-        result = self._xcall(cmdurl, activate_app)
-        logger.debug('<-- ' + unicode(result) + '\n')
+        result = self._xcall(cmdurl, activate_app, action)
 
         return result
 
@@ -144,18 +175,18 @@ class XCallClient(object):
             url = url + '?' + '&'.join(par_list)
         return url
 
-    def _xcall(self, url, activate_app):
-        args = [XCALL_PATH, '-url', '"%s"' % url]
-        if activate_app:
-            args += ['-activateApp', 'YES']
-
-        p = subprocess.Popen(
-            args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = p.communicate()
+    def _xcall(self, url, activate_app, action=None):
+        stdout, stderr = self.transport.exchange(url, activate_app)
 
         assert (stdout == '') or (stderr == '')
         assert not ((stdout == '') and (stderr == ''))
         if stdout:
+            # Log the raw reply, truncated, rather than formatting what may
+            # be a whole decoded library
+            logger.debug('<-- ' + stdout[:LOGGED_REPLY_LENGTH] +
+                         ('...' if len(stdout) > LOGGED_REPLY_LENGTH else ''))
+            if self.success_decoder is not None:
+                return self.success_decoder(action, stdout)
             response = urllib.unquote(stdout).decode('utf8')
             if self.json_decode_success:
                 return json.loads(response)
@@ -164,7 +195,113 @@ class XCallClient(object):
         elif stderr:
             self.on_xerror_handler(stderr, url)
 
- 
+
+class SubprocessTransport(object):
+    """Sends urls by running `xcall`, returning its (stdout, stderr).
+    """
+
+    def __init__(self, xcall_path=XCALL_PATH):
+        self.xcall_path = xcall_path
+
+    def exchange(self, url, activate_app=False):
+        pid_list = get_pid_of_running_xcall_processes()
+        if pid_list:
+            raise AssertionError(
+                'xcall processe(s) already running. pid(s): ' + str(pid_list))
+
+        args = [self.xcall_path, '-url', '"%s"' % url]
+        if activate_app:
+            args += ['-activateApp', 'YES']
+
+        p = subprocess.Popen(
+            args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return p.communicate()
+
+
+_SECRET_PARAMETER = re.compile(r'(?<=[?&])(access-token=)[^&]*')
+
+
+def cassette_key(url):
+    """Return url with secrets blanked and parameters sorted.
+
+    Urls are matched against a cassette by this key, so replay does not
+    depend on the access-token recorded or on parameter order.
+    """
+    url = _SECRET_PARAMETER.sub(r'\1', url)
+    base, _, query = url.partition('?')
+    if not query:
+        return base
+    return base + '?' + '&'.join(sorted(query.split('&')))
+
+
+class RecordingTransport(object):
+    """Passes urls to another transport, appending each exchange to a cassette.
+
+    A cassette holds one JSON object per line, with 'url' (see cassette_key()),
+    'activate_app', 'stdout', 'stderr' and 'duration' in seconds. Replies are
+    stored as received, so a recorded authorize reply holds an access-token.
+    """
+
+    def __init__(self, path, transport=None):
+        """path -- cassette file to append to
+        transport -- transport to record, a SubprocessTransport if None
+        """
+        self.path = path
+        self.transport = transport or SubprocessTransport()
+        self._lock = threading.Lock()
+
+    def exchange(self, url, activate_app=False):
+        start = time.time()
+        stdout, stderr = self.transport.exchange(url, activate_app)
+        duration = time.time() - start
+        line = json.dumps({'url': cassette_key(url),
+                           'activate_app': activate_app,
+                           'stdout': stdout.decode('utf-8'),
+                           'stderr': stderr.decode('utf-8'),
+                           'duration': duration})
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                f.write(line + '\n')
+        return stdout, stderr
+
+
+class ReplayTransport(object):
+    """Serves the exchanges of a cassette written by a RecordingTransport.
+
+    Exchanges for the same url are served in the order recorded; once they
+    run out the last is served again. Each reply is delayed by its recorded
+    duration times latency_scale (0 for no delay).
+    """
+
+    def __init__(self, path, latency_scale=1.0):
+        self.path = path
+        self.latency_scale = latency_scale
+        self._exchanges = {}  # url key -> list of exchanges
+        self._served = {}  # url key -> number served
+        self._lock = threading.Lock()
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                exchange = json.loads(line)
+                self._exchanges.setdefault(exchange['url'], []).append(
+                    exchange)
+
+    def exchange(self, url, activate_app=False):
+        key = cassette_key(url)
+        with self._lock:
+            exchanges = self._exchanges.get(key)
+            if not exchanges:
+                raise ReplayMissError(
+                    "No reply to '%s' in cassette '%s'" % (key, self.path))
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+        exchange = exchanges[min(served, len(exchanges) - 1)]
+        if self.latency_scale:
+            time.sleep(exchange['duration'] * self.latency_scale)
+        return (exchange['stdout'].encode('utf-8'),
+                exchange['stderr'].encode('utf-8'))
+
 
 def get_pid_of_running_xcall_processes():
     try: